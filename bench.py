@@ -0,0 +1,733 @@
+# ========================= bench.py =========================
+# Бенчмарки бота. Запуск: python bench.py <сценарий> [параметры]
+
+import argparse
+import gc
+import itertools
+import os
+import random
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from leaderboard import Leaderboard
+from logic import POKEMON_DB, Pokemon, Trainer, Battle
+from roster import PokemonStore
+
+
+class DictPokemon:
+    """Старое представление покемона (атрибуты в __dict__) — для сравнения."""
+
+    def __init__(self, source):
+        for field in Pokemon.__slots__:
+            setattr(self, field, getattr(source, field))
+
+
+def measure_memory(build):
+    """Возвращает (байт на объект, секунд) для функции build()."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept, count = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size / count, elapsed
+
+
+def bench_memory(sizes):
+    random.seed(0)
+    template = Pokemon("Pikachu", "electric", 35, 55, 40, 90, "images/pikachu.png")
+
+    layouts = {
+        "__dict__": lambda n: ([DictPokemon(template) for _ in range(n)], n),
+        "__slots__": lambda n: ([Pokemon.from_dict(template.to_dict()) for _ in range(n)], n),
+    }
+
+    def columnar(n):
+        store = PokemonStore()
+        for _ in range(n):
+            store.add(template)
+        return store, n
+
+    def columnar_views(n):
+        # ростер + живое окно PokemonView на каждую строку (как у Trainer.pokemons)
+        store = PokemonStore()
+        views = [store.add(template) for _ in range(n)]
+        return (store, views), n
+
+    layouts["columnar"] = columnar
+    layouts["col+views"] = columnar_views
+
+    print(f"{'покемонов':>10} | {'раскладка':>10} | {'байт/шт':>8} | {'всего МБ':>9} | {'сек':>6}")
+    for n in sizes:
+        for name, build in layouts.items():
+            per_item, elapsed = measure_memory(lambda: build(n))
+            print(f"{n:>10} | {name:>10} | {per_item:>8.1f} | {per_item * n / 2**20:>9.1f} | {elapsed:>6.2f}")
+
+
+def bench_workers(worker_counts, updates, trainers, api_latency):
+    """
+    Нагрузочный тест пула обработчиков: случайные /buy, /daily, /use, /battle
+    по общему набору тренеров. Сетевой вызов Telegram имитируется sleep().
+    """
+    random.seed(0)
+    names = [f"load_{i}" for i in range(trainers)]
+    for name in names:
+        t = Trainer(name)
+        t.coins = 10**9
+        t.add_pokemon()
+
+    def handle(i):
+        t = Trainer.trainers[random.choice(names)]
+        op = i % 4
+        if op == 0:
+            t.buy_item("potion")
+        elif op == 1:
+            t.claim_daily()
+        elif op == 2:
+            t.use_item("potion", t.pokemons[0].name)
+        else:
+            Battle(t, Trainer.trainers[random.choice(names)]).start()
+        time.sleep(api_latency)  # bot.send_message / send_photo
+
+    print(f"{'потоков':>8} | {'обн/сек':>9} | {'ускорение':>9}")
+    base = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(handle, range(updates)))
+        rate = updates / (time.perf_counter() - start)
+        base = base or rate
+        print(f"{workers:>8} | {rate:>9.1f} | {rate / base:>8.1f}x")
+
+
+def bench_battle_log(battles):
+    """Стоимость одного боя в режимах лога quiet / events / text."""
+    random.seed(0)
+    template = {"name": "", "pokemons": [], "items": {}, "coins": 0,
+                "battles_won": 0, "battles_lost": 0, "last_daily": None}
+    t1 = Trainer.from_dict(dict(template, name="__bench_1"))
+    t2 = Trainer.from_dict(dict(template, name="__bench_2"))
+    # Покемоны помощнее — чтобы бой длился несколько ходов
+    p1 = Pokemon("Snorlax", "normal", 400, 60, 60, 30).to_dict()
+    p2 = Pokemon("Blissey", "normal", 500, 40, 50, 55).to_dict()
+
+    def run(mode, render=False):
+        start = time.perf_counter()
+        for _ in range(battles):
+            # каждый бой с одинаковыми покемонами — награды не копятся
+            t1.pokemons = [Pokemon.from_dict(p1)]
+            t2.pokemons = [Pokemon.from_dict(p2)]
+            battle = Battle(t1, t2, mode=mode)
+            battle.start()
+            if render:
+                battle.render()
+        return (time.perf_counter() - start) / battles * 1e6
+
+    print(f"{'режим':>16} | {'мкс/бой':>8}")
+    for label, mode, render in (("quiet", "quiet", False), ("events", "events", False),
+                                ("events+render", "events", True), ("text", "text", False)):
+        print(f"{label:>16} | {run(mode, render):>8.1f}")
+    Trainer.leaderboard.remove("__bench_1")
+    Trainer.leaderboard.remove("__bench_2")
+
+
+def bench_journal(events, trainers, directory):
+    """Запись `events` изменений в журнал и время восстановления: хвост журнала vs снимок."""
+    import shutil
+    from journal import JournalStorage
+
+    shutil.rmtree(directory, ignore_errors=True)
+    random.seed(0)
+    store = JournalStorage(directory)
+    names = [f"trainer{i}" for i in range(trainers)]
+    lead = {}
+    for name in names:
+        p = lead[name] = Pokemon("Pikachu", "electric", 35, 55, 40, 90)
+        store.record("put", name, [{"name": name, "pokemons": [p.to_dict()], "items": {"potion": 3},
+                                    "coins": 100, "battles_won": 0, "battles_lost": 0,
+                                    "last_daily": None}, None])
+
+    start = time.perf_counter()
+    for i in range(events):
+        name = names[i % trainers]
+        if i % 2:
+            store.record("fields", name, {"coins": i, "battles_won": i // 2})
+        else:
+            p = lead[name]
+            p.xp = i
+            store.record("pokemon", name, p.to_dict())
+    write = time.perf_counter() - start
+    store.close()
+    size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+
+    start = time.perf_counter()
+    store = JournalStorage(directory)
+    replay = time.perf_counter() - start
+    expected = {name: store.load(name) for name in names}
+
+    store.snapshot()
+    store.close()
+    start = time.perf_counter()
+    store = JournalStorage(directory)
+    from_snapshot = time.perf_counter() - start
+    assert {name: store.load(name) for name in names} == expected, "снимок расходится с журналом"
+    store.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"запись: {events} событий за {write:.2f} с ({events / write:,.0f}/с), журнал {size / 2**20:.1f} МБ")
+    print(f"восстановление: журнал {replay:.2f} с, снимок {from_snapshot:.3f} с")
+
+
+def bench_outbox(chats, messages, threads, latency):
+    """
+    Отправка через поддельный Bot API с лимитами Telegram: прямые вызовы
+    из пула обработчиков против очереди outbox.
+    """
+    import telebot
+    from telebot import apihelper
+    from fake_api import FakeBotAPI
+    from outbox import Outbox, use_pooled_session
+
+    def run(label, send_all):
+        server = FakeBotAPI(latency=latency).start()
+        apihelper.API_URL = server.api_url
+        bot = telebot.TeleBot("1:bench", threaded=False)
+        start = time.perf_counter()
+        lost = send_all(bot)
+        elapsed = time.perf_counter() - start
+        delivered = sum(len("\n\n".join(texts).split("\n\n")) for texts in server.delivered.values())
+        print(f"{label:>8} | {elapsed:>7.2f} | {server.requests:>8} | {server.throttled:>5} | "
+              f"{delivered:>9} | {lost:>8}")
+        server.shutdown()
+
+    def direct(bot):
+        def send(job):
+            chat_id, i = job
+            try:
+                bot.send_message(chat_id, f"msg {i}")
+                return 0
+            except apihelper.ApiTelegramException:
+                return 1
+
+        jobs = [(chat_id, i) for i in range(messages) for chat_id in range(1, chats + 1)]
+        with ThreadPoolExecutor(threads) as pool:
+            return sum(pool.map(send, jobs))
+
+    def queued(bot):
+        outbox = Outbox(bot, workers=threads)
+        for i in range(messages):
+            for chat_id in range(1, chats + 1):
+                outbox.send_message(chat_id, f"msg {i}")
+        outbox.join()
+        outbox.close()
+        return outbox.failed
+
+    use_pooled_session(threads)
+    print(f"{chats} чатов x {messages} сообщений, {threads} потоков, задержка API {latency * 1000:.0f} мс")
+    print(f"{'способ':>8} | {'сек':>7} | {'запросов':>8} | {'429':>5} | {'доставлено':>9} | {'потеряно':>8}")
+    run("direct", direct)
+    run("outbox", queued)
+
+
+def bench_shards(shard_counts, trainers, battles, cross):
+    """
+    Шардированный запуск (shard.py) на поддельном источнике обновлений:
+    сначала каждый тренер ловит покемонов, затем замеряется поток /battle.
+    cross — доля боёв с тренером из другого процесса (заём через владельца).
+    Bot API заменён мгновенным ответом в процессе (fake_api.install_null_api).
+    """
+    from shard import Dispatcher, shard_of
+
+    update_ids = itertools.count(1)
+
+    def update(user_id, text):
+        user = {"id": user_id, "is_bot": False, "first_name": "bench", "username": f"bench_{user_id}"}
+        return {"update_id": next(update_ids), "message": {
+            "message_id": next(update_ids), "date": 0, "from": user,
+            "chat": {"id": user_id, "type": "private"}, "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}}
+
+    overrides = {"null_api": True, "token": "1:bench", "storage_backend": "memory", "session_backend": "memory",
+                 "outbox_global_rate": 1e9, "outbox_chat_rate": 1e9, "outbox_group_rate": 1e9,
+                 "metrics_port": None}
+    users = range(1, trainers + 1)
+
+    print(f"{trainers} тренеров, {battles} боёв, межпроцессных {cross:.0%}")
+    print(f"{'процессов':>9} | {'боёв/сек':>9} | {'ускорение':>9}")
+    base = None
+    for shards in shard_counts:
+        random.seed(0)
+        owner = {u: shard_of(f"bench_{u}", shards) for u in users}
+        dispatcher = Dispatcher(shards, overrides=overrides, processed=True)
+        try:
+            for _ in range(3):
+                for u in users:
+                    dispatcher.dispatch(update(u, "/catch"))
+            dispatcher.wait_processed()
+
+            jobs = []
+            for _ in range(battles):
+                u = random.choice(users)
+                remote = shards > 1 and random.random() < cross
+                rivals = [v for v in users if v != u and (owner[v] != owner[u]) == remote]
+                jobs.append(update(u, f"/battle @bench_{random.choice(rivals)}"))
+            start = time.perf_counter()
+            for job in jobs:
+                dispatcher.dispatch(job)
+            dispatcher.wait_processed()
+            rate = battles / (time.perf_counter() - start)
+        finally:
+            dispatcher.stop()
+        base = base or rate
+        print(f"{shards:>9} | {rate:>9.1f} | {rate / base:>8.1f}x")
+
+
+def bench_spawn(counts):
+    """Поимка покемонов: по одному (как /catch) против пакетной генерации spawn_batch."""
+    from logic import SPAWN_TABLE
+
+    SPAWN_TABLE.spawn_batch(1)  # импорт NumPy — не в замер
+
+    print(f"{'покемонов':>10} | {'по одному, с':>12} | {'пакетом, с':>10} | {'ускорение':>9}")
+    for n in counts:
+        # обе пачки остаются в памяти до конца замера — как при раздаче на событии
+        start = time.perf_counter()
+        kept = [SPAWN_TABLE.spawn() for _ in range(n)]
+        single = time.perf_counter() - start
+        del kept
+        start = time.perf_counter()
+        kept = SPAWN_TABLE.spawn_batch(n, seed=0)
+        batch = time.perf_counter() - start
+        del kept
+        print(f"{n:>10} | {single:>12.3f} | {batch:>10.3f} | {single / batch:>8.1f}x")
+
+
+def bench_xp(amounts, pokemons):
+    """Крупные начисления XP: add_xp (сразу на итоговый уровень) против level_up по одному."""
+    random.seed(0)
+    template = [Pokemon("Pikachu", "electric", 35, 55, 40, 90).to_dict() for _ in range(pokemons)]
+
+    def stepwise(p, amount):
+        p.xp += amount
+        while p.xp >= p.xp_to_next:
+            p.level_up()
+
+    print(f"{'XP':>17} | {'уровень':>7} | {'по уровню, мкс':>14} | {'сразу, мкс':>10} | {'ускорение':>9}")
+    for amount in amounts:
+        slow = [Pokemon.from_dict(d) for d in template]
+        fast = [Pokemon.from_dict(d) for d in template]
+        start = time.perf_counter()
+        for p in slow:
+            stepwise(p, amount)
+        t_slow = (time.perf_counter() - start) / pokemons * 1e6
+        start = time.perf_counter()
+        for p in fast:
+            p.add_xp(amount)
+        t_fast = (time.perf_counter() - start) / pokemons * 1e6
+        assert all(a.to_dict() == b.to_dict() for a, b in zip(slow, fast)), "результаты разошлись"
+        print(f"{amount:>17} | {fast[0].level:>7} | {t_slow:>14.2f} | {t_fast:>10.2f} | {t_slow / t_fast:>8.1f}x")
+
+
+def bench_tournament(trainers, kind, worker_counts, batch):
+    """
+    Турнир в одном процессе против пула из N процессов (tournament.py).
+    Перед каждым прогоном тренеры восстанавливаются — исход должен совпасть.
+    «только бои» — run_batch без применения наград: та часть, что масштабируется по ядрам.
+    """
+    from tournament import Tournament, lead_state, make_pool, run_batch
+
+    random.seed(0)
+    names = [f"cup_{i}" for i in range(trainers)]
+    for name in names:
+        Trainer(name).add_pokemon()
+    snapshot = [Trainer.trainers[name].to_dict() for name in names]
+
+    def run(pool):
+        for data in snapshot:
+            Trainer.trainers[data["name"]] = Trainer.from_dict(data)
+        tournament = Tournament(names, kind, pool, batch, seed=1)
+        start = time.perf_counter()
+        table = tournament.run()
+        return tournament.matches / (time.perf_counter() - start), table
+
+    leads = [lead_state(Trainer.from_dict(data)) for data in snapshot]
+    matches = [(i, leads[i % trainers], leads[(i * 7 + 1) % trainers]) for i in range(100_000)]
+    batches = [matches[k:k + batch] for k in range(0, len(matches), batch)]
+
+    def fights(pool):
+        start = time.perf_counter()
+        if pool is None:
+            for chunk in batches:
+                run_batch(chunk, 0)
+        else:
+            list(pool.map(run_batch, batches, [0] * len(batches)))
+        return len(matches) / (time.perf_counter() - start)
+
+    print(f"{trainers} тренеров, {kind}, ядер: {os.cpu_count()}")
+    print(f"{'процессов':>9} | {'боёв/сек':>9} | {'ускорение':>9} | {'только бои/сек':>14} | {'ускорение':>9}")
+    base, reference = run(None)
+    base_fights = fights(None)
+    print(f"{'—':>9} | {base:>9.0f} | {1:>8.1f}x | {base_fights:>14.0f} | {1:>8.1f}x")
+    for workers in worker_counts:
+        pool = make_pool(workers)
+        pool.submit(int).result()  # процессы стартуют до замера
+        rate, table = run(pool)
+        rate_fights = fights(pool)
+        pool.shutdown()
+        assert table == reference, "исход турнира зависит от числа процессов"
+        print(f"{workers:>9} | {rate:>9.0f} | {rate / base:>8.1f}x | {rate_fights:>14.0f} | "
+              f"{rate_fights / base_fights:>8.1f}x")
+
+
+def bench_matchmaking(sizes, lookups):
+    """
+    Вход в очередь /ranked при N ожидающих: MatchQueue (bisect по рейтингу)
+    против перебора всех заявок. Окно нулевое и рейтинги различны — пар не
+    образуется, очередь не тает; каждая проба входит и сразу выходит.
+    """
+    from matchmaking import MatchQueue
+
+    print(f"{'в очереди':>10} | {'bisect, мкс':>11} | {'перебор, мкс':>12} | {'ускорение':>9}")
+    for n in sizes:
+        rng = random.Random(0)
+        ratings = rng.sample(range(n * 10), n)
+        queue = MatchQueue(window=0, widen=0, max_window=0)
+        naive = []
+        for i, rating in enumerate(ratings):
+            queue.enqueue(f"w{i}", "p", rating)
+            naive.append((rating, f"w{i}"))
+        probes = [rng.randrange(n * 10) + 0.5 for _ in range(lookups)]
+
+        start = time.perf_counter()
+        for rating in probes:
+            queue.enqueue("probe", "p", rating)
+            queue.cancel("probe")
+        fast = (time.perf_counter() - start) / lookups
+
+        start = time.perf_counter()
+        for rating in probes:
+            min(naive, key=lambda entry: abs(entry[0] - rating))
+            naive.append((rating, "probe"))
+            naive.pop()
+        slow = (time.perf_counter() - start) / lookups
+        print(f"{n:>10} | {fast * 1e6:>11.2f} | {slow * 1e6:>12.1f} | {slow / fast:>8.0f}x")
+
+
+def bench_cards(species, battles):
+    """
+    Превью /battle: два фото (каждое сообщение читает спрайт с диска) против
+    карточки cards.py — нарисовать (промах), взять из LRU, найти файл на диске
+    после перезапуска. Спрайты синтетические, 512x512 как в images/.
+    """
+    import shutil
+    import tempfile
+
+    from cards import BattleCards, Image
+
+    if Image is None:
+        print("Нужен Pillow: pip install Pillow")
+        return
+    directory = tempfile.mkdtemp(prefix="bench_cards_")
+    try:
+        sprite_dir = os.path.join(directory, "images")
+        os.makedirs(sprite_dir)
+        rng = random.Random(0)
+        pokemons = []
+        for i in range(species):
+            path = os.path.join(sprite_dir, f"s{i}.png")
+            Image.new("RGBA", (512, 512), (rng.randrange(256), rng.randrange(256), 90, 255)).save(path)
+            pokemons.append(Pokemon(f"S{i}", "normal", 50, 50, 50, 50, path))
+        pairs = [(rng.choice(pokemons), rng.choice(pokemons)) for _ in range(battles)]
+
+        def separate():
+            for p1, p2 in pairs:
+                for p in (p1, p2):
+                    with open(p.image_path, "rb") as f:
+                        f.read()
+
+        cards = BattleCards(sprite_dir, os.path.join(directory, "cards"), max_entries=battles)
+        start = time.perf_counter()
+        loaded = cards.preload()
+        preload = time.perf_counter() - start
+
+        def through(renderer):
+            for p1, p2 in pairs:
+                renderer.get(renderer.key(p1, p2))
+
+        def timed(run):
+            start = time.perf_counter()
+            run()
+            return time.perf_counter() - start
+
+        rows = [("2 фото, чтение спрайтов", timed(separate), 2)]
+        rows.append(("карточка: промах/попадание", timed(lambda: through(cards)), 1))
+        rows.append(("карточка: всё в LRU", timed(lambda: through(cards)), 1))
+        # перезапуск: preload подхватывает файлы карточек, нарисованные выше
+        restarted = BattleCards(sprite_dir, os.path.join(directory, "cards"), max_entries=battles)
+        restarted.preload()
+        rows.append(("карточка: с диска", timed(lambda: through(restarted)), 1))
+
+        print(f"спрайтов: {loaded}, preload {preload * 1000:.0f} мс; боёв: {battles}, "
+              f"разных карточек: {len({BattleCards.key(*pair) for pair in pairs})}")
+        print(f"{'вариант':>28} | {'мкс/бой':>8} | {'фото на бой':>11}")
+        for name, elapsed, sends in rows:
+            print(f"{name:>28} | {elapsed / battles * 1e6:>8.1f} | {sends:>11}")
+    finally:
+        shutil.rmtree(directory)
+
+
+# ---------- набор замеров с базовой линией (python bench.py suite) ----------
+
+class _StubOutbox:
+    """Вместо outbox/Telegram в замерах обработчиков: запоминает последний текст."""
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.last = text
+
+    def reply_to(self, message, text, **kwargs):
+        self.last = text
+
+
+def build_world(size, seed=0):
+    """
+    Рейтинг на `size` тренеров — как после запуска бота: сводки из хранилища,
+    без загрузки самих тренеров (Leaderboard.load). У каждого 1-3 покемона.
+    """
+    rng = random.Random(seed)
+    kinds = list(POKEMON_DB.items())
+    summaries = []
+    for i in range(size):
+        rows = []
+        for _ in range(rng.randint(1, 3)):
+            name, data = rng.choice(kinds)
+            level = rng.randint(1, 30)
+            rows.append((name, data["type"], level, rng.randint(150, 400) + level * 5, rng.randint(0, 50)))
+        summaries.append((f"world_{i}", {"level": sum(r[2] for r in rows),
+                                         "power": sum(r[3] for r in rows), "pokemons": rows}))
+    Trainer.leaderboard = Leaderboard()
+    Trainer.leaderboard.load(summaries)
+
+
+def suite_cases():
+    """{имя: функция без аргументов} — операции над уже построенным рейтингом."""
+    import config
+    if not config.token:
+        config.token = "1:bench"
+    from fake_api import install_null_api
+    install_null_api()
+    import main
+
+    main.outbox = _StubOutbox()
+    message = SimpleNamespace(chat=SimpleNamespace(id=1), message_id=1)
+
+    def live(name):
+        # живой тренер вне реестра, но в рейтинге — его touch() обновляет рейтинг на size записей
+        t = Trainer.from_dict({"name": name, "pokemons": [], "items": {}, "coins": 0,
+                               "battles_won": 0, "battles_lost": 0, "last_daily": None})
+        t.pokemons = [Pokemon("Snorlax", "normal", 400, 60, 60, 30)]
+        t.touch()
+        return t
+
+    t1, t2 = live("__suite_1"), live("__suite_2")
+    lead1 = Pokemon("Snorlax", "normal", 400, 60, 60, 30).to_dict()
+    lead2 = Pokemon("Blissey", "normal", 500, 40, 50, 55).to_dict()
+    fresh = Pokemon("Pikachu", "electric", 35, 55, 40, 90).to_dict()
+
+    def battle():
+        # одинаковые покемоны в каждом бою — награды не копятся и бой не вырождается
+        t1.pokemons = [Pokemon.from_dict(lead1)]
+        t2.pokemons = [Pokemon.from_dict(lead2)]
+        Battle(t1, t2).start()
+
+    duel = Battle(t1, t2)
+    a, b = Pokemon.from_dict(lead1), Pokemon.from_dict(lead2)
+
+    catcher = live("__suite_3")
+
+    def add_pokemon():
+        if len(catcher.pokemons) >= 6:
+            catcher.pokemons = []
+        catcher.add_pokemon()
+
+    def level_chain():
+        # 10 000 XP с первого уровня — цепочка из десятка level_up
+        Pokemon.from_dict(fresh).add_xp(10_000)
+
+    profile = live("__suite_4")
+    profile.pokemons = [Pokemon.from_dict(fresh) for _ in range(6)]
+
+    def info_miss():
+        profile.pokemons[0].touch()
+        profile.info()
+
+    return {
+        "battle.start": battle,
+        "battle.calculate_damage": lambda: duel.calculate_damage(a, b),
+        "trainer.add_pokemon": add_pokemon,
+        "pokemon.add_xp_chain": level_chain,
+        "trainer.info": profile.info,
+        "trainer.info_miss": info_miss,
+        "cmd_top": lambda: main.cmd_top(message),
+        "cmd_top_pokemons": lambda: main.cmd_top_pokemons(message),
+    }
+
+
+def time_case(func, repeat):
+    """Лучшее из `repeat` время одного вызова, мкс (как asv/timeit: минимум — меньше шума)."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def check_regressions(results, baseline, tolerance):
+    """Замеры, ставшие медленнее базовой линии больше чем на tolerance (доля)."""
+    regressions = []
+    for key, base in baseline["results"].items():
+        current = results["results"].get(key)
+        if current is not None and current["us"] > base["us"] * (1 + tolerance):
+            regressions.append((key, base["us"], current["us"]))
+    return regressions
+
+
+def bench_suite(sizes, repeat, out, baseline_path, tolerance, only=None):
+    """
+    Горячие пути logic.py и обработчиков на мирах из sizes тренеров, без сети.
+    Результаты — в JSON `out`; с baseline_path — сравнение и код выхода 1 при регрессии.
+    """
+    import json
+    import platform
+    import subprocess
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    results = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                        "commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+               "results": {}}
+
+    print(f"{'замер':>32} | {'мкс/вызов':>10}")
+    for size in sizes:
+        build_world(size)
+        for name, func in suite_cases().items():
+            if only and not any(part in name for part in only):
+                continue
+            random.seed(0)
+            us = time_case(func, repeat)
+            key = f"{name}@{size}"
+            results["results"][key] = {"us": round(us, 3), "size": size}
+            print(f"{key:>32} | {us:>10.2f}")
+        gc.collect()
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"результаты: {out}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = check_regressions(results, baseline, tolerance)
+        for key, base, current in regressions:
+            print(f"РЕГРЕССИЯ {key}: {base:.2f} -> {current:.2f} мкс (x{current / base:.2f})")
+        if regressions:
+            raise SystemExit(1)
+        print(f"регрессий нет (допуск {tolerance:.0%}, база {baseline_path})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки покемон-бота")
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    memory = sub.add_parser("memory", help="память: __dict__ vs __slots__ vs колоночный ростер")
+    memory.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+
+    workers = sub.add_parser("workers", help="пропускная способность пула обработчиков")
+    workers.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    workers.add_argument("--updates", type=int, default=400)
+    workers.add_argument("--trainers", type=int, default=50)
+    workers.add_argument("--api-latency", type=float, default=0.02, help="имитация задержки Telegram, сек")
+
+    battle_log = sub.add_parser("battle_log", help="стоимость боя с текстовым логом и без")
+    battle_log.add_argument("--battles", type=int, default=20_000)
+
+    journal = sub.add_parser("journal", help="запись журнала и время восстановления")
+    journal.add_argument("--events", type=int, default=1_000_000)
+    journal.add_argument("--trainers", type=int, default=1000)
+    journal.add_argument("--dir", default="bench_journal")
+
+    outbox = sub.add_parser("outbox", help="отправка под лимитами Telegram: напрямую vs очередь outbox")
+    outbox.add_argument("--chats", type=int, default=200)
+    outbox.add_argument("--messages", type=int, default=5)
+    outbox.add_argument("--threads", type=int, default=16)
+    outbox.add_argument("--latency", type=float, default=0.02, help="задержка ответа поддельного API, сек")
+
+    shards = sub.add_parser("shards", help="масштабирование по процессам (shard.py)")
+    shards.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    shards.add_argument("--trainers", type=int, default=200)
+    shards.add_argument("--battles", type=int, default=2000)
+    shards.add_argument("--cross", type=float, default=0.2, help="доля боёв с тренером из другого процесса")
+
+    spawn = sub.add_parser("spawn", help="генерация покемонов: по одному vs пакетом")
+    spawn.add_argument("--counts", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+
+    xp = sub.add_parser("xp", help="крупные начисления XP: сразу на итоговый уровень vs по одному")
+    xp.add_argument("--amounts", type=int, nargs="+", default=[1000, 10**6, 10**9, 10**15])
+    xp.add_argument("--pokemons", type=int, default=10_000)
+
+    tournament = sub.add_parser("tournament", help="турнир: в одном процессе vs пул процессов")
+    tournament.add_argument("--trainers", type=int, default=300)
+    tournament.add_argument("--kind", choices=["elimination", "round_robin"], default="round_robin")
+    tournament.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    tournament.add_argument("--batch", type=int, default=500)
+
+    matchmaking = sub.add_parser("matchmaking", help="очередь /ranked: поиск соперника bisect vs перебор")
+    matchmaking.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    matchmaking.add_argument("--lookups", type=int, default=2000)
+
+    cards = sub.add_parser("cards", help="превью /battle: два фото vs одна карточка (нужен Pillow)")
+    cards.add_argument("--species", type=int, default=30)
+    cards.add_argument("--battles", type=int, default=2000)
+
+    suite = sub.add_parser("suite", help="горячие пути на мирах разного размера, JSON и сравнение с базой")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    suite.add_argument("--repeat", type=int, default=5)
+    suite.add_argument("--only", nargs="+", help="только замеры, в имени которых есть эти строки")
+    suite.add_argument("--out", default="bench_results.json")
+    suite.add_argument("--baseline", help="JSON прошлого запуска; медленнее на --tolerance — код выхода 1")
+    suite.add_argument("--tolerance", type=float, default=0.3)
+
+    args = parser.parse_args()
+    if args.scenario == "memory":
+        bench_memory(args.sizes)
+    elif args.scenario == "workers":
+        bench_workers(args.workers, args.updates, args.trainers, args.api_latency)
+    elif args.scenario == "battle_log":
+        bench_battle_log(args.battles)
+    elif args.scenario == "journal":
+        bench_journal(args.events, args.trainers, args.dir)
+    elif args.scenario == "outbox":
+        bench_outbox(args.chats, args.messages, args.threads, args.latency)
+    elif args.scenario == "shards":
+        bench_shards(args.shards, args.trainers, args.battles, args.cross)
+    elif args.scenario == "spawn":
+        bench_spawn(args.counts)
+    elif args.scenario == "xp":
+        bench_xp(args.amounts, args.pokemons)
+    elif args.scenario == "tournament":
+        bench_tournament(args.trainers, args.kind, args.workers, args.batch)
+    elif args.scenario == "matchmaking":
+        bench_matchmaking(args.sizes, args.lookups)
+    elif args.scenario == "cards":
+        bench_cards(args.species, args.battles)
+    elif args.scenario == "suite":
+        bench_suite(args.sizes, args.repeat, args.out, args.baseline, args.tolerance, args.only)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# ========================= cards.py =========================
+# Превью боя одной картинкой «A vs B»: два спрайта, имена и полоски HP (Pillow).
+# Бой стоит одну отправку фото вместо двух. Готовые карточки не рисуются
+# заново: файлы в cards_dir (не больше max_entries, LRU), а повторная отправка
+# того же файла идёт по file_id (PhotoCache в media.py).
+#
+# Спрайты из images/ читаются и масштабируются один раз — preload() при запуске.
+# Без Pillow (`pip install Pillow`) available == False, и бот шлёт спрайты по отдельности.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow необязателен — без него карточек нет
+    Image = None
+
+# Карточка и спрайт на ней, пиксели
+CARD_SIZE = (640, 320)
+SPRITE_SIZE = 200
+# Полоска HP в ключе кэша округляется до десятых: не больше 11 вариантов на покемона
+HP_STEPS = 10
+
+BACKGROUND = (34, 40, 49, 255)
+TEXT_COLOR = (238, 238, 238, 255)
+SHINY_COLOR = (255, 200, 40, 255)
+BAR_BACK = (70, 70, 70, 255)
+# Telegram всё равно пережимает фото в JPEG; сохранять в JPEG ~10x быстрее, чем в PNG
+JPEG_QUALITY = 90
+
+
+def _font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow < 10.1: только встроенный растровый шрифт
+            return ImageFont.load_default()
+
+
+def _is_shiny(path):
+    # images/shiny_pikachu.png (logic.Species) или images/shiny/pikachu.png
+    return os.path.basename(path).startswith("shiny_") or os.path.basename(os.path.dirname(path)) == "shiny"
+
+
+def _label(name):
+    # эмодзи (🌟 у шайни, ✨ у мега) шрифт не рисует — шайни и так видно по рамке
+    return "".join(ch for ch in name if ord(ch) < 0x2000).strip()
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _bar_color(fraction):
+    if fraction > 0.5:
+        return (76, 175, 80, 255)
+    if fraction > 0.2:
+        return (255, 193, 7, 255)
+    return (229, 57, 53, 255)
+
+
+class BattleCards:
+    """
+    Ключ карточки — (спрайт, имя, деление HP) обоих покемонов; шайни следует
+    из пути спрайта. Файл карточки — cache_dir/<sha1 ключа>.jpg; в памяти —
+    LRU этих файлов на max_entries записей. Вытесненный файл удаляется с диска,
+    а on_evict(пути) даёт забыть их file_id (PhotoCache.forget).
+    get(key, pin=True) закрепляет файл до release(путь): outbox открывает его
+    позже, и вытесненный закреплённый файл удаляется только после release.
+    Файлы переживают перезапуск: preload() подхватывает их в LRU.
+    Запись и удаление файлов — под self._lock, чтобы они не пересекались.
+    """
+
+    def __init__(self, sprite_dir="images", cache_dir="cards", max_entries=1024, on_evict=None):
+        self.available = Image is not None
+        self.sprite_dir = sprite_dir
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._sprites = {}  # путь -> RGBA SPRITE_SIZE x SPRITE_SIZE
+        self._files = OrderedDict()  # путь к файлу карточки -> None, от давних к свежим
+        self._pins = {}  # путь -> сколько отправок ещё ждут файл
+        self._doomed = set()  # вытеснены, но закреплены — удалить после release()
+        self.hits = 0
+        self.rendered = 0
+        self.evicted = 0
+        if self.available:
+            self._font = _font(22)
+            self._vs_font = _font(56)
+
+    # ---------- спрайты ----------
+
+    def preload(self):
+        """
+        Читает и масштабирует все PNG из sprite_dir (с подпапками) и подхватывает
+        карточки прошлого запуска из cache_dir. Возвращает число спрайтов.
+        """
+        if not self.available:
+            return 0
+        self._load_cards()
+        if not os.path.isdir(self.sprite_dir):
+            return 0
+        sprites = {}
+        for root, _, files in os.walk(self.sprite_dir):
+            for file in files:
+                if file.lower().endswith(".png"):
+                    path = os.path.normpath(os.path.join(root, file))
+                    sprites[path] = self._load(path)
+        with self._lock:
+            self._sprites.update(sprites)
+        return len(sprites)
+
+    def _load_cards(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        paths = []
+        for file in os.listdir(self.cache_dir):
+            if file.endswith(".tmp"):
+                # недописанная карточка — процесс упал во время save()
+                os.remove(os.path.join(self.cache_dir, file))
+            elif file.endswith(".jpg"):
+                paths.append(os.path.join(self.cache_dir, file))
+        paths.sort(key=os.path.getmtime)
+        with self._lock:
+            for path in paths:
+                self._files[path] = None
+            evicted = self._trim()
+        self._forget(evicted)
+
+    def _load(self, path):
+        try:
+            with Image.open(path) as image:
+                image = image.convert("RGBA")
+        except OSError:
+            return self._placeholder()
+        image.thumbnail((SPRITE_SIZE, SPRITE_SIZE), Image.LANCZOS)
+        sprite = Image.new("RGBA", (SPRITE_SIZE, SPRITE_SIZE), (0, 0, 0, 0))
+        sprite.paste(image, ((SPRITE_SIZE - image.width) // 2, (SPRITE_SIZE - image.height) // 2))
+        return sprite
+
+    def _placeholder(self):
+        sprite = Image.new("RGBA", (SPRITE_SIZE, SPRITE_SIZE), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(sprite)
+        draw.ellipse((20, 20, SPRITE_SIZE - 20, SPRITE_SIZE - 20), fill=(90, 90, 90, 255))
+        draw.text((SPRITE_SIZE // 2, SPRITE_SIZE // 2), "?", font=self._vs_font, fill=TEXT_COLOR, anchor="mm")
+        return sprite
+
+    def _sprite(self, path):
+        sprite = self._sprites.get(path)
+        if sprite is None:
+            # спрайт не из preload (добавлен позже или файла нет) — один раз и запоминаем
+            sprite = self._load(path) if path and os.path.exists(path) else self._placeholder()
+            with self._lock:
+                sprite = self._sprites.setdefault(path, sprite)
+        return sprite
+
+    # ---------- карточки ----------
+
+    @staticmethod
+    def key(p1, p2):
+        """Ключ карточки боя по состоянию покемонов до боя (дёшево, можно под блокировкой тренеров)."""
+        key = ()
+        for p in (p1, p2):
+            step = round(HP_STEPS * max(0, p.hp) / p.max_hp) if p.max_hp else 0
+            key += (os.path.normpath(p.image_path) if p.image_path else "", p.name, min(HP_STEPS, step))
+        return key
+
+    def get(self, key, pin=False):
+        """
+        Путь к файлу карточки (рисуется при первом запросе) или None без Pillow.
+        pin=True — файл не удаляется до release(путь).
+        """
+        if not self.available:
+            return None
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+        path = os.path.join(self.cache_dir, f"{digest}.jpg")
+        with self._lock:
+            if path in self._files or path in self._doomed:
+                # из _doomed — вытеснена, но ещё ждёт отправки: файл на месте, возвращаем в LRU
+                self._doomed.discard(path)
+                self.hits += 1
+                evicted = self._add(path, pin)
+                tmp = None
+            else:
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+        if tmp is None:
+            self._forget(evicted)
+            return path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # рисуем во временный файл без блокировки; другой поток мог рисовать ту же карточку
+        self.render(key).save(tmp, "JPEG", quality=JPEG_QUALITY)
+        with self._lock:
+            os.replace(tmp, path)
+            self.rendered += 1
+            self._doomed.discard(path)
+            evicted = self._add(path, pin)
+        self._forget(evicted)
+        return path
+
+    def release(self, path):
+        """Файл, закреплённый get(pin=True), больше не нужен отправке."""
+        with self._lock:
+            left = self._pins.get(path, 0) - 1
+            if left > 0:
+                self._pins[path] = left
+                return
+            self._pins.pop(path, None)
+            if path not in self._doomed:
+                return
+            self._doomed.discard(path)
+            _unlink(path)
+        self._forget([path])
+
+    def _add(self, path, pin):
+        # вызывается под self._lock
+        self._files[path] = None
+        self._files.move_to_end(path)
+        if pin:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        return self._trim()
+
+    def _trim(self):
+        """Вытесняет давние карточки сверх max_entries; возвращает удалённые с диска. Под self._lock."""
+        removed = []
+        while len(self._files) > self.max_entries:
+            path = self._files.popitem(last=False)[0]
+            self.evicted += 1
+            if path in self._pins:
+                self._doomed.add(path)
+            else:
+                _unlink(path)
+                removed.append(path)
+        return removed
+
+    def _forget(self, paths):
+        # без удаления файлов cards_dir и file_ids.json росли бы без предела
+        if paths and self.on_evict is not None:
+            self.on_evict(*paths)
+
+    def render(self, key):
+        """Рисует карточку по ключу из key() -> Image (RGB)."""
+        card = Image.new("RGBA", CARD_SIZE, BACKGROUND)
+        draw = ImageDraw.Draw(card)
+        width = CARD_SIZE[0]
+        top = 60
+        for side, (path, name, hp_step) in enumerate((key[:3], key[3:])):
+            x = 40 if side == 0 else width - 40 - SPRITE_SIZE
+            shiny = _is_shiny(path)
+            if shiny:
+                draw.rounded_rectangle((x - 6, top - 6, x + SPRITE_SIZE + 6, top + SPRITE_SIZE + 6),
+                                       radius=16, outline=SHINY_COLOR, width=4)
+            card.alpha_composite(self._sprite(path), (x, top))
+            draw.text((x + SPRITE_SIZE // 2, top - 28), _label(name), font=self._font,
+                      fill=SHINY_COLOR if shiny else TEXT_COLOR, anchor="mm")
+
+            fraction = hp_step / HP_STEPS
+            bar_top = top + SPRITE_SIZE + 16
+            draw.rectangle((x, bar_top, x + SPRITE_SIZE, bar_top + 14), fill=BAR_BACK)
+            if fraction > 0:
+                draw.rectangle((x, bar_top, x + round(SPRITE_SIZE * fraction), bar_top + 14),
+                               fill=_bar_color(fraction))
+        draw.text((width // 2, top + SPRITE_SIZE // 2), "VS", font=self._vs_font, fill=TEXT_COLOR, anchor="mm")
+        return card.convert("RGB")
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._files), "sprites": len(self._sprites), "hits": self.hits,
+                    "rendered": self.rendered, "evicted": self.evicted, "pinned": len(self._pins)}
@@ -1 +1,95 @@
 token = ""
+
+# Хранилище тренеров: "sqlite" (WAL, по умолчанию), "journal" (снимок + журнал изменений)
+# или "memory" (без сохранения)
+storage_backend = "sqlite"
+db_path = "pokemon.db"
+# Как часто (в секундах) сбрасывать изменённых тренеров в базу
+flush_interval = 5
+# Для "journal": каталог со снимком и сегментами журнала, период снимка в секундах
+journal_dir = "journal"
+snapshot_interval = 300
+# fsync после каждой записи журнала: надёжнее при отключении питания, но медленнее
+journal_fsync = False
+
+# Сколько потоков параллельно обрабатывают обновления Telegram
+num_threads = 4
+
+# Кэш file_id загруженных в Telegram картинок (путь -> хэш содержимого + file_id)
+file_id_cache_path = "file_ids.json"
+# Не переписывать его чаще раза в столько секунд (остальное — при остановке)
+file_id_save_interval = 5
+
+# /stats одним альбомом (send_media_group) вместо отдельного сообщения на покемона
+stats_batched = True
+
+# Превью /battle одной картинкой «A vs B» (cards.py, нужен Pillow): папка спрайтов,
+# папка готовых карточек и сколько их хранить (LRU; вытесненные файлы удаляются)
+sprites_dir = "images"
+cards_dir = "cards"
+card_cache_entries = 1024
+
+# Очередь исходящих (outbox.py): потоки отправки и лимиты Telegram, сообщений в секунду.
+# Лимит чата — без запаса: подряд идущие тексты в один чат и так склеиваются в одно сообщение
+outbox_workers = 8
+outbox_global_rate = 30
+outbox_chat_rate = 1
+outbox_group_rate = 20 / 60
+
+# Сессии /fight: "memory" (в процессе) или "sqlite" (общий файл для нескольких процессов).
+# Вызов живёт session_ttl секунд; при переполнении вытесняются давно не использованные
+session_backend = "memory"
+session_db_path = "sessions.db"
+session_ttl = 600
+session_max = 10_000
+session_sweep_interval = 60
+
+# Кэш готовых текстов /my, /pokemons, /stats: максимум записей и байт
+render_cache_entries = 10_000
+render_cache_bytes = 8 * 2**20
+
+# Таблица поимки для /catch: {"Pikachu": 10, "Dratini": 1, ...} — веса видов из POKEMON_DB
+# (виды без веса не попадаются); None — все виды с равным шансом
+spawn_weights = None
+
+# Лидеры залов для /gym: команды NPC (см. gyms.py)
+gyms_path = "gyms.json"
+
+# Турниры (/tournament, только для admin_ids): процессов в пуле (None — по числу ядер),
+# боёв в одной пачке для процесса, участников по умолчанию (лучшие по рейтингу), приз чемпиону
+tournament_workers = None
+tournament_batch = 500
+tournament_size = 1024
+tournament_prize = 1000
+
+# Рейтинговые бои /ranked (matchmaking.py): допустимая разница рейтингов в начале,
+# её рост за секунду ожидания и предел, сколько секунд ждать соперника,
+# как часто пересматривать очередь (секунды) и коэффициент K в формуле Эло
+ranked_window = 50
+ranked_widen = 10
+ranked_max_window = 400
+ranked_timeout = 120
+ranked_sweep_interval = 1
+rating_k = 32
+# Потоков, в которых играются бои, найденные фоновым проходом по очереди
+ranked_workers = 4
+
+# Полная таблица типов (18x18) вместо упрощённой «вода > огонь > трава > вода»
+full_type_chart = False
+
+# Telegram id администраторов: им доступны /metrics и /prof
+admin_ids = []
+# Порт локального эндпоинта http://127.0.0.1:<порт>/metrics (None — не поднимать)
+metrics_port = None
+
+# Приём обновлений: "polling" (long polling) или "webhook" (встроенный HTTP-сервер)
+mode = "polling"
+# Публичный адрес, по которому Telegram будет слать обновления (https://...)
+webhook_url = ""
+webhook_host = "0.0.0.0"
+webhook_port = 8443
+webhook_path = "/telegram"
+# Глубина очереди: при переполнении сервер отвечает 503 и Telegram повторит позже
+webhook_queue_size = 1000
+webhook_workers = 4
+webhook_secret = ""
@@ -0,0 +1,166 @@
+# ========================= fake_api.py =========================
+# Локальный поддельный Bot API для нагрузочных проверок без Telegram:
+# отвечает на sendMessage / sendPhoto / sendMediaGroup / editMessageText и т.п.
+# и, как настоящий, возвращает 429 retry_after при превышении лимитов.
+#
+#   server = FakeBotAPI(chat_rate=1, global_rate=30).start()
+#   apihelper.API_URL = server.api_url
+#
+# install_null_api() — то же без сети и лимитов, прямо в процессе (для замеров CPU).
+
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeBotAPI:
+    """
+    Лимиты считаются скользящим окном в одну секунду: не больше chat_rate
+    сообщений в чат и global_rate на бота. latency — задержка ответа, секунды.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, chat_rate=1, global_rate=30, latency=0.0):
+        self.address = (host, port)
+        self.chat_rate = chat_rate
+        self.global_rate = global_rate
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._chat_sent = {}  # chat_id -> [время отправки]
+        self._global_sent = []
+        self._message_id = 0
+        self.requests = 0
+        self.delivered = {}  # chat_id -> [тексты/подписи по порядку]
+        self.throttled = 0
+        self.httpd = None
+
+    @property
+    def api_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def _admit(self, chat_id, now):
+        """0 — можно отправлять, иначе retry_after в секундах."""
+        sent = self._chat_sent.setdefault(chat_id, [])
+        for window in (sent, self._global_sent):
+            while window and window[0] <= now - 1:
+                window.pop(0)
+        if len(sent) >= self.chat_rate:
+            return max(1, math.ceil(sent[0] + 1 - now))
+        if len(self._global_sent) >= self.global_rate:
+            return max(1, math.ceil(self._global_sent[0] + 1 - now))
+        sent.append(now)
+        self._global_sent.append(now)
+        return 0
+
+    def _message(self, chat_id, **extra):
+        self._message_id += 1
+        message = {"message_id": self._message_id, "date": int(time.time()),
+                   "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"}}
+        message.update(extra)
+        return message
+
+    def _photo(self, chat_id, caption):
+        file_id = f"fake-photo-{self._message_id + 1}"
+        return self._message(chat_id, caption=caption, photo=[
+            {"file_id": file_id, "file_unique_id": file_id, "width": 320, "height": 320}])
+
+    def handle(self, method, params):
+        """(HTTP-код, JSON-ответ) для вызова `method` с параметрами params."""
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}}
+        if method == "answerCallbackQuery":
+            return 200, {"ok": True, "result": True}
+
+        chat_id = int(params.get("chat_id", 0))
+        with self._lock:
+            self.requests += 1
+            retry_after = self._admit(chat_id, time.monotonic())
+            if retry_after:
+                self.throttled += 1
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {retry_after}",
+                             "parameters": {"retry_after": retry_after}}
+            log = self.delivered.setdefault(chat_id, [])
+            if method == "sendMessage":
+                log.append(params.get("text", ""))
+                result = self._message(chat_id, text=params.get("text", ""))
+            elif method == "sendPhoto":
+                log.append(params.get("caption", ""))
+                result = self._photo(chat_id, params.get("caption"))
+            elif method == "sendMediaGroup":
+                media = json.loads(params.get("media", "[]"))
+                log.extend(item.get("caption", "") for item in media)
+                result = [self._photo(chat_id, item.get("caption")) for item in media]
+            elif method == "editMessageText":
+                log.append(params.get("text", ""))
+                result = self._message(chat_id, text=params.get("text", ""))
+            else:
+                return 400, {"ok": False, "error_code": 400, "description": f"Bad Request: unknown method {method}"}
+        return 200, {"ok": True, "result": result}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                url = urlparse(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length", 0))
+                if length:
+                    body = self.rfile.read(length)
+                    if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                        params.update({k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()})
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload = server.handle(method, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer(self.address, self._make_handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name="fake-bot-api", daemon=True).start()
+        return self
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+
+class _NullResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def install_null_api():
+    """Запросы telebot отвечаются сразу, без HTTP: FakeBotAPI без лимитов в этом же процессе."""
+    from telebot import apihelper
+
+    api = FakeBotAPI(chat_rate=math.inf, global_rate=math.inf)
+
+    def sender(method, url, params=None, files=None, **kwargs):
+        params = {k: str(v) for k, v in (params or {}).items()}
+        api.delivered.clear()  # тексты не копим — важна только стоимость вызова
+        return _NullResponse(api.handle(url.rsplit("/", 1)[-1], params)[1])
+
+    apihelper.CUSTOM_REQUEST_SENDER = sender
+    return api
@@ -0,0 +1,90 @@
+# ========================= gyms.py =========================
+# Лидеры залов (NPC) для /gym: описаны в gyms.json и собираются один раз
+# при запуске. На каждый бой выдаётся своя копия лидера — шаблон не меняется,
+# в реестр тренеров, рейтинг и журнал NPC не попадают.
+
+import json
+
+from logic import Pokemon, Trainer
+from render_cache import next_version
+
+
+class GymLeader(Trainer):
+    """
+    NPC-тренер на один бой: не регистрируется в Trainer.trainers (создаётся
+    через from_dict), touch() не трогает рейтинг, изменения не пишутся в журнал.
+    Бой не берёт блокировку по его имени — копия у каждого боя своя.
+    """
+
+    npc = True
+
+    def touch(self):
+        self._version = next_version()
+
+    def _record(self, op, make_arg):
+        pass
+
+
+class Gym:
+    """Зал: название, имя лидера и шаблон команды (dict в формате Trainer.to_dict)."""
+
+    __slots__ = ("id", "title", "leader", "template")
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.title = data["title"]
+        self.leader = data["leader"]
+        team = []
+        for i, spec in enumerate(data["team"]):
+            # статы и IV фиксированы в файле — ничего не разыгрывается на каждый бой
+            p = Pokemon(spec["name"], spec["type"], spec["hp"], spec["attack"], spec["defense"], spec["speed"],
+                        spec.get("image_path"), spec.get("ivs", (15, 15, 15, 15)), spec.get("can_evolve", False))
+            p.id = f"gym-{self.id}-{i}"
+            p.level = spec.get("level", 1)
+            team.append(p.to_dict())
+        self.template = {"name": self.leader, "pokemons": team, "items": {}, "coins": 0,
+                         "battles_won": 0, "battles_lost": 0, "last_daily": None}
+
+    def leader_for_battle(self):
+        """Свежая копия лидера для одного боя."""
+        return GymLeader.from_dict(self.template)
+
+    def team(self):
+        return [p["name"] for p in self.template["pokemons"]]
+
+
+class GymRegistry:
+    """Залы в порядке из файла; первый — зал по умолчанию для /gym без аргумента."""
+
+    def __init__(self, gyms):
+        self._gyms = {gym.id: gym for gym in gyms}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(Gym(data) for data in json.load(f))
+
+    def get(self, gym_id=None):
+        """Зал по id (None — первый); None, если такого нет."""
+        if gym_id is None:
+            return next(iter(self._gyms.values()), None)
+        return self._gyms.get(gym_id.lower())
+
+    def __iter__(self):
+        return iter(self._gyms.values())
+
+    def __len__(self):
+        return len(self._gyms)
+
+    def leader_names(self):
+        return [gym.leader for gym in self]
+
+    def forget_leaders(self, trainers, leaderboard):
+        """
+        Раньше /gym регистрировал лидера как обычного тренера — он сохранялся
+        в базе и попадал в /top. Убирает таких «тренеров» из реестра и рейтинга.
+        """
+        for name in self.leader_names():
+            if name in trainers:
+                del trainers[name]
+            leaderboard.remove(name)
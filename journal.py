@@ -0,0 +1,268 @@
+# ========================= journal.py =========================
+# Хранилище «снимок + журнал»: каждое изменение — одна короткая запись
+# в конец файла, фоновый снимок периодически сжимает журнал.
+# Старт: последний снимок + проигрывание хвоста журнала.
+
+import glob
+import json
+import os
+import struct
+import threading
+import zlib
+
+from storage import Storage
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен — без него записи в JSON
+    msgpack = None
+
+# Запись: длина (4 байта) + crc32 (4 байта) + полезная нагрузка
+HEADER = struct.Struct("<II")
+
+# Каждый файл (сегмент журнала и снимок) начинается с MAGIC и байта кодека:
+# читается тем кодеком, которым записан, а не тем, что сейчас установлен
+MAGIC = b"PKJ1"
+JSON, MSGPACK = b"J", b"M"
+CODEC = MSGPACK if msgpack is not None else JSON
+
+
+def encode(obj):
+    if CODEC == MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(data, codec):
+    if codec == MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("журнал записан в msgpack, а он не установлен: pip install msgpack")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def _legacy_codec(payload):
+    # файлы до появления MAGIC: JSON-запись — всегда массив или объект
+    return JSON if payload[:1] in (b"[", b"{") else MSGPACK
+
+
+def read_header(data):
+    """-> (кодек, смещение данных). Без MAGIC — старый файл, кодек по первой записи."""
+    if data.startswith(MAGIC):
+        return data[len(MAGIC):len(MAGIC) + 1], len(MAGIC) + 1
+    return None, 0
+
+
+def read_records(path):
+    """
+    Читает записи журнала -> (записи, длина корректной части файла).
+    Оборванная или битая запись в конце (падение во время записи) отбрасывается.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    codec, pos = read_header(data)
+    records = []
+    while pos + HEADER.size <= len(data):
+        length, crc = HEADER.unpack_from(data, pos)
+        payload = data[pos + HEADER.size:pos + HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(decode(payload, codec or _legacy_codec(payload)))
+        pos += HEADER.size + length
+    return records, pos
+
+
+class JournalStorage(Storage):
+    """
+    Операции журнала (op, имя тренера, аргумент):
+      put        — полное состояние тренера (новый тренер или сброс реестра)
+      fields     — {поле: значение} для монет, предметов, побед и т.п.
+      pokemon    — покемон целиком (вставка или замена по id)
+      pokemon_del — id отпущенного покемона
+      del        — удаление тренера
+    """
+
+    journaling = True
+
+    def __init__(self, directory, fsync=False):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        # имя -> dict тренера. Все тренеры в памяти (ленивой загрузки реестра здесь нет):
+        # dict тренера после записи в _state не меняется — _apply кладёт новый,
+        # поэтому snapshot() хватает поверхностной копии
+        self._state = {}
+        self._summaries = {}  # имя -> summary (JSON) или None, если устарел
+        os.makedirs(directory, exist_ok=True)
+        # после восстановления — всегда новый сегмент: в старый (возможно, другим
+        # кодеком) не дописываем
+        self.segment = self._recover() + 1
+        self._file = self._open_segment(self.segment)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{segment:06d}.log")
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, "snapshot.bin")
+
+    def _open_segment(self, segment):
+        f = open(self._segment_path(segment), "ab")
+        if f.tell() == 0:
+            f.write(MAGIC + CODEC)
+            f.flush()
+        return f
+
+    # ---------- восстановление ----------
+
+    def _recover(self):
+        segment = 1
+        snapshot = self._snapshot_path()
+        if os.path.exists(snapshot):
+            with open(snapshot, "rb") as f:
+                raw = f.read()
+            codec, pos = read_header(raw)
+            data = decode(raw[pos:], codec or _legacy_codec(raw))
+            segment = data["segment"]
+            self._state = data["state"]
+            self._summaries = data["summaries"]
+
+        segments = sorted(glob.glob(os.path.join(self.directory, "*.log")))
+        for path in segments:
+            number = int(os.path.basename(path).split(".")[0])
+            if number < segment:
+                continue
+            records, valid = read_records(path)
+            for op, name, arg in records:
+                self._apply(op, name, arg)
+            if valid < os.path.getsize(path):
+                # обрезаем хвост, иначе новые записи окажутся за битой
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+            segment = max(segment, number)
+        return segment
+
+    def _apply(self, op, name, arg):
+        if op == "put":
+            data, summary = arg
+            self._state[name] = data
+            self._summaries[name] = summary
+            return
+        if op == "del":
+            self._state.pop(name, None)
+            self._summaries.pop(name, None)
+            return
+
+        trainer = self._state.get(name)
+        if trainer is None:
+            return
+        self._summaries[name] = None
+        # не меняем старый dict на месте — его может сейчас сериализовать snapshot()
+        trainer = dict(trainer)
+        if op == "fields":
+            trainer.update(arg)
+        elif op == "pokemon":
+            pokemons = list(trainer["pokemons"])
+            for i, p in enumerate(pokemons):
+                if p["id"] == arg["id"]:
+                    pokemons[i] = arg
+                    break
+            else:
+                pokemons.append(arg)
+            trainer["pokemons"] = pokemons
+        elif op == "pokemon_del":
+            trainer["pokemons"] = [p for p in trainer["pokemons"] if p["id"] != arg]
+        self._state[name] = trainer
+
+    # ---------- запись ----------
+
+    def _append(self, op, name, arg):
+        # вызывается под self._lock
+        payload = encode([op, name, arg])
+        self._file.write(HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._apply(op, name, arg)
+
+    def record(self, op, name, arg):
+        with self._lock:
+            self._append(op, name, arg)
+
+    def save_many(self, rows):
+        # реестр сбрасывает изменённых тренеров и здесь, но их изменения обычно
+        # уже в журнале — тогда второй полной записи "put" не нужно
+        with self._lock:
+            for name, data, summary in rows:
+                state = json.loads(data)
+                if self._state.get(name) == state:
+                    self._summaries[name] = summary  # попадёт в следующий снимок
+                    continue
+                self._append("put", name, [state, summary])
+
+    def delete(self, name):
+        with self._lock:
+            self._append("del", name, None)
+
+    # ---------- чтение ----------
+
+    def load(self, name):
+        with self._lock:
+            data = self._state.get(name)
+            return None if data is None else json.dumps(data, ensure_ascii=False)
+
+    def exists(self, name):
+        with self._lock:
+            return name in self._state
+
+    def keys(self):
+        with self._lock:
+            return list(self._state)
+
+    def summaries(self):
+        with self._lock:
+            return list(self._summaries.items())
+
+    # ---------- снимок ----------
+
+    def snapshot(self):
+        """
+        Пишет снимок текущего состояния и удаляет покрытые им сегменты журнала.
+        Под блокировкой — только переключение сегмента и копия словарей;
+        сериализация идёт без неё, record() в это время не ждёт.
+        """
+        with self._lock:
+            self._file.close()
+            self.segment += 1
+            self._file = self._open_segment(self.segment)
+            covered = self.segment
+            state, summaries = dict(self._state), dict(self._summaries)
+
+        data = encode({"segment": covered, "state": state, "summaries": summaries})
+        tmp = self._snapshot_path() + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + CODEC + data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._snapshot_path())
+
+        for path in glob.glob(os.path.join(self.directory, "*.log")):
+            if int(os.path.basename(path).split(".")[0]) < covered:
+                os.remove(path)
+
+    def start_snapshots(self, interval):
+        """Фоновый поток, делающий снимок раз в `interval` секунд."""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    print(f"Ошибка снимка журнала: {e}")
+
+        self._stop = threading.Event()
+        threading.Thread(target=loop, name="journal-snapshot", daemon=True).start()
+
+    def close(self):
+        if hasattr(self, "_stop"):
+            self._stop.set()
+        with self._lock:
+            self._file.close()
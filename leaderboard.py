@@ -0,0 +1,79 @@
+# ========================= leaderboard.py =========================
+# Инкрементальный рейтинг для /top и /top_pokemons.
+# Ключи хранятся в отсортированных списках (bisect), поэтому обновление
+# одного тренера — O(log N) на поиск, а топ-K — срез из K элементов.
+
+import threading
+from bisect import bisect_left, insort
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trainer_keys = {}  # имя тренера -> ключ в self._trainers
+        self._trainers = []  # (-уровни, -сила, имя)
+        self._pokemon_keys = {}  # имя тренера -> ключи его покемонов в self._pokemons
+        self._pokemons = []  # (-сила, тренер, номер, имя, тип, уровень, победы)
+
+    def __len__(self):
+        return len(self._trainers)
+
+    @staticmethod
+    def _discard(sorted_list, key):
+        i = bisect_left(sorted_list, key)
+        if i < len(sorted_list) and sorted_list[i] == key:
+            del sorted_list[i]
+
+    def _remove(self, name):
+        old = self._trainer_keys.pop(name, None)
+        if old is not None:
+            self._discard(self._trainers, old)
+        for key in self._pokemon_keys.pop(name, ()):
+            self._discard(self._pokemons, key)
+
+    def update(self, name, summary):
+        """summary — результат Trainer.summary(): уровни, сила и строки покемонов."""
+        trainer_key = (-summary["level"], -summary["power"], name)
+        pokemon_keys = [
+            (-power, name, i, p_name, p_type, level, wins)
+            for i, (p_name, p_type, level, power, wins) in enumerate(summary["pokemons"])
+        ]
+        with self._lock:
+            if self._trainer_keys.get(name) == trainer_key and self._pokemon_keys.get(name) == pokemon_keys:
+                return
+            self._remove(name)
+            self._trainer_keys[name] = trainer_key
+            insort(self._trainers, trainer_key)
+            self._pokemon_keys[name] = pokemon_keys
+            for key in pokemon_keys:
+                insort(self._pokemons, key)
+
+    def remove(self, name):
+        with self._lock:
+            self._remove(name)
+
+    def load(self, summaries):
+        """Заполняет рейтинг пачкой (имя, summary) — одна сортировка вместо N вставок."""
+        with self._lock:
+            for name, summary in summaries:
+                self._remove(name)
+                self._trainer_keys[name] = (-summary["level"], -summary["power"], name)
+                self._pokemon_keys[name] = [
+                    (-power, name, i, p_name, p_type, level, wins)
+                    for i, (p_name, p_type, level, power, wins) in enumerate(summary["pokemons"])
+                ]
+            self._trainers = sorted(self._trainer_keys.values())
+            self._pokemons = sorted(k for keys in self._pokemon_keys.values() for k in keys)
+
+    def top_trainers(self, k):
+        """[(имя, сумма уровней, сила), ...] по убыванию."""
+        with self._lock:
+            return [(name, -lvl, -power) for lvl, power, name in self._trainers[:k]]
+
+    def top_pokemons(self, k):
+        """[(имя, тип, тренер, сила, уровень, победы), ...] по убыванию силы."""
+        with self._lock:
+            return [
+                (p_name, p_type, trainer, -power, level, wins)
+                for power, trainer, _, p_name, p_type, level, wins in self._pokemons[:k]
+            ]
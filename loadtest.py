@@ -0,0 +1,462 @@
+# ========================= loadtest.py =========================
+# Нагрузка на бота без Telegram: синтетические тренеры и поток обновлений
+# (/catch, /battle, /top, /buy, /fight с кнопками ...) прогоняются через
+# настоящие обработчики main.py. Ответы вместо Telegram получает
+# RecordingOutbox, остальные вызовы API — install_null_api() из fake_api.py.
+#
+#   python loadtest.py generate --trainers 10000 --updates 100000
+#   python loadtest.py run --population population.json --stream updates.jsonl --threads 4
+#   python loadtest.py run --trainers 1000 --updates 20000 --rate 1000
+#
+# Отчёт: обновлений в секунду, p50/p99 по видам обновлений, рост памяти процесса.
+# Поток — JSON обновлений Telegram по одному в строке, как у `python webhook.py replay`.
+
+import argparse
+import heapq
+import json
+import os
+import random
+import resource
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from logic import SHOP_PRICES, Trainer
+from webhook import percentile
+
+# Доли видов обновлений в синтетическом потоке. "fight" — это /fight и три
+# нажатия кнопок следом (выбор, принятие, выбор соперника), "ranked" — /ranked
+# и выбор покемона для очереди рейтинговых боёв
+MIX = {"catch": 20, "battle": 25, "top": 10, "buy": 15, "my": 15, "daily": 5, "fight": 10, "ranked": 5}
+
+# id пользователя Telegram для тренера номер i синтетической популяции
+USER_ID_BASE = 10_000_000
+
+
+# ---------- популяция ----------
+
+def build_population(trainers, seed=0):
+    """Тренеры lt_0 ... lt_{n-1}, у каждого 1-6 покемонов (Trainer.add_pokemon) и немного монет."""
+    rng = random.Random(seed)
+    random.seed(seed)
+    for i in range(trainers):
+        t = Trainer(f"lt_{i}")
+        for _ in range(rng.randint(1, 6)):
+            t.add_pokemon()
+        t.coins = rng.randint(0, 2000)
+        t.battles_won = rng.randint(0, 50)
+        t.battles_lost = rng.randint(0, 50)
+        t.touch()
+
+
+def save_population(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([t.to_dict() for t in Trainer.trainers.values()], f, ensure_ascii=False)
+
+
+def load_population(path):
+    with open(path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    for data in snapshot:
+        Trainer.trainers[data["name"]] = Trainer.from_dict(data)
+    Trainer.leaderboard.load((t.name, t.summary()) for t in Trainer.trainers.values())
+    return len(snapshot)
+
+
+# ---------- поток обновлений ----------
+
+class StreamGenerator:
+    """
+    Синтетические обновления Telegram от тренеров текущей популяции.
+    new_users — доля обновлений от новых игроков (их тренер создаётся первым /catch).
+
+    В кнопках /fight вместо id вызова стоит `@<update_id команды /fight>`:
+    настоящий id выдаёт обработчик, replay подставляет его (см. Replay).
+    """
+
+    def __init__(self, mix=None, new_users=0.05, seed=0):
+        self.rng = random.Random(seed)
+        self.mix = mix or MIX
+        self.new_users = new_users
+        self.kinds = list(self.mix)
+        self.weights = list(self.mix.values())
+        self.trainers = sorted(Trainer.trainers.values(), key=lambda t: t.name)
+        self.user_ids = {t.name: USER_ID_BASE + i for i, t in enumerate(self.trainers)}
+        self.items = list(SHOP_PRICES)
+        self.update_id = 0
+        self.message_id = 0
+        self.new_count = 0
+        self.date = int(time.time())
+
+    def _user_of(self, trainer):
+        return {"id": self.user_ids[trainer.name], "is_bot": False, "first_name": trainer.name,
+                "username": trainer.name}
+
+    def _user(self):
+        """(пользователь Telegram, его тренер или None для нового игрока)."""
+        if not self.trainers or self.rng.random() < self.new_users:
+            self.new_count += 1
+            return {"id": USER_ID_BASE * 2 + self.new_count, "is_bot": False,
+                    "first_name": "new", "username": f"new_{self.new_count}"}, None
+        trainer = self.rng.choice(self.trainers)
+        return self._user_of(trainer), trainer
+
+    def _message(self, user, text):
+        self.update_id += 1
+        self.message_id += 1
+        command = text.split(maxsplit=1)[0]
+        return {"update_id": self.update_id, "message": {
+            "message_id": self.message_id, "date": self.date, "from": user,
+            "chat": {"id": user["id"], "type": "private"}, "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]}}
+
+    def _callback(self, user, data):
+        self.update_id += 1
+        return {"update_id": self.update_id, "callback_query": {
+            "id": str(self.update_id), "from": user, "chat_instance": "load", "data": data,
+            "message": {"message_id": self.message_id, "date": self.date,
+                        "chat": {"id": user["id"], "type": "private"}, "text": "⚔️"}}}
+
+    def generate(self, count):
+        """Список из count обновлений (dict). Кнопки /fight приходят через 1-20 обновлений после команды."""
+        later = []  # куча (номер, по порядку, функция -> обновление)
+        order = 0
+        updates = []
+        while len(updates) < count:
+            if later and later[0][0] <= len(updates):
+                updates.append(heapq.heappop(later)[2]())
+                continue
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            user, trainer = self._user()
+            if kind == "ranked" and trainer is not None:
+                updates.append(self._message(user, "/ranked"))
+                order += 1
+                data = f"ranked_{self.rng.choice(trainer.pokemons).id}"
+                heapq.heappush(later, (len(updates) + self.rng.randint(1, 20), order,
+                                       lambda u=user, d=data: self._callback(u, d)))
+                continue
+            if kind == "fight":
+                opponent = self.rng.choice(self.trainers) if self.trainers else None
+                if trainer is None or opponent is None or opponent is trainer:
+                    kind = "catch"
+                else:
+                    fight = self._message(user, f"/fight {opponent.name}")
+                    updates.append(fight)
+                    challenge = f"@{fight['update_id']}"
+                    opponent_user = self._user_of(opponent)
+                    steps = [
+                        (user, f"pick_{challenge}_{self.rng.choice(trainer.pokemons).id}"),
+                        (opponent_user, f"accept_{challenge}"),
+                        (opponent_user, f"pick_{challenge}_{self.rng.choice(opponent.pokemons).id}"),
+                    ]
+                    at = len(updates)
+                    for step_user, data in steps:
+                        at += self.rng.randint(1, 20)
+                        order += 1
+                        heapq.heappush(later, (at, order,
+                                               lambda u=step_user, d=data: self._callback(u, d)))
+                    continue
+            if kind == "battle":
+                opponent = self.rng.choice(self.trainers) if self.trainers else None
+                text = f"/battle {opponent.name}" if opponent else "/battle"
+            elif kind == "buy":
+                text = f"/buy {self.rng.choice(self.items)}"
+            else:
+                text = f"/{kind}"
+            updates.append(self._message(user, text))
+        return updates[:count]
+
+
+def parse_mix(pairs):
+    """["catch=3", "top=1"] -> {"catch": 3, "top": 1}."""
+    mix = {}
+    for pair in pairs:
+        kind, _, weight = pair.partition("=")
+        if kind not in MIX or not weight:
+            raise ValueError(f"Ожидается вид=вес, виды: {', '.join(MIX)}; получено {pair}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def update_kind(update):
+    """Вид обновления для отчёта: команда (/catch) или префикс данных кнопки (cb:pick)."""
+    if "callback_query" in update:
+        return "cb:" + update["callback_query"].get("data", "").split("_", 1)[0]
+    text = update.get("message", {}).get("text") or ""
+    return text.split(maxsplit=1)[0].split("@", 1)[0] if text.startswith("/") else "text"
+
+
+# ---------- прогон через обработчики ----------
+
+class RecordingOutbox:
+    """
+    Вместо outbox.Outbox: ничего не отправляет, считает вызовы по методам
+    и помнит последние `keep` (метод, chat_id, текст). Кнопки /fight запоминаются
+    как id вызова для обновления, которое сейчас обрабатывается в этом потоке.
+    """
+
+    def __init__(self, keep=100):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.calls = Counter()
+        self.recent = deque(maxlen=keep)
+        self.challenges = {}  # update_id команды /fight -> настоящий id вызова
+
+    def _record(self, method, chat_id, text, kwargs):
+        markup = kwargs.get("reply_markup")
+        update_id = getattr(self._local, "update_id", None)
+        if markup is not None and update_id is not None:
+            for row in markup.keyboard:
+                for button in row:
+                    data = button.callback_data or ""
+                    if data.startswith("pick_"):
+                        self.challenges.setdefault(update_id, data.split("_", 2)[1])
+        with self._lock:
+            self.calls[method] += 1
+            self.recent.append((method, chat_id, text))
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._record("send_message", chat_id, text, kwargs)
+
+    def reply_to(self, message, text, **kwargs):
+        self._record("send_message", message.chat.id, text, kwargs)
+
+    def send_photo(self, chat_id, image_path, caption=None, on_done=None, **kwargs):
+        self._record("send_photo", chat_id, caption, kwargs)
+        if on_done is not None:
+            on_done()
+
+    def send_album(self, chat_id, photos, parse_mode=None):
+        self._record("send_album", chat_id, "\n".join(caption for _, caption in photos), {})
+
+    def call(self, chat_id, func, *args, **kwargs):
+        self._record(getattr(func, "__name__", "call"), chat_id, args[0] if args else None, kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": 0, "chats": 0, "sent": sum(self.calls.values()), "coalesced": 0,
+                    "throttled": 0, "retried": 0, "failed": 0}
+
+
+def rss_bytes():
+    """Текущий RSS процесса; без /proc — пиковый (ru_maxrss)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Replay:
+    """
+    Прогоняет поток через bot.process_new_updates из main.py синхронно
+    (bot.threaded = False), в threads потоках. rate — темп подачи, обновлений
+    в секунду: тогда задержка считается от запланированного момента и включает
+    ожидание, если обработчики не успевают (как очередь webhook-режима).
+    """
+
+    def __init__(self, threads=1, rate=None, sample_every=1000):
+        import config
+        if not config.token:
+            config.token = "1:loadtest"
+        from fake_api import install_null_api
+        install_null_api()
+        import main
+
+        main.bot.threaded = False
+        self.main = main
+        self.outbox = main.outbox = RecordingOutbox()
+        self.threads = threads
+        self.rate = rate
+        self.sample_every = sample_every
+        self._lock = threading.Lock()
+        self.latency = {}  # вид -> [секунды]
+        self.errors = Counter()
+        self.memory = []  # [(обработано, RSS в байтах)]
+        self.done = 0
+
+    def _resolve(self, update):
+        # "@<update_id>" в кнопках -> id вызова, который выдал обработчик /fight
+        query = update.get("callback_query")
+        if query and "_@" in query.get("data", ""):
+            prefix, rest = query["data"].split("_@", 1)
+            fight_update, _, tail = rest.partition("_")
+            challenge = self.outbox.challenges.get(int(fight_update), "expired")
+            query["data"] = f"{prefix}_{challenge}" + (f"_{tail}" if tail else "")
+        return update
+
+    def _handle(self, update, scheduled):
+        from telebot.types import Update
+
+        kind = update_kind(update)
+        if self.rate:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            scheduled = time.perf_counter()
+        self.outbox._local.update_id = update["update_id"]
+        failed = False
+        try:
+            body = json.dumps(self._resolve(update))
+            self.main.bot.process_new_updates([Update.de_json(body)])
+        except Exception:
+            failed = True
+        elapsed = time.perf_counter() - scheduled
+        with self._lock:
+            self.latency.setdefault(kind, []).append(elapsed)
+            if failed:
+                self.errors[kind] += 1
+            self.done += 1
+            if self.done % self.sample_every == 0:
+                self.memory.append((self.done, rss_bytes()))
+
+    def run(self, updates):
+        """Возвращает отчёт (dict) — его же печатает print_report."""
+        self.memory.append((0, rss_bytes()))
+        start = time.perf_counter()
+        interval = 1 / self.rate if self.rate else 0
+        schedule = (start + i * interval for i in range(len(updates)))
+        if self.threads <= 1:
+            for update, scheduled in zip(updates, schedule):
+                self._handle(update, scheduled)
+        else:
+            with ThreadPoolExecutor(self.threads) as pool:
+                list(pool.map(self._handle, updates, schedule))
+        elapsed = time.perf_counter() - start
+        self.memory.append((self.done, rss_bytes()))
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        everything = [value for values in self.latency.values() for value in values]
+        kinds = {}
+        for kind, values in sorted(self.latency.items(), key=lambda item: -len(item[1])):
+            kinds[kind] = {"count": len(values), "errors": self.errors[kind],
+                           "p50_ms": percentile(values, 0.5) * 1000,
+                           "p99_ms": percentile(values, 0.99) * 1000,
+                           "max_ms": max(values) * 1000}
+        first, last = self.memory[0][1], self.memory[-1][1]
+        # утечки видны по второй половине прогона: прогрев (кэши, новые тренеры) уже прошёл
+        middle = self.memory[len(self.memory) // 2]
+        tail_updates = max(1, self.done - middle[0])
+        return {
+            "updates": self.done,
+            "seconds": elapsed,
+            "throughput": self.done / elapsed if elapsed else 0.0,
+            "threads": self.threads,
+            "rate": self.rate,
+            "p50_ms": percentile(everything, 0.5) * 1000,
+            "p99_ms": percentile(everything, 0.99) * 1000,
+            "errors": sum(self.errors.values()),
+            "kinds": kinds,
+            "outbox_calls": dict(self.outbox.calls),
+            # вызовы bot.* в обход outbox (answer_callback_query и т.п.) — по метрикам main.py
+            "api_calls": {method: hist.count for method, hist in self.main.metrics.api_latency.items()},
+            "trainers": len(Trainer.trainers),
+            "rss_start_mb": first / 2**20,
+            "rss_end_mb": last / 2**20,
+            "rss_growth_mb": (last - first) / 2**20,
+            "tail_growth_kb_per_1k": (last - middle[1]) / 1024 / tail_updates * 1000,
+            "memory_samples": self.memory,
+        }
+
+
+def print_report(report):
+    print(f"Обновлений: {report['updates']} за {report['seconds']:.2f} с — "
+          f"{report['throughput']:.0f}/с (потоков: {report['threads']}, "
+          f"темп: {report['rate'] or 'без паузы'})")
+    print(f"Задержка: p50 {report['p50_ms']:.2f} мс, p99 {report['p99_ms']:.2f} мс, ошибок: {report['errors']}")
+    print(f"{'вид':>14} | {'число':>7} | {'p50 мс':>7} | {'p99 мс':>7} | {'макс мс':>8} | {'ошибок':>6}")
+    for kind, row in report["kinds"].items():
+        print(f"{kind:>14} | {row['count']:>7} | {row['p50_ms']:>7.2f} | {row['p99_ms']:>7.2f} | "
+              f"{row['max_ms']:>8.2f} | {row['errors']:>6}")
+    calls = ", ".join(f"{method}={count}" for method, count in sorted(report["outbox_calls"].items()))
+    api = ", ".join(f"{method}={count}" for method, count in sorted(report["api_calls"].items()))
+    print(f"Ответов через outbox: {calls}; напрямую через bot: {api or 'нет'}")
+    print(f"Память (RSS): {report['rss_start_mb']:.1f} -> {report['rss_end_mb']:.1f} МБ "
+          f"(+{report['rss_growth_mb']:.1f}), вторая половина прогона: "
+          f"{report['tail_growth_kb_per_1k']:.1f} КБ на 1000 обновлений; тренеров: {report['trainers']}")
+
+
+# ---------- командная строка ----------
+
+def _population(args):
+    started = time.perf_counter()
+    if args.population and os.path.exists(args.population):
+        count = load_population(args.population)
+        print(f"Популяция: {count} тренеров из {args.population} ({time.perf_counter() - started:.1f} с)")
+    else:
+        build_population(args.trainers, args.seed)
+        print(f"Популяция: {args.trainers} тренеров ({time.perf_counter() - started:.1f} с)")
+
+
+def _generate(args):
+    generator = StreamGenerator(args.mix, args.new_users, args.seed)
+    return generator.generate(args.updates)
+
+
+def cmd_generate(args):
+    _population(args)
+    if args.population and not os.path.exists(args.population):
+        save_population(args.population)
+    updates = _generate(args)
+    with open(args.stream, "w", encoding="utf-8") as f:
+        for update in updates:
+            f.write(json.dumps(update, ensure_ascii=False) + "\n")
+    print(f"Записано: {args.population} и {len(updates)} обновлений в {args.stream}")
+
+
+def cmd_run(args):
+    replay = Replay(args.threads, args.rate, args.sample_every)
+    _population(args)
+    if args.stream:
+        with open(args.stream, encoding="utf-8") as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = _generate(args)
+    report = replay.run(updates)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработчиков бота без Telegram")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def population_args(p):
+        p.add_argument("--trainers", type=int, default=1000, help="размер синтетической популяции")
+        p.add_argument("--updates", type=int, default=10_000)
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--mix", nargs="*", help=f"доли видов, например catch=3 top=1 (виды: {', '.join(MIX)})")
+        p.add_argument("--new-users", type=float, default=0.05, help="доля обновлений от новых игроков")
+
+    generate = sub.add_parser("generate", help="записать популяцию и поток обновлений в файлы")
+    population_args(generate)
+    generate.add_argument("--population", default="population.json")
+    generate.add_argument("--stream", default="updates.jsonl")
+
+    run = sub.add_parser("run", help="прогнать поток через обработчики и напечатать отчёт")
+    population_args(run)
+    run.add_argument("--population", help="снимок популяции (generate); без него — синтетическая")
+    run.add_argument("--stream", help="файл обновлений (generate или записанный); без него — синтетический")
+    run.add_argument("--threads", type=int, default=1, help="потоков-обработчиков (как num_threads)")
+    run.add_argument("--rate", type=float, default=None, help="обновлений в секунду (по умолчанию — без паузы)")
+    run.add_argument("--sample-every", type=int, default=1000, help="замер памяти каждые N обновлений")
+    run.add_argument("--json", help="записать отчёт в JSON")
+
+    args = parser.parse_args()
+    try:
+        args.mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "generate":
+        cmd_generate(args)
+    else:
+        cmd_run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,22 @@
 # Полный модуль логики покемон-бота
 
 import random
+import gc
 import json
+import math
 import os
-from datetime import datetime
+import secrets
+import threading
+from array import array
+from bisect import bisect
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, date
+from functools import wraps
+from itertools import accumulate
+
+from storage import TrainerRegistry
+from leaderboard import Leaderboard
+from render_cache import render_cache, next_version
 
 TYPE_EMOJI = {
     "fire": "🔥",
@@ -27,6 +40,157 @@ TYPE_EMOJI = {
     "fairy": "🧚"
 }
 
+# Типы интернируются в маленькие целые (индекс в TYPE_EMOJI) при создании покемона
+TYPE_IDS = {t: i for i, t in enumerate(TYPE_EMOJI)}
+
+
+def type_id(type_name):
+    # неизвестный тип считаем нормальным
+    return TYPE_IDS.get(type_name.lower(), TYPE_IDS["normal"])
+
+
+# Множители урона: атакующий -> {защищающийся: множитель}, всё остальное 1.0
+SIMPLE_TYPE_CHART = {
+    "water": {"fire": 2.0},
+    "fire": {"grass": 2.0},
+    "grass": {"water": 2.0},
+}
+
+# Полная таблица типов из основных игр
+FULL_TYPE_CHART = {
+    "normal": {"rock": 0.5, "steel": 0.5, "ghost": 0.0},
+    "fire": {"grass": 2.0, "ice": 2.0, "bug": 2.0, "steel": 2.0,
+             "fire": 0.5, "water": 0.5, "rock": 0.5, "dragon": 0.5},
+    "water": {"fire": 2.0, "ground": 2.0, "rock": 2.0,
+              "water": 0.5, "grass": 0.5, "dragon": 0.5},
+    "electric": {"water": 2.0, "flying": 2.0,
+                 "electric": 0.5, "grass": 0.5, "dragon": 0.5, "ground": 0.0},
+    "grass": {"water": 2.0, "ground": 2.0, "rock": 2.0,
+              "fire": 0.5, "grass": 0.5, "poison": 0.5, "flying": 0.5,
+              "bug": 0.5, "dragon": 0.5, "steel": 0.5},
+    "ice": {"grass": 2.0, "ground": 2.0, "flying": 2.0, "dragon": 2.0,
+            "fire": 0.5, "water": 0.5, "ice": 0.5, "steel": 0.5},
+    "fighting": {"normal": 2.0, "ice": 2.0, "rock": 2.0, "dark": 2.0, "steel": 2.0,
+                 "poison": 0.5, "flying": 0.5, "psychic": 0.5, "bug": 0.5, "fairy": 0.5,
+                 "ghost": 0.0},
+    "poison": {"grass": 2.0, "fairy": 2.0,
+               "poison": 0.5, "ground": 0.5, "rock": 0.5, "ghost": 0.5, "steel": 0.0},
+    "ground": {"fire": 2.0, "electric": 2.0, "poison": 2.0, "rock": 2.0, "steel": 2.0,
+               "grass": 0.5, "bug": 0.5, "flying": 0.0},
+    "flying": {"grass": 2.0, "fighting": 2.0, "bug": 2.0,
+               "electric": 0.5, "rock": 0.5, "steel": 0.5},
+    "psychic": {"fighting": 2.0, "poison": 2.0, "psychic": 0.5, "steel": 0.5, "dark": 0.0},
+    "bug": {"grass": 2.0, "psychic": 2.0, "dark": 2.0,
+            "fire": 0.5, "fighting": 0.5, "poison": 0.5, "flying": 0.5,
+            "ghost": 0.5, "steel": 0.5, "fairy": 0.5},
+    "rock": {"fire": 2.0, "ice": 2.0, "flying": 2.0, "bug": 2.0,
+             "fighting": 0.5, "ground": 0.5, "steel": 0.5},
+    "ghost": {"psychic": 2.0, "ghost": 2.0, "dark": 0.5, "normal": 0.0},
+    "dragon": {"dragon": 2.0, "steel": 0.5, "fairy": 0.0},
+    "dark": {"psychic": 2.0, "ghost": 2.0, "fighting": 0.5, "dark": 0.5, "fairy": 0.5},
+    "steel": {"ice": 2.0, "rock": 2.0, "fairy": 2.0,
+              "fire": 0.5, "water": 0.5, "electric": 0.5, "steel": 0.5},
+    "fairy": {"fighting": 2.0, "dragon": 2.0, "dark": 2.0,
+              "fire": 0.5, "poison": 0.5, "steel": 0.5},
+}
+
+
+def build_type_matrix(chart):
+    """Плотная таблица 18x18: matrix[id атакующего][id защищающегося] -> множитель."""
+    matrix = [[1.0] * len(TYPE_IDS) for _ in TYPE_IDS]
+    for attacker, row in chart.items():
+        for defender, multiplier in row.items():
+            matrix[TYPE_IDS[attacker]][TYPE_IDS[defender]] = multiplier
+    return tuple(tuple(row) for row in matrix)
+
+
+SIMPLE_TYPE_MATRIX = build_type_matrix(SIMPLE_TYPE_CHART)
+FULL_TYPE_MATRIX = build_type_matrix(FULL_TYPE_CHART)
+TYPE_MATRIX = SIMPLE_TYPE_MATRIX
+
+
+def use_full_type_chart(enabled):
+    """Переключает бои на полную таблицу типов (по умолчанию — упрощённая из трёх пар)."""
+    global TYPE_MATRIX
+    TYPE_MATRIX = FULL_TYPE_MATRIX if enabled else SIMPLE_TYPE_MATRIX
+
+
+def type_multiplier(attacker_type, defender_type):
+    return TYPE_MATRIX[type_id(attacker_type)][type_id(defender_type)]
+
+SHOP_PRICES = {
+    "potion": 50,
+    "super_potion": 120,
+    "boost": 80,
+    "rare_candy": 200,
+    "evolution_stone": 500
+}
+
+# Рейтинг (Эло) нового тренера для рейтинговых боёв /ranked (matchmaking.py)
+START_RATING = 1000
+
+# Награды за бой (Battle.reward и турниры): монеты победителю / проигравшему
+WIN_COINS = 50
+LOSS_COINS = 20
+
+
+def battle_xp(loser_level):
+    """Опыт покемону-победителю за бой с покемоном уровня loser_level."""
+    return 25 + loser_level * 5
+
+# Блокировки по имени тренера: обработчики разных тренеров идут параллельно,
+# а команды одного тренера (и бой двух) — строго по очереди.
+# Имя -> [RLock, сколько вызовов trainer_lock его держат или ждут]: запись
+# удаляется, когда счётчик падает до нуля, — словарь не растёт с числом тренеров.
+_trainer_locks = {}
+_trainer_locks_guard = threading.Lock()
+
+
+@contextmanager
+def trainer_lock(*names, timeout=None):
+    """
+    Захватывает блокировки тренеров в алфавитном порядке, чтобы не было взаимоблокировок.
+    С timeout — TimeoutError, если какую-то блокировку не удалось взять за timeout секунд.
+    """
+    names = sorted(set(names))
+    with _trainer_locks_guard:
+        entries = []
+        for name in names:
+            entry = _trainer_locks.get(name)
+            if entry is None:
+                entry = _trainer_locks[name] = [threading.RLock(), 0]
+            entry[1] += 1
+            entries.append(entry)
+    try:
+        with ExitStack() as stack:
+            for lock, _ in entries:
+                if not lock.acquire(timeout=-1 if timeout is None else timeout):
+                    raise TimeoutError("тренер занят")
+                stack.callback(lock.release)
+            yield
+    finally:
+        with _trainer_locks_guard:
+            for name, entry in zip(names, entries):
+                entry[1] -= 1
+                if not entry[1]:
+                    del _trainer_locks[name]
+
+
+def trainer_name(user):
+    """Имя тренера для пользователя Telegram: username, если есть, иначе first_name_id."""
+    if user.username:
+        return user.username.lower()
+    return f"{user.first_name}_{user.id}"
+
+
+def locked(method):
+    """Декоратор метода Trainer: выполняет его под блокировкой этого тренера."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with trainer_lock(self.name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
 POKEMON_DB = {
     "Pikachu": {"type": "electric", "base_hp": 35, "base_attack": 55, "base_defense": 40, "base_speed": 90},
     "Charmander": {"type": "fire", "base_hp": 39, "base_attack": 52, "base_defense": 43, "base_speed": 65},
@@ -40,41 +204,40 @@ POKEMON_DB = {
     "Magikarp": {"type": "water", "base_hp": 20, "base_attack": 10, "base_defense": 55, "base_speed": 80}
 }
 
-class Pokemon:
-    def __init__(self, name, type, hp, attack, defense, speed, image_path=None):
-        self.name = name
-        self.type = type
-        self.max_hp = hp
-        self.hp = hp
-        self.attack = attack
-        self.defense = defense
-        self.speed = speed
-        self.image_path = image_path
+# Шанс, что пойманный покемон может эволюционировать, и шанс шайни
+EVOLVE_CHANCE = 0.3
+SHINY_CHANCE = 0.05
+# Шайни сильнее обычного: прибавки к hp, attack, defense, speed
+SHINY_BONUS = (30, 20, 15, 15)
+# Разброс базовых статов при поимке: [от, до] включительно для hp, attack, defense, speed
+STAT_SPREAD = ((-5, 10), (-3, 7), (-3, 7), (-5, 10))
 
-        # Уровни
-        self.level = 1
-        self.xp = 0
-        self.xp_to_next = 100
+# Пороги опыта: на уровне 1 нужно 100 XP, дальше порог растёт в 1.5 раза (как в level_up).
+# XP_TOTALS[i] — сумма первых i порогов: по ней add_xp находит итоговый уровень бинпоиском
+XP_TABLE_LEVELS = 200
+XP_THRESHOLDS = [100]
+while len(XP_THRESHOLDS) < XP_TABLE_LEVELS:
+    XP_THRESHOLDS.append(int(XP_THRESHOLDS[-1] * 1.5))
+XP_TOTALS = list(accumulate(XP_THRESHOLDS, initial=0))
+XP_STEPS = {threshold: i for i, threshold in enumerate(XP_THRESHOLDS)}
 
-        # IV — генетические параметры
-        self.iv_hp = random.randint(0, 31)
-        self.iv_attack = random.randint(0, 31)
-        self.iv_defense = random.randint(0, 31)
-        self.iv_speed = random.randint(0, 31)
+def new_pokemon_id():
+    """Короткий стабильный id покемона — не меняется при переименовании и эволюции."""
+    return secrets.token_hex(5)
 
-        # EV — опыт характеристик
-        self.ev_hp = 0
-        self.ev_attack = 0
-        self.ev_defense = 0
-        self.ev_speed = 0
 
-        # Эволюция
-        self.can_evolve = random.random() < 0.3  # 30% шанс что покемон может эволюционировать
-        self.evolution_stage = 1
-        
-        # Боевая статистика
-        self.battles_won = 0
-        self.battles_lost = 0
+class BasePokemon:
+    """
+    Поведение покемона без данных: общий предок Pokemon (поля в __slots__)
+    и roster.PokemonView (поля в колонках PokemonStore). Своих слотов нет —
+    иначе каждое окно в ростер несло бы 26 пустых слотов Pokemon.
+    """
+
+    __slots__ = ()
+
+    def touch(self):
+        """Отмечает изменение покемона — закэшированные тексты о нём устарели."""
+        self._version = next_version()
 
     def show_img(self):
         return self.image_path
@@ -84,20 +247,45 @@ class Pokemon:
 
     def add_xp(self, amount):
         self.xp += amount
-        while self.xp >= self.xp_to_next:
-            self.level_up()
+        if self.xp >= self.xp_to_next:
+            step = XP_STEPS.get(self.xp_to_next)
+            if step is not None:
+                # сразу на итоговый уровень: сколько порогов помещается в xp — бинпоиском
+                # по накопленным суммам, рост статов — за все уровни одним умножением
+                end = min(bisect(XP_TOTALS, self.xp + XP_TOTALS[step]) - 1, len(XP_THRESHOLDS) - 1)
+                self.xp -= XP_TOTALS[end] - XP_TOTALS[step]
+                self.xp_to_next = XP_THRESHOLDS[end]
+                self.grow(end - step)
+            # порог не из таблицы (или таблица кончилась) — по одному уровню, как раньше
+            while self.xp >= self.xp_to_next:
+                self.level_up()
+        self.touch()
 
     def level_up(self):
-        self.level += 1
         self.xp -= self.xp_to_next
         self.xp_to_next = int(self.xp_to_next * 1.5)
+        self.grow(1)
+
+    def level_growth(self):
+        """Прибавка (max_hp, attack, defense, speed) за уровень — зависит только от IV и EV."""
+        return (
+            2 + (self.iv_hp // 10) + (self.ev_hp // 50),
+            1 + (self.iv_attack // 15) + (self.ev_attack // 50),
+            1 + (self.iv_defense // 15) + (self.ev_defense // 50),
+            1 + (self.iv_speed // 15) + (self.ev_speed // 50),
+        )
+
+    def grow(self, levels):
+        """+levels уровней: рост характеристик с учетом IV и EV (за время роста они не меняются)."""
+        if levels <= 0:
+            return
+        hp, attack, defense, speed = self.level_growth()
+        self.level += levels
+        self.max_hp += hp * levels
+        self.attack += attack * levels
+        self.defense += defense * levels
+        self.speed += speed * levels
 
-        # рост характеристик с учетом IV и EV
-        self.max_hp += 2 + (self.iv_hp // 10) + (self.ev_hp // 50)
-        self.attack += 1 + (self.iv_attack // 15) + (self.ev_attack // 50)
-        self.defense += 1 + (self.iv_defense // 15) + (self.ev_defense // 50)
-        self.speed += 1 + (self.iv_speed // 15) + (self.ev_speed // 50)
-        
         # Восстановление HP при повышении уровня
         self.hp = self.max_hp
 
@@ -106,10 +294,12 @@ class Pokemon:
         self.ev_attack += random.randint(1, 3)
         self.ev_defense += random.randint(1, 3)
         self.ev_speed += random.randint(1, 3)
+        self.touch()
 
     def heal(self):
         self.hp = self.max_hp
         self.ev_attack = max(0, self.ev_attack - 5)
+        self.touch()
 
     def evolve(self):
         if self.can_evolve and self.evolution_stage == 1:
@@ -120,12 +310,47 @@ class Pokemon:
             self.attack += 15
             self.defense += 10
             self.speed += 5
+            self.touch()
             return True
         return False
 
+    def to_dict(self):
+        # type_id не сохраняем — он выводится из type, _version — только в памяти
+        return {field: getattr(self, field) for field in Pokemon.__slots__ if field not in ("type_id", "_version")}
+
+    def power(self):
+        return self.hp + self.attack + self.defense + self.speed
+
+    def title(self):
+        return f"*{self.name}* {self.type_emoji()}"
+
+    def xp_bar(self, width=10):
+        filled = int((self.xp / self.xp_to_next) * width)
+        return "█" * filled + "░" * (width - filled)
+
+    def info_card(self):
+        """Карточка покемона для /stats."""
+        return render_cache.get("card", self.id, self._version, self._render_card)
+
+    def _render_card(self):
+        return (
+            f"{self.title()}\n"
+            f"Уровень: *{self.level}*\n"
+            f"XP: `{self.xp} / {self.xp_to_next}`\n"
+            f"{self.xp_bar()}\n\n"
+            f"*Статы:*\n"
+            f"HP: `{self.hp}`\n"
+            f"Атака: `{self.attack}`\n"
+            f"Защита: `{self.defense}`\n"
+            f"Скорость: `{self.speed}`\n"
+        )
+
     def info_detailed(self):
+        return render_cache.get("detailed", self.id, self._version, self._render_detailed)
+
+    def _render_detailed(self):
         return (
-            f"*{self.name}* {self.type_emoji()} (Ур. {self.level})\n"
+            f"{self.title()} (Ур. {self.level})\n"
             f"XP: `{self.xp}/{self.xp_to_next}` | Победы: `{self.battles_won}`\n"
             f"HP: `{self.hp}/{self.max_hp}` (IV: {self.iv_hp}, EV: {self.ev_hp})\n"
             f"Атака: `{self.attack}` (IV: {self.iv_attack}, EV: {self.ev_attack})\n"
@@ -135,9 +360,245 @@ class Pokemon:
         )
 
 
+class Pokemon(BasePokemon):
+    # __slots__ вместо __dict__: на сотнях тысяч покемонов это основная экономия памяти
+    __slots__ = (
+        "id", "name", "type", "type_id", "max_hp", "hp", "attack", "defense", "speed", "image_path",
+        "level", "xp", "xp_to_next",
+        "iv_hp", "iv_attack", "iv_defense", "iv_speed",
+        "ev_hp", "ev_attack", "ev_defense", "ev_speed",
+        "can_evolve", "evolution_stage",
+        "battles_won", "battles_lost",
+        "_version",
+    )
+
+    def __init__(self, name, type, hp, attack, defense, speed, image_path=None, ivs=None, can_evolve=None):
+        self.id = new_pokemon_id()
+        self.name = name
+        self.type = type
+        self.type_id = type_id(type)
+        self.max_hp = hp
+        self.hp = hp
+        self.attack = attack
+        self.defense = defense
+        self.speed = speed
+        self.image_path = image_path
+
+        # Уровни
+        self.level = 1
+        self.xp = 0
+        self.xp_to_next = 100
+
+        # IV — генетические параметры (hp, attack, defense, speed); Species.spawn передаёт готовые
+        if ivs is None:
+            ivs = [random.randint(0, 31) for _ in range(4)]
+        self.iv_hp, self.iv_attack, self.iv_defense, self.iv_speed = ivs
+
+        # EV — опыт характеристик
+        self.ev_hp = 0
+        self.ev_attack = 0
+        self.ev_defense = 0
+        self.ev_speed = 0
+
+        # Эволюция
+        if can_evolve is None:
+            can_evolve = random.random() < EVOLVE_CHANCE
+        self.can_evolve = can_evolve
+        self.evolution_stage = 1
+        
+        # Боевая статистика
+        self.battles_won = 0
+        self.battles_lost = 0
+
+        self._version = next_version()
+
+    @classmethod
+    def bulk(cls, rows):
+        """
+        Много новых покемонов сразу, в обход __init__ (вдвое быстрее) — для spawn_batch.
+        rows — (name, type, type_id, hp, attack, defense, speed, image_path, ivs, can_evolve);
+        остальные поля — те же начальные значения, что в __init__.
+        """
+        ids = os.urandom(5 * len(rows)).hex()  # как new_pokemon_id(), одним вызовом
+        new = cls.__new__
+        batch = []
+        # циклов ссылок здесь нет, а сборщик мусора на каждой тысяче новых объектов
+        # обходит все живые — на время создания пачки он выключен
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for i, (name, type_, tid, hp, attack, defense, speed, image_path, ivs, can_evolve) in enumerate(rows):
+                p = new(cls)
+                p.id = ids[10 * i:10 * i + 10]
+                p.name, p.type, p.type_id = name, type_, tid
+                p.max_hp = p.hp = hp
+                p.attack, p.defense, p.speed = attack, defense, speed
+                p.image_path = image_path
+                p.level, p.xp, p.xp_to_next = 1, 0, 100
+                p.iv_hp, p.iv_attack, p.iv_defense, p.iv_speed = ivs
+                p.ev_hp = p.ev_attack = p.ev_defense = p.ev_speed = 0
+                p.can_evolve, p.evolution_stage = can_evolve, 1
+                p.battles_won = p.battles_lost = 0
+                p._version = next_version()
+                batch.append(p)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return batch
+
+    @classmethod
+    def from_dict(cls, data):
+        # без __init__ — не перекидываем IV и шанс эволюции
+        p = cls.__new__(cls)
+        for key, value in data.items():
+            setattr(p, key, value)
+        p.type_id = type_id(p.type)
+        p._version = next_version()
+        if "id" not in data:
+            # сохранено до появления id
+            p.id = new_pokemon_id()
+        return p
+
+
+def _shiny_sprite(slug):
+    """
+    Спрайт шайни: images/shiny_<вид>.png; если его нет — прежние раскладки
+    (подпапка shiny/ из README и имя shiny_🌟_shiny_<вид>.png, которое раньше
+    получалось из имени покемона с префиксом), чтобы старые папки images/ работали.
+    """
+    candidates = (f"images/shiny_{slug}.png", f"images/shiny/{slug}.png", f"images/shiny_🌟_shiny_{slug}.png")
+    return next((path for path in candidates if os.path.exists(path)), candidates[0])
+
+
+class Species:
+    """
+    Вид покемона из POKEMON_DB с заранее посчитанным: id типа, пути к спрайтам,
+    имя шайни. Создаётся один раз при импорте, spawn() — поимка одного покемона.
+    """
+
+    __slots__ = ("name", "type", "type_id", "base", "low", "image_path", "shiny_name", "shiny_image_path")
+
+    # Все случайные величины поимки — цифры одного числа в смешанной системе счисления:
+    # один вызов randrange вместо восьми randint/random при том же распределении.
+    # Цифры: разброс четырёх статов, четыре IV по 5 бит, шансы шайни и эволюции в процентах
+    _SPREAD = tuple(high - low + 1 for low, high in STAT_SPREAD)
+    _RANGE = math.prod(_SPREAD) * 32**4 * 100 * 100
+    _SHINY = SHINY_CHANCE * 100
+    _EVOLVE = EVOLVE_CHANCE * 100
+
+    def __init__(self, name, data):
+        self.name = name
+        self.type = data["type"]
+        self.type_id = type_id(self.type)
+        self.base = (data["base_hp"], data["base_attack"], data["base_defense"], data["base_speed"])
+        self.low = tuple(b + low for b, (low, _) in zip(self.base, STAT_SPREAD))
+        slug = name.lower().replace(" ", "_")
+        self.image_path = f"images/{slug}.png"
+        self.shiny_name = f"🌟 Shiny {name}"
+        self.shiny_image_path = _shiny_sprite(slug)
+
+    def make(self, stats, ivs, shiny, can_evolve):
+        """Покемон по уже выпавшим значениям: stats — базовые статы с разбросом."""
+        if shiny:
+            stats = [s + b for s, b in zip(stats, SHINY_BONUS)]
+            return Pokemon(self.shiny_name, self.type, *stats, self.shiny_image_path, ivs, can_evolve)
+        return Pokemon(self.name, self.type, *stats, self.image_path, ivs, can_evolve)
+
+    def row(self, stats, ivs, shiny, can_evolve):
+        """То же, что make(), но строкой для Pokemon.bulk."""
+        if shiny:
+            hp, attack, defense, speed = (s + b for s, b in zip(stats, SHINY_BONUS))
+            return (self.shiny_name, self.type, self.type_id, hp, attack, defense, speed,
+                    self.shiny_image_path, ivs, can_evolve)
+        hp, attack, defense, speed = stats
+        return (self.name, self.type, self.type_id, hp, attack, defense, speed, self.image_path, ivs, can_evolve)
+
+    def spawn(self):
+        n = random.randrange(self._RANGE)
+        hp_size, attack_size, defense_size, speed_size = self._SPREAD
+        hp, attack, defense, speed = self.low
+        n, d = divmod(n, hp_size)
+        hp += d
+        n, d = divmod(n, attack_size)
+        attack += d
+        n, d = divmod(n, defense_size)
+        defense += d
+        n, d = divmod(n, speed_size)
+        speed += d
+        ivs = (n & 31, n >> 5 & 31, n >> 10 & 31, n >> 15 & 31)
+        evolve, shiny = divmod(n >> 20, 100)
+        return self.make((hp, attack, defense, speed), ivs, shiny < self._SHINY, evolve < self._EVOLVE)
+
+
+SPECIES = {name: Species(name, data) for name, data in POKEMON_DB.items()}
+
+
+class SpawnTable:
+    """
+    Какие виды и с какими весами попадаются при поимке. weights — {имя вида: вес},
+    виды без веса не выпадают; None — все виды POKEMON_DB поровну.
+    """
+
+    def __init__(self, weights=None):
+        if weights is None:
+            weights = dict.fromkeys(SPECIES, 1)
+        unknown = set(weights) - set(SPECIES)
+        if unknown:
+            raise ValueError(f"Неизвестные виды в таблице поимки: {', '.join(sorted(unknown))}")
+        pairs = [(SPECIES[name], w) for name, w in weights.items() if w > 0]
+        if not pairs:
+            raise ValueError("В таблице поимки нет ни одного вида с положительным весом")
+        self.species = [s for s, _ in pairs]
+        self.weights = [w for _, w in pairs]
+        self.cum_weights = list(accumulate(self.weights))
+        self.total = self.cum_weights[-1]
+
+    def pick(self):
+        # то же, что random.choices(species, cum_weights), без его накладных расходов
+        return self.species[bisect(self.cum_weights, random.random() * self.total, 0, len(self.species) - 1)]
+
+    def spawn(self):
+        return self.pick().spawn()
+
+    def spawn_batch(self, n, seed=None):
+        """
+        n новых покемонов сразу — для событий и нагрузочных тестов. Случайные
+        величины тянутся массивами NumPy (если он установлен), распределения те же.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            return [self.spawn() for _ in range(n)]
+
+        rng = np.random.default_rng(seed)
+        kinds = rng.choice(len(self.species), size=n, p=[w / self.total for w in self.weights])
+        # базовые статы с разбросом — одной операцией над массивом n x 4
+        base = np.array([s.base for s in self.species])
+        low = np.array([low for low, _ in STAT_SPREAD])
+        high = np.array([high for _, high in STAT_SPREAD])
+        stats = (base[kinds] + rng.integers(low, high + 1, size=(n, 4))).tolist()
+        ivs = rng.integers(0, 32, size=(n, 4)).tolist()
+        shiny = (rng.random(n) < SHINY_CHANCE).tolist()
+        evolve = (rng.random(n) < EVOLVE_CHANCE).tolist()
+
+        species = [self.species[k] for k in kinds.tolist()]
+        return Pokemon.bulk([s.row(stats[i], tuple(ivs[i]), shiny[i], evolve[i]) for i, s in enumerate(species)])
+
+
+SPAWN_TABLE = SpawnTable()
+
+
+def use_spawn_weights(weights):
+    """Таблица поимки для /catch: {вид: вес} или None — все виды поровну."""
+    global SPAWN_TABLE
+    SPAWN_TABLE = SpawnTable(weights)
+
+
 class Trainer:
-    trainers = {}
-    
+    trainers = None  # TrainerRegistry, создаётся после объявления класса
+    leaderboard = Leaderboard()
+    npc = False  # True у лидеров залов (gyms.py): их копия на бой не нуждается в блокировке
+
     def __init__(self, name):
         self.name = name
         self.pokemons = []
@@ -153,62 +614,212 @@ class Trainer:
         self.battles_won = 0
         self.battles_lost = 0
         self.last_daily = None
+        self.rating = START_RATING
         Trainer.trainers[name] = self
+        self.touch()
+        self._record("put", lambda: [self.to_dict(), None])
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "pokemons": [p.to_dict() for p in self.pokemons],
+            "items": dict(self.items),
+            "coins": self.coins,
+            "battles_won": self.battles_won,
+            "battles_lost": self.battles_lost,
+            "last_daily": self.last_daily.isoformat() if self.last_daily else None,
+            "rating": self.rating,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        # без __init__ — иначе тренер снова зарегистрируется в реестре
+        t = cls.__new__(cls)
+        t.name = data["name"]
+        t.pokemons = [Pokemon.from_dict(p) for p in data["pokemons"]]
+        t.items = data["items"]
+        t.coins = data["coins"]
+        t.battles_won = data["battles_won"]
+        t.battles_lost = data["battles_lost"]
+        t.last_daily = date.fromisoformat(data["last_daily"]) if data["last_daily"] else None
+        t.rating = data.get("rating", START_RATING)  # в старых сохранениях рейтинга нет
+        t._version = next_version()
+        return t
+
+    # ---------- покемоны и индекс по id / имени ----------
+
+    @property
+    def pokemons(self):
+        return self._pokemons
+
+    @pokemons.setter
+    def pokemons(self, pokemons):
+        self._pokemons = pokemons
+        self._reindex()
+
+    def apply_state(self, data):
+        """
+        Применяет состояние из to_dict(), изменённое в другом процессе (shard.py).
+        Покемоны с теми же id обновляются на месте — ссылки на них остаются живыми.
+        """
+        self.items = dict(data["items"])
+        self.coins = data["coins"]
+        self.battles_won = data["battles_won"]
+        self.battles_lost = data["battles_lost"]
+        self.last_daily = date.fromisoformat(data["last_daily"]) if data["last_daily"] else None
+        self.rating = data.get("rating", START_RATING)
+        pokemons = []
+        for pd in data["pokemons"]:
+            p = self._by_id.get(pd["id"])
+            if p is None:
+                p = Pokemon.from_dict(pd)
+            else:
+                for key, value in pd.items():
+                    setattr(p, key, value)
+                p.type_id = type_id(p.type)
+                p.touch()
+            pokemons.append(p)
+        self.pokemons = pokemons
+        self.touch()
+        self._record("put", lambda: [self.to_dict(), None])
+
+    def _reindex(self):
+        self._by_id = {p.id: p for p in self._pokemons}
+        self._by_name = {}
+        for p in self._pokemons:
+            self._by_name.setdefault(p.name.lower(), []).append(p)
+
+    def _index_add(self, p):
+        self._by_id[p.id] = p
+        self._by_name.setdefault(p.name.lower(), []).append(p)
+
+    def _index_remove(self, p, name=None):
+        self._by_id.pop(p.id, None)
+        key = (name or p.name).lower()
+        same = self._by_name.get(key, [])
+        if p in same:
+            same.remove(p)
+        if not same:
+            self._by_name.pop(key, None)
+
+    def find_pokemon(self, key):
+        """Покемон по id или по имени (без учёта регистра); при одинаковых именах — первый."""
+        p = self._by_id.get(key)
+        if p is not None:
+            return p
+        same = self._by_name.get(key.lower())
+        if same:
+            p = same[0]
+            if p.name.lower() == key.lower() and p in self._pokemons:
+                return p
+        # индекс мог устареть, если список меняли напрямую — перестраиваем
+        self._reindex()
+        same = self._by_name.get(key.lower())
+        return same[0] if same else None
+
+    def rename_pokemon(self, p, new_name):
+        old_name = p.name
+        p.name = new_name
+        p.touch()
+        self._index_remove(p, old_name)
+        self._index_add(p)
+        self.touch()
+        self._record("pokemon", p.to_dict)
+
+    def evolve_pokemon(self, p):
+        old_name = p.name
+        if not p.evolve():
+            return False
+        # эволюция меняет имя на «Mega ...»
+        self._index_remove(p, old_name)
+        self._index_add(p)
+        self.touch()
+        self._record("pokemon", p.to_dict)
+        return True
+
+    def summary(self):
+        """Краткая сводка для рейтинга: суммы уровней и силы + строки покемонов."""
+        rows = [(p.name, p.type, p.level, p.power(), p.battles_won) for p in self.pokemons]
+        return {
+            "level": sum(row[2] for row in rows),
+            "power": sum(row[3] for row in rows),
+            "pokemons": rows,
+        }
+
+    def touch(self):
+        """Вызывается после изменения тренера или его покемонов — обновляет рейтинг, версию и помечает к сохранению."""
+        self._version = next_version()
+        Trainer.leaderboard.update(self.name, self.summary())
+        Trainer.trainers.mark_dirty(self.name)
+
+    def _render_version(self):
+        # версия тренера + версии покемонов: текст устаревает от любого изменения
+        return (self._version, *(p._version for p in self._pokemons))
+
+    def _record(self, op, make_arg):
+        """Дописывает изменение в журнал, если хранилище его ведёт (journal.py)."""
+        if Trainer.trainers.journaling:
+            Trainer.trainers.record(self, op, make_arg())
 
     def info(self):
-        total_power = sum((p.hp + p.attack + p.defense + p.speed) for p in self.pokemons)
+        return render_cache.get("info", self.name, self._render_version(), self._render_info)
+
+    def _render_info(self):
+        total_power = sum(p.power() for p in self.pokemons)
         return (
             f"*Тренер: {self.name}*\n"
             f"Покемоны: `{len(self.pokemons)}/6`\n"
             f"Монеты: `{self.coins}` 💰\n"
             f"Бои: `{self.battles_won}🏆 / {self.battles_lost}💔`\n"
+            f"Рейтинг: `{self.rating}`\n"
             f"Общая сила: `{total_power}`\n"
             f"Средний уровень: `{sum(p.level for p in self.pokemons) / max(1, len(self.pokemons)):.1f}`"
         )
 
+    def pokemons_list(self):
+        """Текст для /pokemons."""
+        return render_cache.get("pokemons", self.name, self._render_version(), self._render_pokemons_list)
+
+    def _render_pokemons_list(self):
+        lines = [f"📋 *Твои покемоны ({len(self.pokemons)}/6):*\n\n"]
+        for i, p in enumerate(self.pokemons, 1):
+            filled = int(p.hp / p.max_hp * 10)
+            lines.append(
+                f"{i}. *{p.name}* {p.type_emoji()} (ур. {p.level}, id `{p.id}`)\n"
+                f"   HP: {'█' * filled}{'░' * (10 - filled)} {p.hp}/{p.max_hp}\n"
+                f"   ⚔️{p.attack} 🛡️{p.defense} 🏃{p.speed}\n\n"
+            )
+        return "".join(lines)
+
+    def sort_pokemons(self, key):
+        """Сортирует покемонов по стату (hp / attack / speed), сильнейшие первыми."""
+        order = sorted(self._pokemons, key=lambda p: getattr(p, key), reverse=True)
+        if order != self._pokemons:
+            self._pokemons[:] = order
+            self.touch()
+
+    @locked
     def add_pokemon(self):
         if len(self.pokemons) >= 6:
             return "❌ У тебя уже максимальное количество покемонов (6)! Используй /release чтобы отпустить кого-то."
 
-        name = random.choice(list(POKEMON_DB.keys()))
-        data = POKEMON_DB[name]
-        
-        # Базовые статы с небольшим разбросом
-        hp = data["base_hp"] + random.randint(-5, 10)
-        attack = data["base_attack"] + random.randint(-3, 7)
-        defense = data["base_defense"] + random.randint(-3, 7)
-        speed = data["base_speed"] + random.randint(-5, 10)
-        
-        type_ = data["type"]
-        image_path = f"images/{name.lower()}.png"
-
-        # Шанс на редкого покемона (5%)
-        is_shiny = random.random() < 0.05
-        if is_shiny:
-            name = f"🌟 Shiny {name}"
-            hp += 30
-            attack += 20
-            defense += 15
-            speed += 15
-            image_path = f"images/shiny_{name.lower().replace(' ', '_')}.png"
-
-        p = Pokemon(name, type_, hp, attack, defense, speed, image_path)
+        # вид — по таблице поимки, статы с разбросом, шанс шайни — см. Species.spawn
+        p = SPAWN_TABLE.spawn()
         self.pokemons.append(p)
+        self._index_add(p)
+        self.touch()
+        self._record("pokemon", p.to_dict)
         
         return f"🎉 Ты поймал *{p.name}*! (HP: {p.hp}, Атака: {p.attack})"
 
+    @locked
     def use_item(self, item_name, pokemon_name):
         item_name = item_name.lower()
         
         if item_name not in self.items or self.items[item_name] <= 0:
             return False, "❌ У тебя нет такого предмета."
 
-        pokemon = None
-        for p in self.pokemons:
-            if p.name.lower() == pokemon_name.lower():
-                pokemon = p
-                break
-
+        pokemon = self.find_pokemon(pokemon_name)
         if not pokemon:
             return False, "❌ Покемон не найден."
 
@@ -216,39 +827,81 @@ class Trainer:
         if item_name == "potion":
             heal_amount = 20
             pokemon.hp = min(pokemon.hp + heal_amount, pokemon.max_hp)
+            pokemon.touch()
             result = f"💊 Использовано зелье на {pokemon.name}. HP: {pokemon.hp}/{pokemon.max_hp}"
         elif item_name == "super_potion":
             heal_amount = 50
             pokemon.hp = min(pokemon.hp + heal_amount, pokemon.max_hp)
+            pokemon.touch()
             result = f"💊 Использовано супер-зелье на {pokemon.name}. HP: {pokemon.hp}/{pokemon.max_hp}"
         elif item_name == "boost":
             pokemon.attack += 5
+            pokemon.touch()
             result = f"💪 Использован буст на {pokemon.name}. Атака теперь: {pokemon.attack}"
         elif item_name == "rare_candy":
             pokemon.add_xp(50)
             result = f"🍬 Использована редкая конфета на {pokemon.name}. XP +50!"
         elif item_name == "evolution_stone":
-            if pokemon.evolve():
+            if self.evolve_pokemon(pokemon):
                 result = f"✨ {pokemon.name} эволюционировал!"
             else:
                 result = f"❌ Этот покемон не может эволюционировать."
                 return False, result
 
         self.items[item_name] -= 1
+        self.touch()
+        self._record("fields", lambda: {"items": dict(self.items)})
+        self._record("pokemon", pokemon.to_dict)
         return True, result
 
+    @locked
+    def award_xp(self, pokemon, amount):
+        """Опыт покемону за бой вне Battle (например, /fight)."""
+        pokemon.add_xp(amount)
+        self.touch()
+        self._record("pokemon", pokemon.to_dict)
+
+    @classmethod
+    def grant_xp_all(cls, names, amount):
+        """
+        amount XP каждому покемону тренеров names (награды сезона, события).
+        Рейтинг перестраивается одной сортировкой в конце, а не вставкой на каждого.
+        Возвращает число тренеров, получивших награду.
+        """
+        summaries = []
+        for name in names:
+            with trainer_lock(name):
+                trainer = cls.trainers.get(name)
+                if trainer is None:
+                    continue
+                for p in trainer.pokemons:
+                    p.add_xp(amount)
+                trainer._version = next_version()
+                summaries.append((name, trainer.summary()))
+                trainer._record("put", lambda: [trainer.to_dict(), None])
+        cls.leaderboard.load(summaries)
+        return len(summaries)
+
+    @locked
     def heal_all(self):
         for p in self.pokemons:
             p.heal()
+            self._record("pokemon", p.to_dict)
+        self.touch()
         return "💚 Все покемоны вылечены!"
 
+    @locked
     def release_pokemon(self, pokemon_name):
-        for i, p in enumerate(self.pokemons):
-            if p.name.lower() == pokemon_name.lower():
-                released = self.pokemons.pop(i)
-                self.coins += released.level * 5  # Награда за отпускание
-                return True, f"🕊️ Покемон {released.name} отпущен на волю. Получено {released.level * 5} монет!"
-        return False, "❌ Покемон не найден."
+        released = self.find_pokemon(pokemon_name)
+        if released is None:
+            return False, "❌ Покемон не найден."
+        self.pokemons.remove(released)
+        self._index_remove(released)
+        self.coins += released.level * 5  # Награда за отпускание
+        self.touch()
+        self._record("pokemon_del", lambda: released.id)
+        self._record("fields", lambda: {"coins": self.coins})
+        return True, f"🕊️ Покемон {released.name} отпущен на волю. Получено {released.level * 5} монет!"
 
     def get_items_list(self):
         if not any(count > 0 for count in self.items.values()):
@@ -261,6 +914,37 @@ class Trainer:
         text += f"\n💰 Монеты: `{self.coins}`"
         return text
 
+    @locked
+    def adjust_rating(self, delta):
+        """Изменение рейтинга после рейтингового боя (matchmaking.rating_delta)."""
+        self.rating += delta
+        self.touch()
+        self._record("fields", lambda: {"rating": self.rating})
+
+    @locked
+    def add_coins(self, amount):
+        """Начисляет монеты (призы и т.п.)."""
+        self.coins += amount
+        self.touch()
+        self._record("fields", lambda: {"coins": self.coins})
+
+    @locked
+    def buy_item(self, item):
+        item = item.lower()
+        if item not in SHOP_PRICES:
+            return False, "❌ Такого предмета нет в магазине. Посмотри /shop"
+
+        price = SHOP_PRICES[item]
+        if self.coins < price:
+            return False, f"❌ Недостаточно монет. Нужно {price}, у тебя {self.coins}"
+
+        self.coins -= price
+        self.items[item] = self.items.get(item, 0) + 1
+        self.touch()
+        self._record("fields", lambda: {"coins": self.coins, "items": dict(self.items)})
+        return True, f"✅ Куплено: {item} за {price} монет. Осталось: {self.coins}"
+
+    @locked
     def claim_daily(self):
         today = datetime.now().date()
         if self.last_daily and self.last_daily == today:
@@ -272,84 +956,125 @@ class Trainer:
         if reward == "coins":
             amount = random.randint(50, 150)
             self.coins += amount
-            return True, f"🎁 Ежедневная награда: {amount} монет!"
+            text = f"🎁 Ежедневная награда: {amount} монет!"
         else:
             self.items[reward] += 1
-            return True, f"🎁 Ежедневная награда: 1x {reward}!"
+            text = f"🎁 Ежедневная награда: 1x {reward}!"
+        self.touch()
+        self._record("fields", lambda: {"coins": self.coins, "items": dict(self.items),
+                                        "last_daily": today.isoformat()})
+        return True, text
+
+
+Trainer.trainers = TrainerRegistry(
+    encode=Trainer.to_dict, decode=Trainer.from_dict, summarize=Trainer.summary, lock=trainer_lock
+)
 
 
 class Battle:
-    def __init__(self, t1, t2):
+    """
+    Бой покемонов двух тренеров: p1 / p2 — выбранные покемоны, по умолчанию первые.
+
+    mode="text"   — start() возвращает текст лога (как раньше);
+    mode="events" — пишутся только компактные события, текст — по запросу render();
+    mode="quiet"  — без лога вообще, только исход в атрибутах winner/turns/...
+    """
+
+    MAX_TURNS = 20
+    EVENT_SIZE = 4  # ход, сторона атакующего (1/2), урон, крит (0/1)
+
+    def __init__(self, t1, t2, mode="text", p1=None, p2=None):
         self.t1 = t1
         self.t2 = t2
-        self.log = []
+        self.p1 = p1
+        self.p2 = p2
+        self.mode = mode
+        # буфер событий выделяется сразу под максимум ударов (2 за ход)
+        self.events = None if mode == "quiet" else array("i", bytes(4 * self.EVENT_SIZE * 2 * self.MAX_TURNS))
+        self.n_events = 0
+        self.last_crit = False
+        self.turns = 0
+        self.winner = None
+        self.winner_trainer = None
+        self.loser_trainer = None
+        self.xp_gain = 0
 
     def calculate_damage(self, attacker, defender):
         # Базовая формула урона
         damage = max(1, attacker.attack - defender.defense // 2)
         
         # Критический удар (10% шанс)
-        if random.random() < 0.1:
+        self.last_crit = random.random() < 0.1
+        if self.last_crit:
             damage *= 2
-            self.log.append(f"✨ Критический удар!")
         
-        # Множитель типа (упрощенный)
-        type_multiplier = 1.0
-        if attacker.type == "water" and defender.type == "fire":
-            type_multiplier = 2.0
-        elif attacker.type == "fire" and defender.type == "grass":
-            type_multiplier = 2.0
-        elif attacker.type == "grass" and defender.type == "water":
-            type_multiplier = 2.0
-            
-        damage = int(damage * type_multiplier)
+        # Множитель типа: O(1) по интернированным id, без сравнения строк
+        damage = int(damage * TYPE_MATRIX[attacker.type_id][defender.type_id])
         return max(1, damage)
 
+    def _record(self, turn, side, damage):
+        if self.events is not None:
+            i = self.n_events * self.EVENT_SIZE
+            self.events[i:i + self.EVENT_SIZE] = array("i", (turn, side, damage, self.last_crit))
+            self.n_events += 1
+
     def start(self):
-        p1 = self.t1.pokemons[0]
-        p2 = self.t2.pokemons[0]
-        
-        self.log.append(f"⚔️ *Бой начинается!*")
-        self.log.append(f"{p1.name} (HP: {p1.hp}) vs {p2.name} (HP: {p2.hp})")
+        # бой меняет обоих тренеров — держим обе блокировки (у NPC копия на бой своя)
+        with trainer_lock(*(t.name for t in (self.t1, self.t2) if not t.npc)):
+            self._run()
+        return self.render() if self.mode == "text" else None
+
+    def _fighters(self):
+        return self.p1 or self.t1.pokemons[0], self.p2 or self.t2.pokemons[0]
+
+    def _run(self):
+        self.reward(self.fight(*self._fighters()))
+
+    def fight(self, p1, p2):
+        """
+        Сам бой двух покемонов (меняет их hp): ходы по скорости до нокаута или MAX_TURNS.
+        Возвращает победившую сторону — 1 или 2. Тренеры не нужны (см. tournament.py).
+        """
+        self.n_events = 0
+        self.turns = 0
+        self._names = (p1.name, p2.name)
+        self._start_hp = (p1.hp, p2.hp)
+
+        # Определяем очередность по скорости (за бой не меняется)
+        if p1.speed >= p2.speed:
+            first, second, first_side, second_side = p1, p2, 1, 2
+        else:
+            first, second, first_side, second_side = p2, p1, 2, 1
 
         turn = 1
-        while p1.hp > 0 and p2.hp > 0 and turn <= 20:
-            # Определяем очередность по скорости
-            if p1.speed >= p2.speed:
-                first, second = p1, p2
-                first_trainer, second_trainer = self.t1, self.t2
-            else:
-                first, second = p2, p1
-                first_trainer, second_trainer = self.t2, self.t1
+        while p1.hp > 0 and p2.hp > 0 and turn <= self.MAX_TURNS:
+            self.turns = turn
 
             # Атака первого
             damage = self.calculate_damage(first, second)
             second.hp -= damage
-            self.log.append(f"Ход {turn}: {first.name} атакует {second.name} (урон: {damage})")
-
+            self._record(turn, first_side, damage)
             if second.hp <= 0:
-                winner = first
-                loser = second
-                winner_trainer = first_trainer
-                loser_trainer = second_trainer
                 break
 
             # Атака второго
             damage = self.calculate_damage(second, first)
             first.hp -= damage
-            self.log.append(f"       {second.name} атакует {first.name} (урон: {damage})")
-
+            self._record(turn, second_side, damage)
             if first.hp <= 0:
-                winner = second
-                loser = first
-                winner_trainer = second_trainer
-                loser_trainer = first_trainer
                 break
 
             turn += 1
 
-        # Определяем победителя
-        if p1.hp <= 0:
+        return 2 if p1.hp <= 0 else 1
+
+    def reward(self, side, touch=True):
+        """
+        Награды по итогу боя покемонов тренеров: side — победившая сторона.
+        touch=False — рейтинг не обновляется (турнир обновит его один раз за раунд).
+        """
+        p1, p2 = self._fighters()
+        if side == 2:
             winner = p2
             loser = p1
             winner_trainer = self.t2
@@ -361,7 +1086,7 @@ class Battle:
             loser_trainer = self.t2
 
         # Награды
-        xp_gain = 25 + loser.level * 5
+        xp_gain = battle_xp(loser.level)
         winner.add_xp(xp_gain)
         winner.apply_ev_gain()
         winner.battles_won += 1
@@ -369,11 +1094,47 @@ class Battle:
         
         winner_trainer.battles_won += 1
         loser_trainer.battles_lost += 1
-        winner_trainer.coins += 50
-        loser_trainer.coins += 20
+        winner_trainer.coins += WIN_COINS
+        loser_trainer.coins += LOSS_COINS
+        p1.touch()
+        p2.touch()
+        if touch:
+            winner_trainer.touch()
+            loser_trainer.touch()
+        for trainer, pokemon in ((self.t1, p1), (self.t2, p2)):
+            trainer._record("fields", lambda: {"coins": trainer.coins, "battles_won": trainer.battles_won,
+                                              "battles_lost": trainer.battles_lost})
+            trainer._record("pokemon", pokemon.to_dict)
+
+        self.winner = winner
+        self.winner_trainer = winner_trainer
+        self.loser_trainer = loser_trainer
+        self.xp_gain = xp_gain
+
+    def render(self):
+        """Текст лога из записанных событий. Строится только когда его просят."""
+        if self.events is None:
+            raise ValueError("Лог боя отключён (mode='quiet')")
+        names = {1: self._names[0], 2: self._names[1]}
+        log = [
+            f"⚔️ *Бой начинается!*",
+            f"{names[1]} (HP: {self._start_hp[0]}) vs {names[2]} (HP: {self._start_hp[1]})",
+        ]
+        prev_turn = 0
+        for i in range(0, self.n_events * self.EVENT_SIZE, self.EVENT_SIZE):
+            turn, side, damage, crit = self.events[i:i + self.EVENT_SIZE]
+            attacker, defender = names[side], names[3 - side]
+            if crit:
+                log.append(f"✨ Критический удар!")
+            if turn != prev_turn:
+                log.append(f"Ход {turn}: {attacker} атакует {defender} (урон: {damage})")
+            else:
+                log.append(f"       {attacker} атакует {defender} (урон: {damage})")
+            prev_turn = turn
 
-        self.log.append(f"\n🏆 *Победитель: {winner.name}!*")
-        self.log.append(f"🎯 {winner.name} получает {xp_gain} XP")
-        self.log.append(f"💰 {winner_trainer.name} получает 50 монет, {loser_trainer.name} получает 20 монет")
+        winner_name = names[1 if self.winner_trainer is self.t1 else 2]
+        log.append(f"\n🏆 *Победитель: {winner_name}!*")
+        log.append(f"🎯 {winner_name} получает {self.xp_gain} XP")
+        log.append(f"💰 {self.winner_trainer.name} получает 50 монет, {self.loser_trainer.name} получает 20 монет")
 
-        return "\n".join(self.log)
\ No newline at end of file
+        return "\n".join(log)
@@ -1,22 +1,165 @@
-import telebot
-from config import token
-from logic import Pokemon, Trainer, Battle
+import atexit
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
 
-# Создаём бот с поддержкой Markdown
-bot = telebot.TeleBot(token)
+import telebot
+from config import token, storage_backend, db_path, flush_interval, num_threads, file_id_cache_path, stats_batched
+from config import file_id_save_interval
+from config import full_type_chart, spawn_weights, gyms_path, admin_ids, metrics_port
+from config import journal_dir, snapshot_interval, journal_fsync
+from config import render_cache_entries, render_cache_bytes
+from config import sprites_dir, cards_dir, card_cache_entries
+from config import outbox_workers, outbox_global_rate, outbox_chat_rate, outbox_group_rate
+from config import session_backend, session_db_path, session_ttl, session_max, session_sweep_interval
+from config import mode, webhook_url, webhook_host, webhook_port, webhook_path
+from config import webhook_queue_size, webhook_workers, webhook_secret
+from config import tournament_workers, tournament_batch, tournament_size, tournament_prize
+from config import ranked_window, ranked_widen, ranked_max_window, ranked_timeout, ranked_sweep_interval, rating_k
+from config import ranked_workers
+from logic import Trainer, Battle, TYPE_EMOJI, trainer_lock, trainer_name, use_full_type_chart
+from logic import use_spawn_weights
+from storage import make_storage
+from render_cache import render_cache
+from media import PhotoCache
+from cards import BattleCards
+from metrics import Metrics
+from webhook import WebhookServer
+from outbox import Outbox, use_pooled_session
+from sessions import make_sessions
+from gyms import GymRegistry
+from tournament import ELIMINATION, ROUND_ROBIN, TournamentRunner
+from matchmaking import MatchQueue, rating_delta
+from shard import ShardBusy
+
+# Создаём бот с поддержкой Markdown.
+# Обновления обрабатываются пулом из num_threads потоков; согласованность
+# данных одного тренера обеспечивают блокировки trainer_lock из logic.py
+bot = telebot.TeleBot(token, threaded=True, num_threads=num_threads)
+
+use_full_type_chart(full_type_chart)
+use_spawn_weights(spawn_weights)
+render_cache.resize(render_cache_entries, render_cache_bytes)
+
+# Задержки и ошибки обработчиков (см. /metrics и metrics_port в config.py)
+metrics = Metrics()
+
+# Спрайты загружаются в Telegram один раз, дальше отправляются по file_id
+photos = PhotoCache(file_id_cache_path, file_id_save_interval)
+atexit.register(photos.flush)
+
+# Превью боя — одна карточка «A vs B» вместо двух фото; спрайты читаются один раз здесь
+cards = BattleCards(sprites_dir, cards_dir, card_cache_entries, on_evict=photos.forget)
+cards.preload()
+
+# Все ответы идут через очередь отправки: обработчик не ждёт Telegram,
+# лимиты и 429 retry_after соблюдает outbox (см. outbox.py)
+use_pooled_session(outbox_workers + num_threads)
+outbox = Outbox(bot, photos, workers=outbox_workers, global_rate=outbox_global_rate,
+                chat_rate=outbox_chat_rate, group_rate=outbox_group_rate, metrics=metrics)
+atexit.register(outbox.close)
+
+# Лидеры залов собираются один раз; на каждый бой /gym — своя копия лидера
+gyms = GymRegistry.load(gyms_path)
+
+# Турниры: бои раундов считаются в пуле процессов, не в потоках обработчиков
+tournaments = TournamentRunner(tournament_workers, tournament_batch)
+atexit.register(tournaments.close)
+
+# Очередь рейтинговых боёв /ranked: соперник — ближайший по рейтингу Эло,
+# окно поиска расширяется, пока игрок ждёт (см. matchmaking.py)
+ranked_queue = MatchQueue(ranked_window, ranked_widen, ranked_max_window, ranked_timeout)
+atexit.register(ranked_queue.close)
+# В режиме shard.py очередь одна на всех — в этом процессе, остальные обращаются к нему
+RANKED_SHARD = 0
+
+# Незавершённые вызовы /fight: истекают через session_ttl, не больше session_max
+sessions = make_sessions(session_backend, session_db_path, session_ttl, session_max)
+sessions.start_sweeper(session_sweep_interval)
 
 def get_username_from_user(user):
     """Возвращаем уникальное имя тренера (username если есть, иначе first_name_id)."""
-    if user.username:
-        return user.username.lower()
-    # безопасный fallback
-    return f"{user.first_name}_{user.id}"
+    # правило общее с диспетчером shard.py — он по этому имени выбирает процесс
+    return trainer_name(user)
 
 def ensure_trainer(username):
     """Создаёт Trainer, если ещё нет, и возвращает его."""
-    if username in Trainer.trainers:
-        return Trainer.trainers[username]
-    return Trainer(username)
+    with trainer_lock(username):
+        trainer = Trainer.trainers.get(username)
+        if trainer is not None:
+            return trainer
+        return Trainer(username)
+
+def start_storage(owns=None):
+    """
+    Подключает хранилище и запускает периодический сброс изменённых тренеров.
+    owns(имя) — в шардированном режиме рейтинг процесса строится только по его тренерам.
+    """
+    path = journal_dir if storage_backend == "journal" else db_path
+    backend = make_storage(storage_backend, path, fsync=journal_fsync)
+    Trainer.trainers.attach(backend)
+    summaries = Trainer.trainers.summaries()
+    if owns is not None:
+        summaries = [(name, summary) for name, summary in summaries if owns(name)]
+    Trainer.leaderboard.load(summaries)
+    gyms.forget_leaders(Trainer.trainers, Trainer.leaderboard)
+    if hasattr(backend, "start_snapshots"):
+        backend.start_snapshots(snapshot_interval)
+
+    def flush_loop():
+        while not stop_flush.wait(flush_interval):
+            try:
+                Trainer.trainers.flush()
+            except Exception as e:
+                print(f"Ошибка сохранения: {e}")
+
+    stop_flush = threading.Event()
+    threading.Thread(target=flush_loop, name="storage-flush", daemon=True).start()
+
+    def shutdown():
+        stop_flush.set()
+        Trainer.trainers.flush()
+        Trainer.trainers.backend.close()
+
+    atexit.register(shutdown)
+    return shutdown
+
+# Шардированный режим (shard.py): процесс-обработчик подставляет сюда свой Shard
+cluster = None
+
+@contextmanager
+def borrowed(*names):
+    """
+    Тренеры names (в том же порядке, None — нет такого) под блокировками.
+    В шардированном режиме чужие тренеры берутся у процессов-владельцев
+    (ShardBusy, если владелец не ответил или тренер занят).
+    """
+    if cluster is not None:
+        with cluster.borrow(*names) as trainers:
+            yield trainers
+        return
+    with trainer_lock(*names):
+        yield [Trainer.trainers.get(name) for name in names]
+
+def local_top_trainers(k):
+    """Топ-k тренеров этого процесса: (имя, уровни, сила, монеты, победы)."""
+    rows = []
+    for name, lvl, pw in Trainer.leaderboard.top_trainers(k):
+        t = Trainer.trainers.peek(name)
+        rows.append((name, lvl, pw, t.coins if t else 0, t.battles_won if t else 0))
+    return rows
+
+def top_trainers(k):
+    if cluster is not None:
+        return cluster.gather_top("top_trainers", k, key=lambda row: (-row[1], -row[2], row[0]))
+    return local_top_trainers(k)
+
+def top_pokemons(k):
+    if cluster is not None:
+        return cluster.gather_top("top_pokemons", k, key=lambda row: (-row[3], row[2]))
+    return Trainer.leaderboard.top_pokemons(k)
 
 @bot.message_handler(commands=['start', 'help'])
 def cmd_start(message):
@@ -45,8 +188,10 @@ def cmd_start(message):
         "/top — рейтинг тренеров\n"
         "/toppokemons — лучшие покемоны\n\n"
         "Разное:\n"
-        "/gym — бой с лидером зала\n"
-        "/fight — бой с инлайн-кнопками\n\n"
+        "/gym — бой с лидером зала (/gym water — выбрать зал)\n"
+        "/gyms — список залов\n"
+        "/fight — бой с инлайн-кнопками\n"
+        "/ranked — рейтинговый бой с подбором соперника\n\n"
         "Примеры:\n"
         "/catch — поймать покемона\n"
         "/battle @username — вызвать на бой\n"
@@ -54,16 +199,17 @@ def cmd_start(message):
         "/daily — получить награду\n\n"
         "Удачи в игре! 🎮"
     )
-    bot.send_message(message.chat.id, text)
+    outbox.send_message(message.chat.id, text)
 
 @bot.message_handler(commands=['create'])
 def cmd_create(message):
     uname = get_username_from_user(message.from_user)
-    if uname in Trainer.trainers:
-        bot.reply_to(message, "У тебя уже есть профиль тренера.")
-        return
-    Trainer(uname)
-    bot.reply_to(message, "✅ Профиль тренера создан! Можешь ловить покемонов командой /catch")
+    with trainer_lock(uname):
+        if uname in Trainer.trainers:
+            outbox.reply_to(message, "У тебя уже есть профиль тренера.")
+            return
+        Trainer(uname)
+    outbox.reply_to(message, "✅ Профиль тренера создан! Можешь ловить покемонов командой /catch")
 
 @bot.message_handler(commands=['catch', 'add'])
 def cmd_catch(message):
@@ -74,31 +220,27 @@ def cmd_catch(message):
     result_text = trainer.add_pokemon()
     
     if result_text.startswith("❌"):
-        bot.reply_to(message, result_text)
+        outbox.reply_to(message, result_text)
         return
     
     # последний добавленный покемон
     new_pokemon = trainer.pokemons[-1]
 
-    # отправляем текст и картинку (если есть)
-    try:
-        bot.send_message(message.chat.id, f"🎉 {result_text}")
-        if new_pokemon.show_img():
-            bot.send_photo(message.chat.id, new_pokemon.show_img(), caption=new_pokemon.info())
-        else:
-            bot.send_message(message.chat.id, new_pokemon.info())
-    except Exception:
-        # на случай проблем с отправкой фото
-        bot.reply_to(message, result_text + "\n(не удалось отправить изображение)")
+    # отправляем текст и картинку (если есть); если фото не уйдёт — outbox пришлёт подпись текстом
+    outbox.send_message(message.chat.id, f"🎉 {result_text}")
+    if new_pokemon.show_img():
+        outbox.send_photo(message.chat.id, new_pokemon.show_img(), caption=new_pokemon.info_detailed())
+    else:
+        outbox.send_message(message.chat.id, new_pokemon.info_detailed())
 
 @bot.message_handler(commands=['my', 'trainer', 'profile'])
 def cmd_my(message):
     uname = get_username_from_user(message.from_user)
     if uname not in Trainer.trainers:
-        bot.reply_to(message, "❌ У тебя ещё нет профиля. Создай его командой /create или просто используй /catch — он создаст профиль автоматически.")
+        outbox.reply_to(message, "❌ У тебя ещё нет профиля. Создай его командой /create или просто используй /catch — он создаст профиль автоматически.")
         return
     trainer = Trainer.trainers[uname]
-    bot.send_message(message.chat.id, trainer.info())
+    outbox.send_message(message.chat.id, trainer.info())
 
 @bot.message_handler(commands=['battle'])
 def cmd_battle(message):
@@ -116,54 +258,63 @@ def cmd_battle(message):
             opponent_uname = parts[1].lstrip('@').strip().lower()
 
     if opponent_uname is None:
-        bot.reply_to(message, "❌ Укажи оппонента: используй /battle в ответ на сообщение игрока или `/battle username`.")
+        outbox.reply_to(message, "❌ Укажи оппонента: используй /battle в ответ на сообщение игрока или `/battle username`.")
         return
 
     # проверяем профили (создаём профиль автоматически, если нужно)
-    challenger = ensure_trainer(challenger_uname)
-    opponent = Trainer.trainers.get(opponent_uname)
-    if opponent is None:
-        bot.reply_to(message, "❌ У оппонента ещё нет профиля (он не использовал бота).")
-        return
-
-    # проверка наличия покемонов
-    if not challenger.pokemons:
-        bot.reply_to(message, "❌ У тебя нет покемонов — поймай хотя бы одного (/catch).")
-        return
-    if not opponent.pokemons:
-        bot.reply_to(message, "❌ У оппонента нет покемонов для боя.")
-        return
-
-    # создаём и стартуем бой
-    battle = Battle(challenger, opponent)
-    result = battle.start()
-
-    # Отправляем превью покемонов (по одному фото каждого) + результат
+    ensure_trainer(challenger_uname)
     try:
-        p1 = challenger.pokemons[0]
-        p2 = opponent.pokemons[0]
+        # оппонент может принадлежать другому процессу (shard.py) — берём его на время боя
+        with borrowed(challenger_uname, opponent_uname) as (challenger, opponent):
+            if opponent is None:
+                outbox.reply_to(message, "❌ У оппонента ещё нет профиля (он не использовал бота).")
+                return
+
+            # проверка наличия покемонов
+            if not challenger.pokemons:
+                outbox.reply_to(message, "❌ У тебя нет покемонов — поймай хотя бы одного (/catch).")
+                return
+            if not opponent.pokemons:
+                outbox.reply_to(message, "❌ У оппонента нет покемонов для боя.")
+                return
+
+            # создаём и стартуем бой; ключ карточки — по HP до боя
+            p1 = challenger.pokemons[0]
+            p2 = opponent.pokemons[0]
+            card = cards.key(p1, p2) if cards.available else None
+            battle = Battle(challenger, opponent)
+            result = battle.start()
+    except ShardBusy:
+        outbox.reply_to(message, "⏳ Оппонент сейчас занят другим боем, попробуй ещё раз.")
+        return
+
+    # Превью одной карточкой (рисуется вне блокировок) + результат;
+    # без Pillow — по фото на каждого покемона
+    if card is not None:
+        # файл карточки не удаляется из кэша, пока outbox его не отправит
+        path = cards.get(card, pin=True)
+        outbox.send_photo(message.chat.id, path, on_done=lambda: cards.release(path),
+                          caption=f"⚔️ {p1.name} ({challenger.name}) vs {p2.name} ({opponent.name})")
+    else:
         if p1.show_img():
-            bot.send_photo(message.chat.id, p1.show_img(), caption=f"⚔️ {p1.name} — {challenger.name}")
+            outbox.send_photo(message.chat.id, p1.show_img(), caption=f"⚔️ {p1.name} — {challenger.name}")
         if p2.show_img():
-            bot.send_photo(message.chat.id, p2.show_img(), caption=f"⚔️ {p2.name} — {opponent.name}")
-    except Exception:
-        # игнорируем ошибки с картинками
-        pass
+            outbox.send_photo(message.chat.id, p2.show_img(), caption=f"⚔️ {p2.name} — {opponent.name}")
 
-    bot.send_message(message.chat.id, result)
+    outbox.send_message(message.chat.id, result)
 
 @bot.message_handler(commands=['stats'])
 def cmd_stats(message):
     uname = get_username_from_user(message.from_user)
 
     if uname not in Trainer.trainers:
-        bot.reply_to(message, "❌ У тебя нет профиля. Используй /create или /catch.")
+        outbox.reply_to(message, "❌ У тебя нет профиля. Используй /create или /catch.")
         return
 
     trainer = Trainer.trainers[uname]
 
     if not trainer.pokemons:
-        bot.reply_to(message, "❌ У тебя нет покемонов.")
+        outbox.reply_to(message, "❌ У тебя нет покемонов.")
         return
 
     # сортировки: /stats hp /stats attack /stats speed
@@ -172,87 +323,84 @@ def cmd_stats(message):
     if len(args) > 1:
         sort_mode = args[1].lower()
 
-    if sort_mode == "hp":
-        trainer.pokemons.sort(key=lambda p: p.hp, reverse=True)
-    elif sort_mode == "attack":
-        trainer.pokemons.sort(key=lambda p: p.attack, reverse=True)
-    elif sort_mode == "speed":
-        trainer.pokemons.sort(key=lambda p: p.speed, reverse=True)
+    if sort_mode in ("hp", "attack", "speed"):
+        with trainer_lock(uname):
+            trainer.sort_pokemons(sort_mode)
 
-    for p in trainer.pokemons:
-        # XP прогресс-бар
-        filled = int((p.xp / p.xp_to_next) * 10)
-        bar = "█" * filled + "░" * (10 - filled)
-
-        text = (
-            f"*{p.name}* {p.type_emoji()}\n"
-            f"Уровень: *{p.level}*\n"
-            f"XP: `{p.xp} / {p.xp_to_next}`\n"
-            f"{bar}\n\n"
-            f"*Статы:*\n"
-            f"HP: `{p.hp}`\n"
-            f"Атака: `{p.attack}`\n"
-            f"Защита: `{p.defense}`\n"
-            f"Скорость: `{p.speed}`\n"
-        )
+    if stats_batched:
+        send_stats_batched(message.chat.id, trainer)
+        return
 
-        try:
-            if p.show_img():
-                bot.send_photo(message.chat.id, p.show_img(), caption=text, parse_mode="Markdown")
-            else:
-                bot.send_message(message.chat.id, text, parse_mode="Markdown")
-        except:
-            bot.send_message(message.chat.id, text, parse_mode="Markdown")
+    for p in trainer.pokemons:
+        text = p.info_card()
+        if p.show_img():
+            outbox.send_photo(message.chat.id, p.show_img(), caption=text, parse_mode="Markdown")
+        else:
+            outbox.send_message(message.chat.id, text, parse_mode="Markdown")
+
+def send_stats_batched(chat_id, trainer):
+    """
+    Вся команда за один запрос: покемоны с картинками — одним альбомом
+    (send_media_group), без картинок — одним общим сообщением.
+    Было: по запросу на каждого покемона (до 6), стало: 1 (или 2 при смешанной команде).
+    """
+    with trainer_lock(trainer.name):
+        rows = [(p.show_img(), p.info_card()) for p in trainer.pokemons]
+
+    album = [(path, text) for path, text in rows if path and os.path.exists(path)]
+    rest = [text for path, text in rows if not (path and os.path.exists(path))]
+
+    if album:
+        # если альбом не уйдёт, outbox отправит его подписи одним текстом
+        outbox.send_album(chat_id, album, parse_mode="Markdown")
+    if rest:
+        outbox.send_message(chat_id, "\n".join(rest), parse_mode="Markdown")
 
 @bot.message_handler(commands=['rename'])
 def cmd_rename(message):
     uname = get_username_from_user(message.from_user)
 
     if uname not in Trainer.trainers:
-        bot.reply_to(message, "❌ У тебя нет профиля. Используй /create или /catch.")
+        outbox.reply_to(message, "❌ У тебя нет профиля. Используй /create или /catch.")
         return
 
     trainer = Trainer.trainers[uname]
 
     parts = message.text.split(maxsplit=2)
     if len(parts) < 3:
-        bot.reply_to(message, "Использование: `/rename староеИмя новоеИмя`", parse_mode="Markdown")
+        outbox.reply_to(message, "Использование: `/rename староеИмя новоеИмя`", parse_mode="Markdown")
         return
 
     old, new = parts[1], parts[2]
 
-    # Поиск покемона
-    for p in trainer.pokemons:
-        if p.name.lower() == old.lower():
-            p.name = new
-            bot.reply_to(message, f"✏️ Переименовал `{old}` → *{new}*!", parse_mode="Markdown")
-            return
-
-    bot.reply_to(message, f"❌ Покемон `{old}` не найден.", parse_mode="Markdown")
+    # Поиск покемона по id или имени
+    with trainer_lock(uname):
+        p = trainer.find_pokemon(old)
+        if p:
+            trainer.rename_pokemon(p, new)
+    if p:
+        outbox.reply_to(message, f"✏️ Переименовал `{old}` → *{new}*!", parse_mode="Markdown")
+    else:
+        outbox.reply_to(message, f"❌ Покемон `{old}` не найден.", parse_mode="Markdown")
 
 @bot.message_handler(commands=['top'])
 def cmd_top(message):
-    if not Trainer.trainers:
-        bot.reply_to(message, "❌ Пока нет ни одного тренера.")
+    # рейтинг поддерживается инкрементально (Trainer.touch), здесь только срез топ-15
+    # в шардированном режиме — слияние топов всех процессов
+    ranking = top_trainers(15)
+    if not ranking:
+        outbox.reply_to(message, "❌ Пока нет ни одного тренера.")
         return
 
-    ranking = []
-    for username, t in Trainer.trainers.items():
-        total_lvl = sum(p.level for p in t.pokemons)
-        total_power = sum((p.hp + p.attack + p.defense + p.speed) for p in t.pokemons)
-        ranking.append((t.name, total_lvl, total_power, t.coins, t.battles_won))
-
-    ranking.sort(key=lambda x: (x[1], x[2]), reverse=True)
-
     text = "🏆 *Глобальный рейтинг тренеров:*\n\n"
-    for i, (name, lvl, pw, coins, wins) in enumerate(ranking[:15], start=1):
+    for i, (name, lvl, pw, coins, wins) in enumerate(ranking, start=1):
         text += f"*{i}. {name}*\n"
         text += f"   ⭐ Уровни: `{lvl}`\n"
         text += f"   ⚡ Сила: `{pw}`\n"
         text += f"   💰 Монеты: `{coins}`\n"
         text += f"   🏆 Побед: `{wins}`\n\n"
 
-    bot.send_message(message.chat.id, text, parse_mode="Markdown")
+    outbox.send_message(message.chat.id, text, parse_mode="Markdown")
 
 @bot.message_handler(commands=['daily'])
 def cmd_daily(message):
@@ -260,7 +408,7 @@ def cmd_daily(message):
     trainer = ensure_trainer(uname)
     
     success, result = trainer.claim_daily()
-    bot.reply_to(message, result)
+    outbox.reply_to(message, result)
 
 @bot.message_handler(commands=['shop'])
 def cmd_shop(message):
@@ -279,7 +427,7 @@ def cmd_shop(message):
         "💡 Используй /coins чтобы проверить баланс\n"
         "💡 Используй /items чтобы посмотреть инвентарь"
     )
-    bot.reply_to(message, text)
+    outbox.reply_to(message, text)
 
 @bot.message_handler(commands=['buy'])
 def cmd_buy(message):
@@ -287,35 +435,17 @@ def cmd_buy(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
-        bot.reply_to(message, "Использование: `/buy предмет`\nПример: `/buy potion`")
+        outbox.reply_to(message, "Использование: `/buy предмет`\nПример: `/buy potion`")
         return
     
-    item = parts[1].lower()
-    prices = {
-        "potion": 50,
-        "super_potion": 120,
-        "boost": 80,
-        "rare_candy": 200,
-        "evolution_stone": 500
-    }
-    
-    if item not in prices:
-        bot.reply_to(message, "❌ Такого предмета нет в магазине. Посмотри /shop")
-        return
-    
-    price = prices[item]
-    if trainer.coins < price:
-        bot.reply_to(message, f"❌ Недостаточно монет. Нужно {price}, у тебя {trainer.coins}")
-        return
-    
-    trainer.coins -= price
-    trainer.items[item] = trainer.items.get(item, 0) + 1
-    bot.reply_to(message, f"✅ Куплено: {item} за {price} монет. Осталось: {trainer.coins}")
+    # проверка баланса и списание — атомарно под блокировкой тренера
+    success, result = trainer.buy_item(parts[1])
+    outbox.reply_to(message, result)
 
 @bot.message_handler(commands=['coins', 'balance'])
 def cmd_coins(message):
@@ -323,10 +453,10 @@ def cmd_coins(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
-    bot.reply_to(message, f"💰 Баланс: *{trainer.coins}* монет")
+    outbox.reply_to(message, f"💰 Баланс: *{trainer.coins}* монет")
 
 @bot.message_handler(commands=['use'])
 def cmd_use(message):
@@ -334,17 +464,17 @@ def cmd_use(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
     parts = message.text.split(maxsplit=2)
     if len(parts) < 3:
-        bot.reply_to(message, "Использование: `/use предмет покемон`\nПример: `/use potion Pikachu`")
+        outbox.reply_to(message, "Использование: `/use предмет покемон`\nПример: `/use potion Pikachu`")
         return
     
     item, pokemon_name = parts[1], parts[2]
     success, result = trainer.use_item(item, pokemon_name)
-    bot.reply_to(message, result)
+    outbox.reply_to(message, result)
 
 @bot.message_handler(commands=['items', 'inventory'])
 def cmd_items(message):
@@ -352,11 +482,11 @@ def cmd_items(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
     items_text = trainer.get_items_list()
-    bot.reply_to(message, items_text)
+    outbox.reply_to(message, items_text)
 
 @bot.message_handler(commands=['pokemons', 'list'])
 def cmd_pokemons(message):
@@ -364,21 +494,14 @@ def cmd_pokemons(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
     if not trainer.pokemons:
-        bot.reply_to(message, "❌ У тебя нет покемонов. Используй /catch")
+        outbox.reply_to(message, "❌ У тебя нет покемонов. Используй /catch")
         return
     
-    text = f"📋 *Твои покемоны ({len(trainer.pokemons)}/6):*\n\n"
-    for i, p in enumerate(trainer.pokemons, 1):
-        hp_bar = "█" * int(p.hp / p.max_hp * 10) + "░" * (10 - int(p.hp / p.max_hp * 10))
-        text += f"{i}. *{p.name}* {p.type_emoji()} (ур. {p.level})\n"
-        text += f"   HP: {hp_bar} {p.hp}/{p.max_hp}\n"
-        text += f"   ⚔️{p.attack} 🛡️{p.defense} 🏃{p.speed}\n\n"
-    
-    bot.send_message(message.chat.id, text)
+    outbox.send_message(message.chat.id, trainer.pokemons_list())
 
 @bot.message_handler(commands=['evolve'])
 def cmd_evolve(message):
@@ -386,7 +509,7 @@ def cmd_evolve(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
     parts = message.text.split(maxsplit=1)
@@ -394,49 +517,44 @@ def cmd_evolve(message):
         # Показать покемонов, которые могут эволюционировать
         evolvable = [p for p in trainer.pokemons if p.can_evolve and p.evolution_stage == 1]
         if not evolvable:
-            bot.reply_to(message, "❌ Нет покемонов, которые могут эволюционировать")
+            outbox.reply_to(message, "❌ Нет покемонов, которые могут эволюционировать")
             return
         
         text = "🔄 *Покемоны, которые могут эволюционировать:*\n\n"
         for p in evolvable:
-            text += f"• *{p.name}* (ур. {p.level})\n"
-        text += "\nИспользуй: `/evolve имя_покемона`"
-        bot.reply_to(message, text)
+            text += f"• *{p.name}* (ур. {p.level}, id `{p.id}`)\n"
+        text += "\nИспользуй: `/evolve имя_или_id`"
+        outbox.reply_to(message, text)
         return
     
     pokemon_name = parts[1]
-    for p in trainer.pokemons:
-        if p.name.lower() == pokemon_name.lower():
-            if p.evolve():
-                bot.reply_to(message, f"✨ *{p.name}* эволюционировал!")
-            else:
-                bot.reply_to(message, f"❌ *{p.name}* не может эволюционировать")
-            return
-    
-    bot.reply_to(message, "❌ Покемон не найден")
+    with trainer_lock(uname):
+        p = trainer.find_pokemon(pokemon_name)
+        evolved = p is not None and trainer.evolve_pokemon(p)
+    
+    if p is None:
+        outbox.reply_to(message, "❌ Покемон не найден")
+    elif evolved:
+        outbox.reply_to(message, f"✨ *{p.name}* эволюционировал!")
+    else:
+        outbox.reply_to(message, f"❌ *{p.name}* не может эволюционировать")
 
 @bot.message_handler(commands=['top_pokemons', 'best'])
 def cmd_top_pokemons(message):
-    all_pokemons = []
-    for trainer in Trainer.trainers.values():
-        for pokemon in trainer.pokemons:
-            power = pokemon.hp + pokemon.attack + pokemon.defense + pokemon.speed
-            all_pokemons.append((pokemon, trainer.name, power))
+    top = top_pokemons(10)
     
-    if not all_pokemons:
-        bot.reply_to(message, "❌ В мире пока нет покемонов")
+    if not top:
+        outbox.reply_to(message, "❌ В мире пока нет покемонов")
         return
     
-    all_pokemons.sort(key=lambda x: x[2], reverse=True)
-    
     text = "🏆 *Топ 10 покемонов:*\n\n"
-    for i, (pokemon, trainer_name, power) in enumerate(all_pokemons[:10], 1):
-        text += f"{i}. *{pokemon.name}* {pokemon.type_emoji()}\n"
+    for i, (name, type_, trainer_name, power, level, wins) in enumerate(top, 1):
+        text += f"{i}. *{name}* {TYPE_EMOJI.get(type_.lower(), '❔')}\n"
         text += f"   👤 Тренер: {trainer_name}\n"
-        text += f"   ⚡ Сила: {power} | Ур. {pokemon.level}\n"
-        text += f"   🏆 Побед: {pokemon.battles_won}\n\n"
+        text += f"   ⚡ Сила: {power} | Ур. {level}\n"
+        text += f"   🏆 Побед: {wins}\n\n"
     
-    bot.send_message(message.chat.id, text)
+    outbox.send_message(message.chat.id, text)
 
 @bot.message_handler(commands=['gym'])
 def cmd_gym(message):
@@ -444,20 +562,28 @@ def cmd_gym(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer or not trainer.pokemons:
-        bot.reply_to(message, "❌ Нужен хотя бы один покемон для боя в зале")
+        outbox.reply_to(message, "❌ Нужен хотя бы один покемон для боя в зале")
         return
     
-    # Создаем сильного NPC-тренера
-    gym_leader = Trainer("Лидер Залы Брок")
-    gym_leader.pokemons = [
-        Pokemon("Geodude", "rock", 80, 100, 120, 30),
-        Pokemon("Onix", "rock", 120, 80, 150, 50)
-    ]
-    
-    battle = Battle(trainer, gym_leader)
+    parts = message.text.split(maxsplit=1)
+    gym = gyms.get(parts[1].strip() if len(parts) == 2 else None)
+    if gym is None:
+        outbox.reply_to(message, "❌ Такого зала нет. Список залов: /gyms")
+        return
+
+    # копия лидера только на этот бой: не попадает в реестр, рейтинг и базу
+    battle = Battle(trainer, gym.leader_for_battle())
     result = battle.start()
-    
-    bot.send_message(message.chat.id, f"🏛️ *Бой в Зале Скалы!*\n\n{result}")
+
+    outbox.send_message(message.chat.id, f"🏛️ *{gym.title}: {gym.leader}!*\n\n{result}")
+
+@bot.message_handler(commands=['gyms'])
+def cmd_gyms(message):
+    text = "🏛️ *Залы:*\n\n"
+    for gym in gyms:
+        text += f"`/gym {gym.id}` — {gym.title}, {gym.leader}\n"
+        text += f"   Команда: {', '.join(gym.team())}\n\n"
+    outbox.send_message(message.chat.id, text)
 
 @bot.message_handler(commands=['release'])
 def cmd_release(message):
@@ -465,27 +591,27 @@ def cmd_release(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
         # Показать список покемонов для отпускания
         if not trainer.pokemons:
-            bot.reply_to(message, "❌ У тебя нет покемонов")
+            outbox.reply_to(message, "❌ У тебя нет покемонов")
             return
         
         text = "🕊️ *Твои покемоны (отпусти кого-то):*\n\n"
         for i, p in enumerate(trainer.pokemons, 1):
-            text += f"{i}. *{p.name}* (ур. {p.level})\n"
+            text += f"{i}. *{p.name}* (ур. {p.level}, id `{p.id}`)\n"
         
-        text += "\nИспользуй: `/release имя_покемона`"
-        bot.reply_to(message, text)
+        text += "\nИспользуй: `/release имя_или_id`"
+        outbox.reply_to(message, text)
         return
     
     pokemon_name = parts[1]
     success, result = trainer.release_pokemon(pokemon_name)
-    bot.reply_to(message, result)
+    outbox.reply_to(message, result)
 
 @bot.message_handler(commands=['heal'])
 def cmd_heal(message):
@@ -493,19 +619,27 @@ def cmd_heal(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer:
-        bot.reply_to(message, "❌ Сначала создай профиль /create")
+        outbox.reply_to(message, "❌ Сначала создай профиль /create")
         return
     
     if not trainer.pokemons:
-        bot.reply_to(message, "❌ У тебя нет покемонов")
+        outbox.reply_to(message, "❌ У тебя нет покемонов")
         return
     
     result = trainer.heal_all()
-    bot.reply_to(message, result)
+    outbox.reply_to(message, result)
 
-# Добавляем команду /fight с инлайн-кнопками из logic1.py
+# Команда /fight с инлайн-кнопками: два игрока выбирают покемонов по вызову.
+# Состояние вызова — в sessions (TTL + LRU), ключ — id вызова, а не user_id;
+# в сессии только имена тренеров и id покемонов
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-battle_selection = {}
+
+def pokemon_keyboard(trainer, challenge_id):
+    kb = InlineKeyboardMarkup()
+    for p in trainer.pokemons:
+        # в callback_data — стабильный id, а не имя (имена могут совпадать и меняться)
+        kb.add(InlineKeyboardButton(text=p.name, callback_data=f"pick_{challenge_id}_{p.id}"))
+    return kb
 
 @bot.message_handler(commands=['fight'])
 def cmd_fight(message):
@@ -513,68 +647,344 @@ def cmd_fight(message):
     trainer = Trainer.trainers.get(uname)
     
     if not trainer or not trainer.pokemons:
-        bot.reply_to(message, "❌ Нет покемонов для боя.")
+        outbox.reply_to(message, "❌ Нет покемонов для боя.")
         return
-    
-    kb = InlineKeyboardMarkup()
-    for p in trainer.pokemons:
-        kb.add(InlineKeyboardButton(text=p.name, callback_data=f"pick_{p.name}"))
-    
-    battle_selection[message.from_user.id] = {"step": 1}
-    bot.send_message(message.chat.id, "⚔️ Выбери своего покемона для боя:", reply_markup=kb)
+
+    # соперник: ответ на сообщение или /fight username; без него вызов может принять любой
+    opponent = None
+    if message.reply_to_message:
+        opponent = get_username_from_user(message.reply_to_message.from_user)
+    else:
+        parts = message.text.split(maxsplit=1)
+        if len(parts) == 2:
+            opponent = parts[1].lstrip('@').strip().lower()
+    if opponent == uname:
+        outbox.reply_to(message, "❌ Нельзя вызвать на бой самого себя.")
+        return
+
+    challenge_id = secrets.token_hex(4)
+    sessions.set(f"fight:{challenge_id}",
+                 {"challenger": uname, "opponent": opponent, "accepted": False, "picks": {}})
+    outbox.send_message(message.chat.id, "⚔️ Выбери своего покемона для боя:",
+                        reply_markup=pokemon_keyboard(trainer, challenge_id))
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("accept_"))
+def accept_callback(call):
+    challenge_id = call.data.split("_", 1)[1]
+    uname = get_username_from_user(call.from_user)
+    trainer = Trainer.trainers.get(uname)
+    if not trainer or not trainer.pokemons:
+        bot.answer_callback_query(call.id, "❌ Нет покемонов для боя. Поймай кого-нибудь: /catch")
+        return
+
+    error = None
+
+    def accept(session):
+        nonlocal error
+        if session is None:
+            error = "⌛ Вызов истёк — начни заново командой /fight"
+        elif uname == session["challenger"]:
+            error = "❌ Нельзя принять свой же вызов"
+        elif session["accepted"]:
+            error = "❌ Вызов уже принят"
+        elif session["opponent"] not in (None, uname):
+            error = "❌ Этот вызов адресован другому игроку"
+        else:
+            session["opponent"] = uname
+            session["accepted"] = True
+        return session
+
+    sessions.update(f"fight:{challenge_id}", accept)
+    if error:
+        bot.answer_callback_query(call.id, error)
+        return
+
+    bot.answer_callback_query(call.id, "✅ Вызов принят")
+    outbox.call(
+        call.message.chat.id,
+        bot.edit_message_text,
+        f"⚔️ {uname} принимает вызов! Выбери своего покемона:",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=pokemon_keyboard(trainer, challenge_id)
+    )
 
 @bot.callback_query_handler(func=lambda c: c.data.startswith("pick_"))
 def pick_callback(call):
-    user_id = call.from_user.id
-    pname = call.data.split("_", 1)[1]
-    
-    if user_id not in battle_selection:
-        bot.answer_callback_query(call.id, "Начни бой командой /fight")
+    parts = call.data.split("_", 2)
+    if len(parts) != 3:
+        # кнопка из старого сообщения (pick_<имя>, до сессий вызовов)
+        bot.answer_callback_query(call.id, "⌛ Начни бой заново /fight")
         return
-    
+    _, challenge_id, pokemon_id = parts
     uname = get_username_from_user(call.from_user)
-    trainer = Trainer.trainers[uname]
-    
-    p = next((x for x in trainer.pokemons if x.name == pname), None)
-    if not p:
-        bot.answer_callback_query(call.id, "❌ Покемон не найден")
-        return
+    trainer = Trainer.trainers.get(uname)
     
-    if battle_selection[user_id]["step"] == 1:
-        battle_selection[user_id]["first"] = p
-        battle_selection[user_id]["step"] = 2
-        bot.edit_message_text(
-            "✅ Выбран покемон для боя! Теперь попроси оппонента тоже использовать /fight и выбрать своего покемона.",
+    if not trainer or not trainer.find_pokemon(pokemon_id):
+        bot.answer_callback_query(call.id, "❌ Это не твой покемон")
+        return
+
+    error = None
+    picked = None
+
+    def pick(session):
+        nonlocal error, picked
+        if session is None:
+            error = "⌛ Вызов истёк — начни заново командой /fight"
+            return None
+        role = "challenger" if "challenger" not in session["picks"] else "opponent"
+        if session[role] != uname or (role == "opponent" and not session["accepted"]):
+            error = "❌ Сейчас выбирает другой игрок"
+            return session
+        session["picks"][role] = pokemon_id
+        picked = session
+        # оба выбрали — сессия больше не нужна
+        return session if len(session["picks"]) < 2 else None
+
+    sessions.update(f"fight:{challenge_id}", pick)
+    if error:
+        bot.answer_callback_query(call.id, error)
+        return
+    bot.answer_callback_query(call.id, "✅ Покемон выбран")
+
+    if len(picked["picks"]) < 2:
+        kb = InlineKeyboardMarkup()
+        kb.add(InlineKeyboardButton(text="⚔️ Принять бой", callback_data=f"accept_{challenge_id}"))
+        outbox.call(
+            call.message.chat.id,
+            bot.edit_message_text,
+            f"✅ {uname} выбрал покемона! {picked['opponent'] or 'Любой игрок'}, прими вызов:",
             call.message.chat.id,
-            call.message.message_id
+            call.message.message_id,
+            reply_markup=kb
         )
+        return
+
+    try:
+        with borrowed(picked["challenger"], picked["opponent"]) as (challenger, opponent):
+            first = challenger and challenger.find_pokemon(picked["picks"]["challenger"])
+            second = opponent and opponent.find_pokemon(picked["picks"]["opponent"])
+            if not first or not second:
+                outbox.send_message(call.message.chat.id, "❌ Один из покемонов больше недоступен — бой отменён.")
+                return
+
+            # выбранные покемоны дерутся по обычным правилам боя
+            result = Battle(challenger, opponent, p1=first, p2=second).start()
+    except ShardBusy:
+        outbox.send_message(call.message.chat.id, "⏳ Соперник сейчас занят, бой отменён — вызови его снова /fight.")
+        return
+
+    outbox.send_message(call.message.chat.id, result)
+
+# Рейтинговые бои: /ranked -> выбор покемона -> очередь ranked_queue.
+# Пара находится сразу при входе в очередь или фоновым проходом по ней
+@bot.message_handler(commands=['ranked'])
+def cmd_ranked(message):
+    # /ranked — встать в очередь, /ranked cancel — выйти из неё
+    uname = get_username_from_user(message.from_user)
+    if message.text.split()[1:2] == ["cancel"]:
+        try:
+            left = ranked_call("ranked_cancel", uname)
+        except ShardBusy:
+            outbox.reply_to(message, "⏳ Очередь сейчас недоступна, попробуй ещё раз.")
+            return
+        outbox.reply_to(message, "🚪 Ты вышел из очереди рейтинговых боёв." if left else "❌ Ты не в очереди.")
+        return
+
+    trainer = Trainer.trainers.get(uname)
+    if not trainer or not trainer.pokemons:
+        outbox.reply_to(message, "❌ Нет покемонов для боя.")
+        return
+    kb = InlineKeyboardMarkup()
+    for p in trainer.pokemons:
+        kb.add(InlineKeyboardButton(text=p.name, callback_data=f"ranked_{p.id}"))
+    outbox.send_message(message.chat.id, f"🏅 Твой рейтинг: {trainer.rating}. Выбери покемона для рейтингового боя:",
+                        reply_markup=kb)
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("ranked_"))
+def ranked_callback(call):
+    pokemon_id = call.data.split("_", 1)[1]
+    uname = get_username_from_user(call.from_user)
+    trainer = Trainer.trainers.get(uname)
+    if not trainer or not trainer.find_pokemon(pokemon_id):
+        bot.answer_callback_query(call.id, "❌ Это не твой покемон")
+        return
+
+    try:
+        matched = ranked_call("ranked_join", uname, pokemon_id, trainer.rating, call.message.chat.id)
+    except ShardBusy:
+        bot.answer_callback_query(call.id, "⏳ Очередь сейчас недоступна, попробуй ещё раз")
+        return
+    if not matched:
+        bot.answer_callback_query(call.id, "🔎 Ищем соперника...")
+        outbox.send_message(call.message.chat.id, f"🔎 {uname} ждёт соперника (рейтинг {trainer.rating}). "
+                                                  f"Выйти из очереди: /ranked cancel")
+        return
+    bot.answer_callback_query(call.id, "⚔️ Соперник найден!")
+
+def ranked_call(op, *args):
+    """
+    Операция над очередью /ranked: ranked_join, ranked_cancel или ranked_stats.
+    В режиме shard.py — запрос к процессу RANKED_SHARD (ShardBusy, если не ответил).
+    """
+    if cluster is not None and cluster.index != RANKED_SHARD:
+        return cluster.call(RANKED_SHARD, op, *args)
+    local = {"ranked_join": ranked_join, "ranked_cancel": ranked_cancel, "ranked_stats": ranked_stats}
+    return local[op](*args)
+
+def ranked_join(name, pokemon_id, rating, chat_id, background=False):
+    """
+    Ставит заявку в очередь; True — соперник нашёлся и бой сыгран.
+    background=True (запрос соседа) — бой в отдельном потоке, чтобы ответить до таймаута запроса.
+    """
+    match = ranked_queue.enqueue(name, pokemon_id, rating, chat_id)
+    if match is None:
+        return False
+    if background:
+        threading.Thread(target=play_ranked, args=match, daemon=True).start()
     else:
-        first = battle_selection[user_id]["first"]
-        second = p
-        
-        # Простой расчет победителя по скорости
-        winner = first if first.speed >= second.speed else second
-        loser = second if winner == first else first
-        
-        # Начисление XP победителю
-        winner.add_xp(25)
-        
-        result = (
-            f"⚔️ *Бой завершен!*\n\n"
-            f"{first.name} (Скорость: {first.speed}) vs {second.name} (Скорость: {second.speed})\n\n"
-            f"🏆 Победил: *{winner.name}!*\n"
-            f"🎯 {winner.name} получает 25 XP"
-        )
-        
-        del battle_selection[user_id]
-        bot.send_message(call.message.chat.id, result)
+        play_ranked(*match)
+    return True
+
+def ranked_cancel(name):
+    return ranked_queue.cancel(name)
+
+def ranked_stats():
+    return ranked_queue.stats()
+
+def play_ranked(first, second):
+    """Бой двух заявок из очереди (matchmaking.Ticket) и пересчёт рейтингов по Эло."""
+    chats = {first.chat_id, second.chat_id}
+    try:
+        with borrowed(first.name, second.name) as (t1, t2):
+            p1 = t1 and t1.find_pokemon(first.pokemon_id)
+            p2 = t2 and t2.find_pokemon(second.pokemon_id)
+            if not p1 or not p2:
+                for chat_id in chats:
+                    outbox.send_message(chat_id, "❌ Один из покемонов больше недоступен — рейтинговый бой отменён.")
+                return
+            battle = Battle(t1, t2, p1=p1, p2=p2)
+            result = battle.start()
+            winner, loser = battle.winner_trainer, battle.loser_trainer
+            delta = rating_delta(winner.rating, loser.rating, rating_k)
+            winner.adjust_rating(delta)
+            loser.adjust_rating(-delta)
+            ratings = f"🏅 Рейтинг: {winner.name} {winner.rating} (+{delta}), {loser.name} {loser.rating} (-{delta})"
+    except ShardBusy:
+        for chat_id in chats:
+            outbox.send_message(chat_id, "⏳ Соперник сейчас занят — бой отменён, встань в очередь снова: /ranked")
+        return
+
+    for chat_id in chats:
+        outbox.send_message(chat_id, f"{result}\n\n{ratings}")
+
+def ranked_timeout_expired(ticket):
+    outbox.send_message(ticket.chat_id, f"⌛ {ticket.name}, соперник не нашёлся — попробуй ещё раз: /ranked")
+
+ranked_queue.start(ranked_sweep_interval, play_ranked, ranked_timeout_expired, ranked_workers)
+
+# Служебные команды для администраторов (admin_ids в config.py)
+@bot.message_handler(commands=['metrics'], func=lambda m: m.from_user.id in admin_ids)
+def cmd_metrics(message):
+    cache = render_cache.stats()
+    sent = outbox.stats()
+    try:
+        ranked = ranked_call("ranked_stats")
+    except ShardBusy:
+        ranked = {"waiting": "?", "matched": "?", "expired": "?"}
+    drawn = cards.stats()
+    text = metrics.summary()
+    text += (f"🗂 Кэш текстов: {cache['entries']} записей, {cache['bytes'] // 1024} КБ, "
+             f"попаданий {cache['hits']} / промахов {cache['misses']}\n")
+    text += (f"📤 Очередь отправки: ждут {sent['pending']}, отправлено {sent['sent']}, "
+             f"склеено {sent['coalesced']}, 429: {sent['throttled']}, ошибок {sent['failed']}\n")
+    text += (f"🖼 Карточки боёв: файлов {drawn['entries']}, попаданий {drawn['hits']}, "
+             f"нарисовано {drawn['rendered']}, удалено {drawn['evicted']}\n")
+    text += (f"🏅 Очередь /ranked: ждут {ranked['waiting']}, боёв {ranked['matched']}, "
+             f"без соперника {ranked['expired']}\n")
+    outbox.send_message(message.chat.id, text)
+
+def pay_prize(name, amount, attempts=3, pause=1.0):
+    """Монеты призёру; в режиме shard.py владелец может быть занят — несколько попыток. False — не вышло."""
+    for attempt in range(attempts):
+        try:
+            with borrowed(name) as (trainer,):
+                if trainer is None:
+                    return False
+                trainer.add_coins(amount)
+                return True
+        except ShardBusy:
+            if attempt + 1 < attempts:
+                time.sleep(pause)
+    return False
+
+@bot.message_handler(commands=['tournament'], func=lambda m: m.from_user.id in admin_ids)
+def cmd_tournament(message):
+    # /tournament [elimination|round_robin] [участников]
+    kind, size = ELIMINATION, tournament_size
+    for arg in message.text.split()[1:]:
+        if arg.isdigit():
+            size = int(arg)
+        elif arg in (ELIMINATION, ROUND_ROBIN):
+            kind = arg
+        else:
+            outbox.reply_to(message, "Использование: /tournament [elimination|round_robin] [участников]")
+            return
+    chat_id = message.chat.id
+    # в режиме shard.py — лучшие по всем процессам, а не только по этому
+    names = [row[0] for row in top_trainers(size)]
+    title = "на выбывание" if kind == ELIMINATION else "круговой"
+
+    def on_round(round_no, matches):
+        outbox.send_message(chat_id, f"🏟️ Раунд {round_no} завершён: {matches} боёв")
+
+    def on_done(table):
+        if not table:
+            outbox.send_message(chat_id, "🏟️ Турнир не состоялся: нет участников с покемонами")
+            return
+        champion_name, wins = table[0]
+        if pay_prize(champion_name, tournament_prize):
+            prize = f"приз: {tournament_prize} 💰"
+        else:
+            prize = "приз не выдан — тренер занят, обратитесь к администратору"
+        text = f"🏆 *Чемпион турнира ({title}): {champion_name}!* Побед: {wins}, {prize}\n\n"
+        for i, (name, wins) in enumerate(table[1:5], start=2):
+            text += f"{i}. {name} — побед: {wins}\n"
+        outbox.send_message(chat_id, text)
+
+    def on_error(e):
+        outbox.send_message(chat_id, f"❌ Турнир прерван: {e}")
+
+    if not tournaments.start(names, kind, on_round, on_done, on_error, cluster=cluster):
+        outbox.reply_to(message, "⏳ Турнир уже идёт")
+        return
+    outbox.send_message(chat_id, f"🏟️ Турнир ({title}) начался: до {len(names)} участников")
+
+# не /profile: это уже синоним /my (cmd_my)
+@bot.message_handler(commands=['prof'], func=lambda m: m.from_user.id in admin_ids)
+def cmd_prof(message):
+    parts = message.text.split()
+    if len(parts) < 2:
+        outbox.reply_to(message, "Использование: `/prof cmd_top [число вызовов]`", parse_mode="Markdown")
+        return
+    handler, calls = parts[1], max(1, int(parts[2])) if len(parts) > 2 and parts[2].isdigit() else 1
+    chat_id = message.chat.id
+
+    def on_done(report):
+        # лимит сообщения Telegram — 4096 символов
+        outbox.send_message(chat_id, f"🔬 Профиль {handler}:\n{report[:3900]}")
+
+    if not metrics.profile(handler, calls, on_done):
+        outbox.reply_to(message, "❌ Нет такого обработчика. Есть: " + ", ".join(metrics.handlers()))
+        return
+    outbox.reply_to(message, f"🔬 Профилирую следующие {calls} вызовов {handler}")
 
 @bot.message_handler(func=lambda m: True)
 def fallback(message):
     # Небольшая подсказка на любые другие сообщения
     if message.text and message.text.startswith('/'):
         # неизвестная команда
-        bot.reply_to(message, 
+        outbox.reply_to(message, 
             "❌ Неизвестная команда. Напиши /help для списка команд\n"
             "💡 Быстрые команды:\n"
             "/catch — поймать покемона\n"
@@ -583,6 +993,24 @@ def fallback(message):
         )
     # иначе — игнорируем
 
+# Оборачиваем все обработчики выше — должно идти после их регистрации
+metrics.instrument(bot)
+
 if __name__ == "__main__":
-    print("Bot started...")
-    bot.infinity_polling(none_stop=True)
\ No newline at end of file
+    start_storage()
+    if metrics_port:
+        metrics.serve(metrics_port)
+    if mode == "webhook":
+        # обработчики выполняют потоки webhook-сервера, а не пул TeleBot
+        bot.threaded = False
+        server = WebhookServer(bot, webhook_host, webhook_port, webhook_path,
+                               webhook_queue_size, webhook_workers, webhook_secret)
+        if webhook_url:
+            bot.remove_webhook()
+            bot.set_webhook(url=webhook_url + webhook_path, secret_token=webhook_secret or None)
+        # без webhook_url — локальный режим: обновления можно слать `python webhook.py replay`
+        print(f"Bot started (webhook на {webhook_host}:{webhook_port}{webhook_path})...")
+        server.serve_forever()
+    else:
+        print("Bot started...")
+        bot.infinity_polling(none_stop=True)
\ No newline at end of file
@@ -0,0 +1,207 @@
+# ========================= matchmaking.py =========================
+# Рейтинговые бои (/ranked): игрок ставит в очередь выбранного покемона,
+# очередь подбирает соперника с ближайшим рейтингом Эло (Trainer.rating).
+#
+# Очередь — список (рейтинг, номер), отсортированный по рейтингу (bisect,
+# как в leaderboard.py): ближайший соперник находится за O(log n) и при
+# десятках тысяч ожидающих. Допустимая разница рейтингов растёт со временем
+# ожидания; кто ждёт дольше timeout — выходит из очереди ни с чем.
+# Найденные фоновым проходом бои идут в отдельном пуле потоков.
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, insort
+
+
+def expected_score(rating, opponent_rating):
+    """Ожидаемый результат (0..1) по Эло."""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def rating_delta(winner_rating, loser_rating, k=32):
+    """На сколько очков растёт рейтинг победителя (и падает у проигравшего), не меньше 1."""
+    return max(1, round(k * (1 - expected_score(winner_rating, loser_rating))))
+
+
+class Ticket:
+    """Заявка в очереди: тренер, его покемон, рейтинг на момент входа, чат для ответа."""
+
+    __slots__ = ("name", "pokemon_id", "rating", "chat_id", "enqueued", "key")
+
+    def __init__(self, name, pokemon_id, rating, chat_id, enqueued, seq):
+        self.name = name
+        self.pokemon_id = pokemon_id
+        self.rating = rating
+        self.chat_id = chat_id
+        self.enqueued = enqueued
+        self.key = (rating, seq)
+
+
+class MatchQueue:
+    """
+    Окно поиска заявки: window + widen * (секунд в очереди), не больше max_window.
+    Пара подходит, если разница рейтингов укладывается в окно хотя бы одного
+    из двоих — долго ждущий игрок соглашается на более далёкого соперника.
+    """
+
+    def __init__(self, window=50, widen=10, max_window=400, timeout=120, clock=time.monotonic):
+        self.window = window
+        self.widen = widen
+        self.max_window = max_window
+        self.timeout = timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._keys = []  # [(рейтинг, номер)] по возрастанию
+        self._tickets = {}  # (рейтинг, номер) -> Ticket
+        self._by_name = {}  # имя тренера -> Ticket
+        self.matched = 0
+        self.expired = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._by_name
+
+    def _window(self, ticket, now):
+        return min(self.max_window, self.window + self.widen * (now - ticket.enqueued))
+
+    def _fits(self, a, b, now):
+        return abs(a.rating - b.rating) <= max(self._window(a, now), self._window(b, now))
+
+    def _remove(self, ticket):
+        # вызывается под self._lock
+        i = bisect_left(self._keys, ticket.key)
+        del self._keys[i]
+        del self._tickets[ticket.key]
+        del self._by_name[ticket.name]
+
+    def _nearest(self, key):
+        """Заявка с ближайшим рейтингом к key (сама key в очереди не учитывается)."""
+        i = bisect_left(self._keys, key)
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(self._keys):
+                candidate = self._tickets[self._keys[j]]
+                if best is None or abs(candidate.rating - key[0]) < abs(best.rating - key[0]):
+                    best = candidate
+        return best
+
+    def enqueue(self, name, pokemon_id, rating, chat_id=None):
+        """
+        Ставит тренера в очередь (повторный вызов заменяет его заявку).
+        Если соперник нашёлся сразу — обе заявки уходят из очереди и
+        возвращается пара (соперник, новая заявка), иначе None.
+        """
+        with self._lock:
+            now = self.clock()
+            old = self._by_name.get(name)
+            if old is not None:
+                self._remove(old)
+            ticket = Ticket(name, pokemon_id, rating, chat_id, now, next(self._seq))
+            opponent = self._nearest(ticket.key)
+            if opponent is not None and self._fits(ticket, opponent, now):
+                self._remove(opponent)
+                self.matched += 1
+                return opponent, ticket
+            insort(self._keys, ticket.key)
+            self._tickets[ticket.key] = ticket
+            self._by_name[name] = ticket
+            return None
+
+    def cancel(self, name):
+        """Убирает заявку тренера; False — его не было в очереди."""
+        with self._lock:
+            ticket = self._by_name.get(name)
+            if ticket is None:
+                return False
+            self._remove(ticket)
+            return True
+
+    def sweep(self):
+        """
+        Один проход по очереди: сначала выбывают заявки старше timeout, затем
+        соседние по рейтингу пары, которым это уже позволяют расширившиеся окна.
+        Возвращает (пары, истёкшие заявки).
+        """
+        with self._lock:
+            now = self.clock()
+            expired = []
+            waiting = []
+            for key in self._keys:
+                ticket = self._tickets[key]
+                (expired if now - ticket.enqueued > self.timeout else waiting).append(ticket)
+
+            pairs = []
+            left = []
+            i = 0
+            while i < len(waiting):
+                if i + 1 < len(waiting) and self._fits(waiting[i], waiting[i + 1], now):
+                    pairs.append((waiting[i], waiting[i + 1]))
+                    i += 2
+                else:
+                    left.append(waiting[i])
+                    i += 1
+
+            if expired or pairs:
+                self._keys = [ticket.key for ticket in left]
+                self._tickets = {ticket.key: ticket for ticket in left}
+                self._by_name = {ticket.name: ticket for ticket in left}
+            self.matched += len(pairs)
+            self.expired += len(expired)
+            return pairs, expired
+
+    def start(self, interval, on_match, on_expire, workers=4):
+        """
+        Фоновый поток: sweep() раз в interval секунд. on_match(заявка, заявка) —
+        в пуле из workers потоков (бой не задерживает следующие проходы),
+        on_expire(заявка) — в потоке очереди. Ошибка одного вызова не мешает остальным;
+        если упал on_match, обе заявки уходят в on_expire — они уже вынуты из очереди,
+        и иначе игроки не узнали бы, что боя не будет.
+        """
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="matchmaking")
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    pairs, expired = self.sweep()
+                except Exception as e:
+                    print(f"Ошибка подбора соперников: {e}")
+                    continue
+                for a, b in pairs:
+                    self._pool.submit(_play, on_match, on_expire, a, b)
+                for ticket in expired:
+                    _safe_call(on_expire, ticket)
+
+        self._stop = threading.Event()
+        threading.Thread(target=loop, name="matchmaking", daemon=True).start()
+
+    def close(self):
+        if hasattr(self, "_stop"):
+            self._stop.set()
+            self._pool.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {"waiting": len(self._keys), "matched": self.matched, "expired": self.expired}
+
+
+def _safe_call(callback, *tickets):
+    try:
+        callback(*tickets)
+    except Exception as e:
+        print(f"Ошибка обработки заявок {[t.name for t in tickets]}: {e}")
+
+
+def _play(on_match, on_expire, a, b):
+    try:
+        on_match(a, b)
+    except Exception as e:
+        print(f"Ошибка рейтингового боя {a.name} — {b.name}: {e}")
+        _safe_call(on_expire, a)
+        _safe_call(on_expire, b)
@@ -0,0 +1,165 @@
+# ========================= media.py =========================
+# Отправка картинок покемонов через кэш file_id Telegram:
+# каждый спрайт загружается один раз, дальше отправляется по file_id
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from telebot.apihelper import ApiTelegramException
+from telebot.types import InputMediaPhoto
+
+
+class PhotoCache:
+    """
+    Постоянный кэш {путь: {"sha1": хэш содержимого, "file_id": ...}}.
+
+    Если файл на диске изменился (другой хэш) — картинка загружается заново.
+    Хэш пересчитывается только при смене mtime/размера файла.
+    Файл кэша переписывается не чаще раза в save_interval секунд (и в flush()):
+    потерянный при падении file_id стоит лишь повторной загрузки.
+    """
+
+    def __init__(self, path, save_interval=0):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._stat_hashes = {}  # путь -> ((mtime, size), sha1)
+        self._entries = {}
+        self._by_hash = {}  # sha1 -> пути с этим содержимым
+        self._dirty = False
+        self._saved_at = 0.0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+            # записи об удалённых файлах (старые карточки боёв) не нужны
+            for image_path, entry in entries.items():
+                if os.path.exists(image_path):
+                    self._add(image_path, entry)
+
+    def _content_hash(self, image_path):
+        st = os.stat(image_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._stat_hashes.get(image_path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        with open(image_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self._stat_hashes[image_path] = (stamp, digest)
+        return digest
+
+    def _add(self, image_path, entry):
+        # _add, _drop, _changed и _save вызываются под self._lock
+        self._drop(image_path)
+        self._entries[image_path] = entry
+        self._by_hash.setdefault(entry["sha1"], set()).add(image_path)
+
+    def _drop(self, image_path):
+        entry = self._entries.pop(image_path, None)
+        if entry is None:
+            return False
+        paths = self._by_hash.get(entry["sha1"])
+        paths.discard(image_path)
+        if not paths:
+            del self._by_hash[entry["sha1"]]
+        self._stat_hashes.pop(image_path, None)
+        return True
+
+    def _changed(self):
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self._save()
+
+    def _save(self):
+        # атомарная запись: сначала во временный файл, потом переименование
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def lookup(self, image_path):
+        """file_id для актуального содержимого файла или None."""
+        digest = self._content_hash(image_path)
+        with self._lock:
+            entry = self._entries.get(image_path)
+            if entry and entry["sha1"] == digest:
+                return entry["file_id"]
+            # та же картинка могла уже загружаться под другим именем
+            others = self._by_hash.get(digest)
+            if others:
+                return self._entries[next(iter(others))]["file_id"]
+        return None
+
+    def remember(self, image_path, file_id):
+        digest = self._content_hash(image_path)
+        with self._lock:
+            self._add(image_path, {"sha1": digest, "file_id": file_id})
+            self._changed()
+
+    def forget(self, *image_paths):
+        with self._lock:
+            if sum(self._drop(image_path) for image_path in image_paths):
+                self._changed()
+
+    def flush(self):
+        """Записывает отложенные изменения (при остановке бота)."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def send_photo(self, bot, chat_id, image_path, **kwargs):
+        """Как bot.send_photo, но image_path — путь к файлу; загрузка только при первом использовании."""
+        file_id = self.lookup(image_path)
+        if file_id:
+            try:
+                return bot.send_photo(chat_id, file_id, **kwargs)
+            except ApiTelegramException as e:
+                if e.error_code != 400:
+                    raise
+                # file_id протух или недоступен этому боту — загрузим заново
+                self.forget(image_path)
+
+        with open(image_path, "rb") as f:
+            msg = bot.send_photo(chat_id, f, **kwargs)
+        self.remember(image_path, msg.photo[-1].file_id)
+        return msg
+
+    def send_album(self, bot, chat_id, photos, parse_mode=None, upload=False):
+        """
+        Отправляет [(путь, подпись), ...] одним send_media_group (до 10 фото).
+        Уже известные картинки идут по file_id, новые загружаются и запоминаются.
+        """
+        if len(photos) == 1:
+            path, caption = photos[0]
+            return [self.send_photo(bot, chat_id, path, caption=caption, parse_mode=parse_mode)]
+
+        files = []
+        try:
+            media = []
+            for path, caption in photos:
+                file_id = None if upload else self.lookup(path)
+                if file_id is None:
+                    file_id = open(path, "rb")
+                    files.append(file_id)
+                media.append(InputMediaPhoto(file_id, caption=caption, parse_mode=parse_mode))
+            try:
+                messages = bot.send_media_group(chat_id, media)
+            except ApiTelegramException as e:
+                if e.error_code != 400 or upload:
+                    raise
+                # какой-то file_id отклонён — загружаем всё заново
+                for path, _ in photos:
+                    self.forget(path)
+                return self.send_album(bot, chat_id, photos, parse_mode, upload=True)
+        finally:
+            for f in files:
+                f.close()
+
+        for (path, _), msg in zip(photos, messages):
+            if msg.photo:
+                self.remember(path, msg.photo[-1].file_id)
+        return messages
@@ -0,0 +1,275 @@
+# ========================= metrics.py =========================
+# Метрики обработчиков бота: гистограммы задержек (логика / синхронные вызовы
+# Telegram API), время отправок из outbox.py по видам, число вызовов и ошибок,
+# экспорт в текстовом формате Prometheus и профилирование выбранного
+# обработчика через cProfile по запросу
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Верхние границы корзин гистограммы, секунды
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Методы TeleBot, время которых считается «временем Telegram API»
+API_METHODS = (
+    "send_message", "reply_to", "send_photo", "send_media_group",
+    "edit_message_text", "answer_callback_query",
+)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # последняя корзина — +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.calls = {}
+        self.errors = {}
+        # (обработчик, часть) -> Histogram; часть: total / logic / sync_api.
+        # sync_api — только вызовы API прямо из обработчика (answer_callback_query):
+        # ответы уходят через outbox, их время — в send_latency
+        self.latency = {}
+        self.api_latency = {}  # метод API -> Histogram
+        self.send_latency = {}  # вид отправки outbox (message / photo / album / ...) -> Histogram
+        # возраст обновления в момент обработки (сейчас - date сообщения) —
+        # сравнимо для polling и webhook; точность — секунда, как у date в Telegram
+        self.update_age = Histogram()
+        self._handlers = set()  # имена обёрнутых обработчиков — их можно профилировать
+        # обработчик -> [осталось незанятых вызовов, pstats.Stats или None, on_done, идёт сейчас]
+        self._profiles = {}
+        self._profiling = False  # активен ли cProfile: с Python 3.12 в процессе он может быть только один
+
+    def _observe(self, table, key, value):
+        hist = table.get(key)
+        if hist is None:
+            hist = table[key] = Histogram()
+        hist.observe(value)
+
+    # ---------- обёртки ----------
+
+    def wrap_handler(self, name, func):
+        self._handlers.add(name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            local = self._local
+            local.api_time = 0.0
+            profiler = cProfile.Profile() if self._reserve_profile(name) else None
+            start = time.perf_counter()
+            failed = False
+            try:
+                if profiler:
+                    return profiler.runcall(func, *args, **kwargs)
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                total = time.perf_counter() - start
+                api = local.api_time
+                with self._lock:
+                    self.calls[name] = self.calls.get(name, 0) + 1
+                    if failed:
+                        self.errors[name] = self.errors.get(name, 0) + 1
+                    self._observe(self.latency, (name, "total"), total)
+                    self._observe(self.latency, (name, "sync_api"), api)
+                    self._observe(self.latency, (name, "logic"), max(0.0, total - api))
+                if profiler:
+                    self._collect_profile(name, profiler)
+        return wrapper
+
+    def wrap_api(self, method, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            local = self._local
+            # reply_to внутри вызывает send_message — считаем только внешний вызов
+            depth = getattr(local, "api_depth", 0)
+            local.api_depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                local.api_depth = depth
+                if depth == 0:
+                    elapsed = time.perf_counter() - start
+                    local.api_time = getattr(local, "api_time", 0.0) + elapsed
+                    with self._lock:
+                        self._observe(self.api_latency, method, elapsed)
+        return wrapper
+
+    def observe_send(self, kind, seconds):
+        """Время одной отправки потоком outbox (с загрузкой картинки и повтором 400)."""
+        with self._lock:
+            self._observe(self.send_latency, kind, seconds)
+
+    def instrument(self, bot):
+        """Оборачивает все зарегистрированные обработчики и методы API бота."""
+        for handler in bot.message_handlers + bot.callback_query_handlers:
+            func = handler["function"]
+            handler["function"] = self.wrap_handler(func.__name__, func)
+        for method in API_METHODS:
+            setattr(bot, method, self.wrap_api(method, getattr(bot, method)))
+        bot.process_new_updates = self._wrap_updates(bot.process_new_updates)
+
+    def _wrap_updates(self, func):
+        @wraps(func)
+        def wrapper(updates):
+            now = time.time()
+            with self._lock:
+                for update in updates:
+                    message = update.message or (update.callback_query and update.callback_query.message)
+                    if message:
+                        self.update_age.observe(max(0.0, now - message.date))
+            return func(updates)
+        return wrapper
+
+    # ---------- профилирование ----------
+
+    def handlers(self):
+        with self._lock:
+            return sorted(self._handlers)
+
+    def profile(self, handler, calls, on_done):
+        """
+        Профилирует следующие `calls` вызовов обработчика; on_done(текст) — по окончании.
+        False — такого обработчика нет.
+        """
+        with self._lock:
+            if handler not in self._handlers:
+                return False
+            self._profiles[handler] = [calls, None, on_done, 0]
+            return True
+
+    def _reserve_profile(self, name):
+        """Занимает вызов под профилирование; параллельные вызовы идут без профилировщика."""
+        with self._lock:
+            entry = self._profiles.get(name)
+            if entry is None or entry[0] <= 0 or self._profiling:
+                return False
+            entry[0] -= 1
+            entry[3] += 1
+            self._profiling = True
+            return True
+
+    def _collect_profile(self, name, profiler):
+        with self._lock:
+            self._profiling = False
+            entry = self._profiles.get(name)
+            if entry is None:
+                return
+            if entry[1] is None:
+                entry[1] = pstats.Stats(profiler)
+            else:
+                entry[1].add(profiler)
+            entry[3] -= 1
+            if entry[0] > 0 or entry[3] > 0:
+                return
+            del self._profiles[name]
+        out = io.StringIO()
+        entry[1].stream = out
+        entry[1].sort_stats("cumulative").print_stats(15)
+        entry[2](out.getvalue())
+
+    # ---------- экспорт ----------
+
+    def render(self):
+        """Текстовый формат Prometheus."""
+        lines = []
+        with self._lock:
+            lines.append("# TYPE bot_handler_calls_total counter")
+            for name, value in sorted(self.calls.items()):
+                lines.append(f'bot_handler_calls_total{{handler="{name}"}} {value}')
+            lines.append("# TYPE bot_handler_errors_total counter")
+            for name, value in sorted(self.errors.items()):
+                lines.append(f'bot_handler_errors_total{{handler="{name}"}} {value}')
+            lines.append("# TYPE bot_handler_seconds histogram")
+            for (name, part), hist in sorted(self.latency.items()):
+                lines.extend(_histogram_lines("bot_handler_seconds", f'handler="{name}",part="{part}"', hist))
+            lines.append("# TYPE bot_update_age_seconds histogram")
+            lines.extend(_histogram_lines("bot_update_age_seconds", 'source="telegram"', self.update_age))
+            lines.append("# TYPE bot_api_seconds histogram")
+            for method, hist in sorted(self.api_latency.items()):
+                lines.extend(_histogram_lines("bot_api_seconds", f'method="{method}"', hist))
+            lines.append("# TYPE bot_send_seconds histogram")
+            for kind, hist in sorted(self.send_latency.items()):
+                lines.extend(_histogram_lines("bot_send_seconds", f'kind="{kind}"', hist))
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top=10):
+        """Короткая сводка для команды /metrics: самые медленные обработчики по среднему времени."""
+        with self._lock:
+            rows = []
+            for (name, part), hist in self.latency.items():
+                if part != "total" or not hist.count:
+                    continue
+                api = self.latency[(name, "sync_api")]
+                rows.append((hist.total / hist.count, name, hist.count, api.total / api.count,
+                             self.errors.get(name, 0)))
+            sends = sorted((kind, hist.total / hist.count, hist.count)
+                           for kind, hist in self.send_latency.items() if hist.count)
+            age = self.update_age.total / max(1, self.update_age.count)
+        rows.sort(reverse=True)
+        text = f"📨 Средний возраст обновления при обработке: {age:.2f} с\n"
+        text += "📊 Обработчики (среднее, мс: всего / из них API в обработчике), вызовы, ошибки:\n"
+        for avg, name, count, api_avg, errors in rows[:top]:
+            text += f"{name}: {avg * 1000:.1f} / {api_avg * 1000:.1f}, {count}, {errors}\n"
+        if sends:
+            text += "📤 Отправки outbox (среднее, мс), число:\n"
+            for kind, avg, count in sends:
+                text += f"{kind}: {avg * 1000:.1f}, {count}\n"
+        return text
+
+    def serve(self, port, host="127.0.0.1"):
+        """Поднимает локальный HTTP-эндпоинт /metrics в фоновом потоке."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+def _histogram_lines(metric, labels, hist):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, hist.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {hist.count}')
+    lines.append(f"{metric}_sum{{{labels}}} {hist.total}")
+    lines.append(f"{metric}_count{{{labels}}} {hist.count}")
+    return lines
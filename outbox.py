@@ -0,0 +1,327 @@
+# ========================= outbox.py =========================
+# Исходящие сообщения через планировщик: обработчик кладёт отправку
+# в очередь и сразу возвращается, фоновые потоки шлют её в Telegram
+# с учётом лимитов (на чат и общий), ответов 429 retry_after и повторов.
+#
+# Лимиты Telegram: ~30 сообщений/с на бота, ~1/с в личный чат,
+# ~20/мин в группу. Подряд идущие тексты в один чат склеиваются.
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from requests.exceptions import RequestException
+from telebot.apihelper import ApiHTTPException, ApiTelegramException
+
+# Максимальная длина текста сообщения Telegram
+MAX_TEXT = 4096
+
+
+def use_pooled_session(pool_size):
+    """Один общий requests.Session с пулом соединений для всех потоков telebot."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from telebot import apihelper
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    apihelper.session = session
+    return session
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst в запасе."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Через сколько секунд будет доступен токен (0 — уже есть)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Job:
+    __slots__ = ("method", "chat_id", "text", "kwargs", "fallback", "attempts", "on_done")
+
+    def __init__(self, method, chat_id, text=None, kwargs=None, fallback=None, on_done=None):
+        self.method = method  # "message", "photo", "album" или вызываемый объект
+        self.chat_id = chat_id
+        self.text = text  # текст / путь к картинке / список (путь, подпись)
+        self.kwargs = kwargs or {}
+        self.fallback = fallback  # текст, который отправить, если картинка не ушла
+        self.attempts = 0
+        self.on_done = on_done  # вызвать, когда файл картинки больше не нужен
+
+    def can_merge(self, other):
+        return (self.method == "message" and other.method == "message"
+                and self.kwargs == other.kwargs and "reply_markup" not in self.kwargs
+                and len(self.text) + 2 + len(other.text) <= MAX_TEXT)
+
+
+class Outbox:
+    """
+    Очередь исходящих по чатам. Внутри чата порядок сохраняется (чат в работе
+    только у одного потока), между чатами — кто раньше готов по лимитам.
+
+    Ошибки:
+      429       — задание возвращается в начало очереди чата на retry_after секунд;
+      5xx, сеть — повтор с экспоненциальной паузой, до max_retries раз;
+      прочие   — для картинок отправляется текстовый запасной вариант, иначе в лог.
+    """
+
+    def __init__(self, bot, photos=None, workers=4, global_rate=30.0, chat_rate=1.0, chat_burst=1,
+                 group_rate=20 / 60, max_retries=5, metrics=None):
+        self.bot = bot
+        self.photos = photos
+        self.metrics = metrics  # metrics.Metrics: время каждой отправки по видам (observe_send)
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._cond = threading.Condition()
+        self._queues = {}  # chat_id -> deque[_Job]
+        self._ready = []  # куча (когда можно слать, порядковый номер, chat_id)
+        self._seq = itertools.count()
+        self._busy = set()  # чаты, которые сейчас отправляет какой-то поток
+        self._buckets = {}  # chat_id -> TokenBucket
+        # общий лимит без запаса: ровный темп, а не пачка в начале каждой секунды
+        self._global = TokenBucket(global_rate, 1, time.monotonic())
+        self._pending = 0
+        self._closed = False
+        self.sent = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+        self._threads = [threading.Thread(target=self._worker, name=f"outbox-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    # ---------- API для обработчиков ----------
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._submit(_Job("message", chat_id, text, kwargs))
+
+    def reply_to(self, message, text, **kwargs):
+        self.send_message(message.chat.id, text, reply_to_message_id=message.message_id, **kwargs)
+
+    def send_photo(self, chat_id, image_path, caption=None, on_done=None, **kwargs):
+        """
+        Картинка через PhotoCache; если не отправилась — подпись уходит текстом.
+        on_done() — когда файл больше не нужен: фото ушло или отправка брошена.
+        """
+        self._submit(_Job("photo", chat_id, image_path, dict(kwargs, caption=caption), fallback=caption,
+                          on_done=on_done))
+
+    def send_album(self, chat_id, photos, parse_mode=None):
+        """[(путь, подпись), ...] одним альбомом; запасной вариант — подписи одним текстом."""
+        fallback = "\n".join(caption for _, caption in photos)
+        self._submit(_Job("album", chat_id, photos, {"parse_mode": parse_mode}, fallback=fallback))
+
+    def call(self, chat_id, func, *args, **kwargs):
+        """Произвольный вызов API (например, bot.edit_message_text) по очереди и лимитам чата."""
+        self._submit(_Job(func, chat_id, args, kwargs))
+
+    def _submit(self, job):
+        with self._cond:
+            queue = self._queues.get(job.chat_id)
+            if queue is None:
+                queue = self._queues[job.chat_id] = deque()
+            queue.append(job)
+            self._pending += 1
+            if len(queue) == 1 and job.chat_id not in self._busy:
+                self._schedule(job.chat_id, time.monotonic())
+            self._cond.notify()
+
+    # ---------- планировщик ----------
+
+    def _schedule(self, chat_id, when):
+        # вызывается под self._cond
+        heapq.heappush(self._ready, (when, next(self._seq), chat_id))
+        self._cond.notify()
+
+    def _bucket(self, chat_id, now):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # отрицательный id — группа или канал: у них лимит строже
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst, now)
+        return bucket
+
+    def _next_job(self):
+        """Ждёт чат, которому лимиты разрешают отправку, и забирает его задание (со склейкой)."""
+        with self._cond:
+            while True:
+                if self._closed and not self._pending:
+                    return None
+                now = time.monotonic()
+                if not self._ready or self._ready[0][0] > now:
+                    timeout = self._ready[0][0] - now if self._ready else None
+                    self._cond.wait(timeout)
+                    continue
+                _, _, chat_id = heapq.heappop(self._ready)
+                bucket = self._bucket(chat_id, now)
+                delay = max(bucket.wait_time(now), self._global.wait_time(now))
+                if delay > 0:
+                    self._schedule(chat_id, now + delay)
+                    continue
+                bucket.take()
+                self._global.take()
+
+                queue = self._queues[chat_id]
+                job = queue.popleft()
+                while queue and job.can_merge(queue[0]):
+                    job.text += "\n\n" + queue.popleft().text
+                    self._pending -= 1
+                    self.coalesced += 1
+                self._busy.add(chat_id)
+                return job
+
+    def _finish(self, job, retry_at=None):
+        with self._cond:
+            chat_id = job.chat_id
+            self._busy.discard(chat_id)
+            queue = self._queues[chat_id]
+            if retry_at is not None:
+                queue.appendleft(job)
+            else:
+                self._pending -= 1
+            if queue:
+                self._schedule(chat_id, retry_at or time.monotonic())
+            else:
+                del self._queues[chat_id]
+            if len(self._buckets) > 10_000:
+                now = time.monotonic()
+                for idle in [c for c, b in self._buckets.items() if c not in self._queues and b.full(now)]:
+                    del self._buckets[idle]
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            retry_at = None
+            kind = job.method if isinstance(job.method, str) else getattr(job.method, "__name__", "call")
+            start = time.perf_counter()
+            try:
+                self._send(job)
+                with self._cond:
+                    self.sent += 1
+            except ApiTelegramException as e:
+                retry_at = self._on_api_error(job, e)
+            except (RequestException, ApiHTTPException) as e:
+                # сеть, таймауты, 5xx без JSON
+                retry_at = self._backoff(job, e)
+            except Exception as e:
+                retry_at = self._give_up(job, e)
+            if self.metrics is not None:
+                # обработчики только ставят отправку в очередь — время Telegram видно здесь
+                self.metrics.observe_send(kind, time.perf_counter() - start)
+            if retry_at is None:
+                self._done(job)
+            self._finish(job, retry_at)
+
+    def _send(self, job):
+        bot, method = self.bot, job.method
+        if method == "message":
+            bot.send_message(job.chat_id, job.text, **job.kwargs)
+        elif method == "photo":
+            if self.photos is not None:
+                self.photos.send_photo(bot, job.chat_id, job.text, **job.kwargs)
+            else:
+                with open(job.text, "rb") as f:
+                    bot.send_photo(job.chat_id, f, **job.kwargs)
+        elif method == "album":
+            self.photos.send_album(bot, job.chat_id, job.text, **job.kwargs)
+        else:
+            method(*job.text, **job.kwargs)
+
+    def _on_api_error(self, job, e):
+        if e.error_code == 429:
+            retry_after = e.result_json.get("parameters", {}).get("retry_after", 1)
+            with self._cond:
+                self.throttled += 1
+            return time.monotonic() + retry_after
+        if e.error_code >= 500:
+            return self._backoff(job, e)
+        return self._give_up(job, e)
+
+    def _backoff(self, job, error):
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            return self._give_up(job, error)
+        with self._cond:
+            self.retried += 1
+        return time.monotonic() + min(30, 2 ** job.attempts)
+
+    def _done(self, job):
+        on_done, job.on_done = job.on_done, None
+        if on_done is not None:
+            try:
+                on_done()
+            except Exception as e:
+                print(f"Ошибка on_done отправки в чат {job.chat_id}: {e}")
+
+    def _give_up(self, job, error):
+        # картинка больше не понадобится — ни при текстовой замене, ни без неё
+        self._done(job)
+        if job.fallback:
+            # картинка не ушла — на её место в очереди чата встаёт текст
+            job.method, job.text, job.fallback, job.attempts = "message", job.fallback, None, 0
+            job.kwargs = {k: v for k, v in job.kwargs.items() if k == "parse_mode"}
+            return time.monotonic()
+        with self._cond:
+            self.failed += 1
+        print(f"Не удалось отправить в чат {job.chat_id}: {error}")
+        return None
+
+    # ---------- служебное ----------
+
+    def stats(self):
+        with self._cond:
+            return {"pending": self._pending, "chats": len(self._queues), "sent": self.sent,
+                    "coalesced": self.coalesced, "throttled": self.throttled,
+                    "retried": self.retried, "failed": self.failed}
+
+    def join(self, timeout=None):
+        """Ждёт, пока очередь опустеет. False — не успели за timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10):
+        """Досылает очередь (не дольше timeout) и останавливает потоки."""
+        self.join(timeout)
+        with self._cond:
+            self._closed = True
+            self._pending = 0
+            self._cond.notify_all()
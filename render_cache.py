@@ -0,0 +1,80 @@
+# ========================= render_cache.py =========================
+# Кэш готовых текстов (профиль, список покемонов, карточки): текст
+# пересобирается, только если объект изменился с прошлого раза.
+# Объекты хранят счётчик версии (_version), его меняет touch().
+
+import sys
+import threading
+from collections import OrderedDict
+from itertools import count
+
+# Глобальный счётчик версий: у объекта, заново загруженного из базы,
+# версия всегда новая — старый текст из кэша к нему не подойдёт
+_versions = count(1)
+
+
+def next_version():
+    return next(_versions)
+
+
+class RenderCache:
+    """
+    LRU {(вид, ключ объекта): (версия, текст)} с ограничением по числу
+    записей и по памяти. На объект и вид хранится только последняя версия.
+    """
+
+    def __init__(self, max_entries=10_000, max_bytes=8 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def resize(self, max_entries, max_bytes):
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, view, key, version, render):
+        """Текст вида `view` для объекта `key` версии `version`; render() — при промахе."""
+        slot = (view, key)
+        with self._lock:
+            entry = self._entries.get(slot)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # рендер вне блокировки: кэш общий для всех потоков-обработчиков
+        text = render()
+        size = sys.getsizeof(text)
+        with self._lock:
+            old = self._entries.pop(slot, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[slot] = (version, text, size)
+            self.bytes += size
+            self._evict()
+        return text
+
+    def _evict(self):
+        # вызывается под self._lock
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+
+render_cache = RenderCache()
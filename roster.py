@@ -0,0 +1,113 @@
+# ========================= roster.py =========================
+# Колоночное хранение покемонов: числовые статы всех покемонов лежат
+# в типизированных массивах (array), а PokemonView — тонкое окно в строку
+
+from array import array
+
+from logic import BasePokemon
+
+# Поле -> код типа array. xp растёт в 1.5 раза за уровень, поэтому int64.
+COLUMNS = (
+    ("type_id", "b"), ("max_hp", "i"), ("hp", "i"), ("attack", "i"), ("defense", "i"), ("speed", "i"),
+    ("level", "i"), ("xp", "q"), ("xp_to_next", "q"),
+    ("iv_hp", "b"), ("iv_attack", "b"), ("iv_defense", "b"), ("iv_speed", "b"),
+    ("ev_hp", "i"), ("ev_attack", "i"), ("ev_defense", "i"), ("ev_speed", "i"),
+    ("can_evolve", "b"), ("evolution_stage", "b"),
+    ("battles_won", "i"), ("battles_lost", "i"), ("_version", "q"),
+)
+
+# Строковые поля хранятся обычными списками
+OBJECT_COLUMNS = ("id", "name", "type", "image_path")
+
+
+class PokemonStore:
+    """Колоночный ростер: один массив на поле, строка = номер в массивах; id -> строка — в self._rows."""
+
+    def __init__(self):
+        self.columns = {field: array(code) for field, code in COLUMNS}
+        for field in OBJECT_COLUMNS:
+            self.columns[field] = []
+        self._free = []
+        self._rows = {}  # id покемона -> строка; обновляют add(), release() и присваивание view.id
+
+    def __len__(self):
+        return len(self.columns["hp"]) - len(self._free)
+
+    def add(self, pokemon):
+        """Копирует покемона в ростер и возвращает PokemonView на него."""
+        if self._free:
+            idx = self._free.pop()
+            for field, column in self.columns.items():
+                column[idx] = getattr(pokemon, field)
+        else:
+            idx = len(self.columns["hp"])
+            for field, column in self.columns.items():
+                column.append(getattr(pokemon, field))
+        self._rows[pokemon.id] = idx
+        return PokemonView(self, idx)
+
+    def view(self, idx):
+        return PokemonView(self, idx)
+
+    def find(self, pokemon_id):
+        """PokemonView по id покемона или None — без перебора колонки id."""
+        idx = self._rows.get(pokemon_id)
+        return None if idx is None else PokemonView(self, idx)
+
+    def _reindex(self, idx, new_id):
+        ids = self.columns["id"]
+        if self._rows.get(ids[idx]) == idx:
+            del self._rows[ids[idx]]
+        ids[idx] = new_id
+        if new_id is not None:
+            self._rows[new_id] = idx
+
+    def release(self, view):
+        """Освобождает строку; она будет переиспользована следующим add()."""
+        self._reindex(view._idx, None)
+        self.columns["name"][view._idx] = None
+        self._free.append(view._idx)
+
+
+def _column(field):
+    def get(self):
+        return self._store.columns[field][self._idx]
+
+    def set(self, value):
+        self._store.columns[field][self._idx] = value
+
+    return property(get, set)
+
+
+class PokemonView(BasePokemon):
+    """
+    Покемон, данные которого лежат в PokemonStore. Все методы Pokemon работают
+    как обычно; от Pokemon не наследуется, чтобы не тащить его 26 слотов.
+    """
+
+    __slots__ = ("_store", "_idx")
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+
+    @property
+    def id(self):
+        return self._store.columns["id"][self._idx]
+
+    @id.setter
+    def id(self, value):
+        self._store._reindex(self._idx, value)
+
+    @property
+    def can_evolve(self):
+        return bool(self._store.columns["can_evolve"][self._idx])
+
+    @can_evolve.setter
+    def can_evolve(self, value):
+        self._store.columns["can_evolve"][self._idx] = int(value)
+
+
+for _field in [f for f, _ in COLUMNS if f != "can_evolve"] + [f for f in OBJECT_COLUMNS if f != "id"]:
+    setattr(PokemonView, _field, _column(_field))
+del _field
@@ -0,0 +1,245 @@
+# ========================= sessions.py =========================
+# Короткоживущие сессии (выбор покемонов в /fight и т.п.): у каждой
+# записи срок жизни (TTL), размер хранилища ограничен — при переполнении
+# вытесняются давно не использованные. Значения — только JSON
+# (имена тренеров, id покемонов), без ссылок на живые объекты.
+#
+# Бэкенды: "memory" — в процессе, "sqlite" — файл, общий для нескольких
+# процессов-обработчиков.
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class Sessions:
+    """Базовый интерфейс хранилища сессий."""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def get(self, key):
+        """Значение или None, если сессии нет или она истекла."""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def pop(self, key):
+        """Атомарно забирает и удаляет сессию (None, если её нет)."""
+        raise NotImplementedError
+
+    def update(self, key, func):
+        """
+        Атомарно: new = func(старое значение или None). new is None — сессия
+        удаляется. Возвращает new. Нужно, когда два игрока жмут кнопки одновременно.
+        """
+        raise NotImplementedError
+
+    def sweep(self):
+        """Удаляет истёкшие сессии, возвращает их число."""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def start_sweeper(self, interval):
+        """Фоновый поток, вычищающий истёкшие сессии раз в `interval` секунд."""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"Ошибка очистки сессий: {e}")
+
+        self._stop = threading.Event()
+        threading.Thread(target=loop, name="sessions-sweep", daemon=True).start()
+
+
+class MemorySessions(Sessions):
+    """OrderedDict в порядке использования: {ключ: (истекает, значение)}."""
+
+    def __init__(self, ttl=600, max_size=10_000):
+        super().__init__(ttl, max_size)
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def _get(self, key, now):
+        # вызывается под self._lock
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def _set(self, key, value, now):
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value, time.monotonic())
+
+    def pop(self, key):
+        with self._lock:
+            value = self._get(key, time.monotonic())
+            self._data.pop(key, None)
+            return value
+
+    def update(self, key, func):
+        with self._lock:
+            now = time.monotonic()
+            value = func(self._get(key, now))
+            if value is None:
+                self._data.pop(key, None)
+            else:
+                self._set(key, value, now)
+            return value
+
+    def sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires, _) in self._data.items() if expires <= now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteSessions(Sessions):
+    """
+    Таблица sessions(key, value, expires, used) в WAL-режиме. update() — в
+    транзакции BEGIN IMMEDIATE, поэтому атомарен и между процессами.
+    Время — time.time(): монотонные часы у разных процессов не сравнимы.
+
+    Число строк держим в памяти (self._count) и не считаем COUNT(*) на каждой
+    записи, а вытесняем, только когда по счётчику таблица переполнена.
+    Записи других процессов счётчик сдвигают — его сверяет с таблицей sweep()
+    (фоновый поток), так что между очистками несколько процессов могут
+    ненадолго превысить max_size.
+    """
+
+    def __init__(self, path, ttl=600, max_size=10_000):
+        super().__init__(ttl, max_size)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires REAL NOT NULL,"
+            " used REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_used ON sessions (used)")
+        self._count = self._recount()
+
+    def _recount(self):
+        return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _delete(self, key):
+        self._count -= self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,)).rowcount
+
+    def _transaction(self, func):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(time.time())
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def _get(self, key, now):
+        row = self._conn.execute("SELECT value, expires FROM sessions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            self._delete(key)
+            return None
+        self._conn.execute("UPDATE sessions SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def _set(self, key, value, now):
+        row = (json.dumps(value, ensure_ascii=False), now + self.ttl, now, key)
+        if self._conn.execute("UPDATE sessions SET value = ?, expires = ?, used = ? WHERE key = ?", row).rowcount:
+            return
+        self._conn.execute("INSERT OR REPLACE INTO sessions (value, expires, used, key) VALUES (?, ?, ?, ?)", row)
+        self._count += 1
+        extra = self._count - self.max_size
+        if extra > 0:
+            self._count -= self._conn.execute(
+                "DELETE FROM sessions WHERE key IN (SELECT key FROM sessions ORDER BY used LIMIT ?)", (extra,)
+            ).rowcount
+
+    def get(self, key):
+        return self._transaction(lambda now: self._get(key, now))
+
+    def set(self, key, value):
+        self._transaction(lambda now: self._set(key, value, now))
+
+    def pop(self, key):
+        def pop(now):
+            value = self._get(key, now)
+            self._delete(key)
+            return value
+        return self._transaction(pop)
+
+    def update(self, key, func):
+        def update(now):
+            value = func(self._get(key, now))
+            if value is None:
+                self._delete(key)
+            else:
+                self._set(key, value, now)
+            return value
+        return self._transaction(update)
+
+    def sweep(self):
+        def sweep(now):
+            removed = self._conn.execute("DELETE FROM sessions WHERE expires <= ?", (now,)).rowcount
+            # заодно сверяем счётчик с таблицей: её меняют и другие процессы
+            self._count = self._recount()
+            return removed
+        return self._transaction(sweep)
+
+    def __len__(self):
+        with self._lock:
+            return self._recount()
+
+    def close(self):
+        if hasattr(self, "_stop"):
+            self._stop.set()
+        with self._lock:
+            self._conn.close()
+
+
+def make_sessions(kind, path=None, ttl=600, max_size=10_000):
+    """Создаёт хранилище сессий по имени из config.py."""
+    if kind == "memory":
+        return MemorySessions(ttl, max_size)
+    if kind == "sqlite":
+        return SQLiteSessions(path or "sessions.db", ttl, max_size)
+    raise ValueError(f"Неизвестный бэкенд сессий: {kind}")
@@ -0,0 +1,377 @@
+# ========================= shard.py =========================
+# Шардированный запуск: диспетчер получает обновления Telegram и по хэшу
+# имени тренера отправляет каждое одному из N процессов-обработчиков.
+# Каждый процесс владеет своей долей тренеров (реестр, рейтинг, журнал).
+#
+# Межпроцессный протокол (очереди multiprocessing, по одной на процесс):
+#   ("update", json)                    — обновление Telegram для обработки
+#   ("call", id, от кого, op, args)     — запрос к процессу; ответ ("result", id, ok, значение)
+#   ("return", id займа, state | None)  — возврат одолженного тренера
+#   ("stop",)
+#
+# Операции над чужими тренерами (/battle @user, /fight) — заём:
+#   1. Заёмщик шлёт владельцу "lend"; владелец берёт блокировку тренера
+#      (с таймаутом) и отвечает снимком to_dict(), не отпуская блокировку.
+#   2. Заёмщик работает с копией, затем шлёт "return" с новым состоянием.
+#   3. Владелец применяет его к живому объекту (Trainer.apply_state)
+#      и отпускает блокировку. При ошибке заёмщик возвращает None — без изменений.
+# Блокировки (свои и займы) берутся в алфавитном порядке имён во всех процессах —
+# как trainer_lock внутри одного процесса, поэтому взаимоблокировок нет.
+#
+# /top и /toppokemons: каждый процесс отдаёт свой топ-k, запросивший сливает их.
+# /tournament: составы и награды — один запрос call_each на процесс за раунд.
+# /ranked: очередь рейтинговых боёв живёт в процессе 0, остальные ставят заявки запросами к нему.
+#
+# Запуск: python shard.py --shards 4
+
+import itertools
+import json
+import signal
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+
+class ShardBusy(Exception):
+    """Процесс-владелец не ответил вовремя или тренер занят — операцию можно повторить."""
+
+
+def shard_of(name, shards):
+    """Номер процесса-владельца тренера. crc32, а не hash(): он одинаков во всех процессах."""
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+def update_owner(update):
+    """Имя тренера, от которого пришло обновление (dict из getUpdates), или None."""
+    from types import SimpleNamespace
+    from logic import trainer_name
+
+    for kind in ("message", "edited_message", "callback_query", "inline_query", "chosen_inline_result"):
+        body = update.get(kind)
+        if body and body.get("from"):
+            user = body["from"]
+            return trainer_name(SimpleNamespace(username=user.get("username"),
+                                                first_name=user.get("first_name"), id=user["id"]))
+    return None
+
+
+class Shard:
+    """Сторона процесса-обработчика: разбор входящей очереди, займы и запросы к соседям."""
+
+    def __init__(self, index, inboxes, call_timeout=5.0, lock_timeout=3.0, loan_timeout=30.0):
+        self.index = index
+        self.inboxes = inboxes
+        self.shards = len(inboxes)
+        self.call_timeout = call_timeout
+        self.lock_timeout = lock_timeout
+        self.loan_timeout = loan_timeout
+        self.ops = {}  # имя операции -> функция(*args), которую могут вызвать соседи
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._calls = {}  # id запроса -> [Event, ok, значение]
+        self._loans = {}  # id займа -> [Event, state]
+
+    def owns(self, name):
+        return shard_of(name, self.shards) == self.index
+
+    def _new_id(self):
+        return f"{self.index}:{next(self._seq)}"
+
+    # ---------- запросы к соседям ----------
+
+    def _send_call(self, shard, op, args):
+        call_id = self._new_id()
+        with self._lock:
+            self._calls[call_id] = [threading.Event(), False, None]
+        self.inboxes[shard].put(("call", call_id, self.index, op, args))
+        return call_id
+
+    def _wait(self, call_id, deadline):
+        with self._lock:
+            entry = self._calls[call_id]
+        try:
+            if not entry[0].wait(max(0.0, deadline - time.monotonic())):
+                raise ShardBusy(f"процесс не ответил на {call_id}")
+            if not entry[1]:
+                raise ShardBusy(entry[2])
+            return entry[2]
+        finally:
+            with self._lock:
+                self._calls.pop(call_id, None)
+
+    def call(self, shard, op, *args):
+        return self._wait(self._send_call(shard, op, args), time.monotonic() + self.call_timeout)
+
+    def gather_top(self, op, k, key):
+        """Топ-k по всем процессам: запросы уходят параллельно, свой топ считается на месте."""
+        deadline = time.monotonic() + self.call_timeout
+        calls = [self._send_call(shard, op, (k,)) for shard in range(self.shards) if shard != self.index]
+        rows = list(self.ops[op](k))
+        for call_id in calls:
+            rows.extend(self._wait(call_id, deadline))
+        rows.sort(key=key)
+        return rows[:k]
+
+    def call_each(self, op, groups):
+        """
+        {процесс: аргумент} -> {процесс: результат op(аргумент)}: запросы уходят параллельно,
+        своя часть считается на месте. Кто не ответил — в результат не попадает.
+        """
+        deadline = time.monotonic() + self.call_timeout
+        calls = {shard: self._send_call(shard, op, (arg,)) for shard, arg in groups.items() if shard != self.index}
+        results = {}
+        if self.index in groups:
+            results[self.index] = self.ops[op](groups[self.index])
+        for shard, call_id in calls.items():
+            try:
+                results[shard] = self._wait(call_id, deadline)
+            except ShardBusy as e:
+                print(f"Процесс {shard} не выполнил {op}: {e}")
+        return results
+
+    @contextmanager
+    def borrow(self, *names):
+        """Как main.borrowed: свои тренеры — под блокировкой, чужие — займом у владельца."""
+        from logic import Trainer, trainer_lock
+
+        trainers = {}
+        loans = []  # (владелец, id займа, имя)
+        ok = False
+        with ExitStack() as stack:
+            try:
+                for name in sorted(set(names)):
+                    owner = shard_of(name, self.shards)
+                    if owner == self.index:
+                        stack.enter_context(trainer_lock(name, timeout=self.lock_timeout))
+                        trainers[name] = Trainer.trainers.get(name)
+                    else:
+                        loan_id = self._new_id()
+                        # возврат отправим и при таймауте — владелец не будет ждать зря
+                        loans.append((owner, loan_id, name))
+                        state = self.call(owner, "lend", name, loan_id)
+                        trainers[name] = Trainer.from_dict(state) if state is not None else None
+                yield [trainers[name] for name in names]
+                ok = True
+            except TimeoutError:
+                raise ShardBusy("тренер занят")
+            finally:
+                for owner, loan_id, name in loans:
+                    trainer = trainers.get(name)
+                    state = trainer.to_dict() if ok and trainer is not None else None
+                    self.inboxes[owner].put(("return", loan_id, state))
+                    # копия попала в рейтинг этого процесса через touch() — рейтинг её владельца
+                    Trainer.leaderboard.remove(name)
+
+    # ---------- обслуживание соседей ----------
+
+    def _lend(self, call_id, reply, name, loan_id):
+        """Выполняется в отдельном потоке: держит блокировку тренера до возврата займа."""
+        from logic import Trainer, trainer_lock
+
+        with self._lock:
+            entry = self._loans[loan_id]
+        try:
+            with trainer_lock(name, timeout=self.lock_timeout):
+                trainer = Trainer.trainers.get(name)
+                reply.put(("result", call_id, True, trainer.to_dict() if trainer is not None else None))
+                # заёмщик мог уже сдаться и вернуть заём — тогда ждать нечего
+                if entry[0].wait(self.loan_timeout) and entry[1] is not None and trainer is not None:
+                    trainer.apply_state(entry[1])
+        except TimeoutError:
+            reply.put(("result", call_id, False, f"{name} занят"))
+        finally:
+            with self._lock:
+                self._loans.pop(loan_id, None)
+
+    def _serve_call(self, call_id, sender, op, args):
+        reply = self.inboxes[sender]
+        if op == "lend":
+            self._lend(call_id, reply, *args)
+            return
+        try:
+            value = self.ops[op](*args)
+        except Exception as e:
+            reply.put(("result", call_id, False, f"{op}: {e}"))
+            return
+        reply.put(("result", call_id, True, value))
+
+    def serve(self, bot, threads, processed=None):
+        """
+        Главный цикл процесса: обновления — в пул обработчиков (bot.threaded = False),
+        запросы соседей — каждый в своём потоке (заём ждёт возврата).
+        processed — multiprocessing.Value, счётчик обработанных обновлений (для bench.py).
+        """
+        from telebot.types import Update
+
+        def process(body):
+            try:
+                bot.process_new_updates([Update.de_json(body)])
+            except Exception as e:
+                print(f"Ошибка обработки обновления: {e}")
+            if processed is not None:
+                with processed.get_lock():
+                    processed.value += 1
+
+        inbox = self.inboxes[self.index]
+        with ThreadPoolExecutor(threads) as pool:
+            while True:
+                message = inbox.get()
+                kind = message[0]
+                if kind == "update":
+                    pool.submit(process, message[1])
+                elif kind == "call":
+                    if message[3] == "lend":
+                        # заём регистрируется сразу: его "return" придёт в эту же очередь позже
+                        with self._lock:
+                            self._loans[message[4][1]] = [threading.Event(), None]
+                    threading.Thread(target=self._serve_call, args=message[1:], daemon=True).start()
+                elif kind == "result":
+                    _, call_id, ok, value = message
+                    with self._lock:
+                        entry = self._calls.get(call_id)
+                    if entry is not None:
+                        entry[1], entry[2] = ok, value
+                        entry[0].set()
+                elif kind == "return":
+                    _, loan_id, state = message
+                    with self._lock:
+                        entry = self._loans.get(loan_id)
+                    if entry is not None:
+                        entry[1] = state
+                        entry[0].set()
+                elif kind == "stop":
+                    break
+
+
+def run_worker(index, inboxes, overrides, processed=None):
+    """Точка входа процесса-обработчика: config с поправками для шарда, затем main."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # останавливает диспетчер сообщением "stop"
+    import config
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    if overrides.get("null_api"):
+        from fake_api import install_null_api
+        install_null_api()
+
+    import main
+    from tournament import local_apply, local_leads
+    shard = Shard(index, inboxes)
+    shard.ops["top_trainers"] = main.local_top_trainers
+    shard.ops["top_pokemons"] = main.Trainer.leaderboard.top_pokemons
+    # очередь /ranked одна — в процессе main.RANKED_SHARD, остальные ставят заявки через него
+    shard.ops["ranked_join"] = lambda *args: main.ranked_join(*args, background=True)
+    shard.ops["ranked_cancel"] = main.ranked_cancel
+    shard.ops["ranked_stats"] = main.ranked_stats
+    # турнир: составы и награды своих тренеров — пачкой на раунд (tournament.py)
+    shard.ops["tournament_leads"] = local_leads
+    shard.ops["tournament_apply"] = local_apply
+    main.cluster = shard
+    shutdown = main.start_storage(owns=shard.owns)
+    main.bot.threaded = False
+    try:
+        shard.serve(main.bot, config.num_threads, processed)
+    finally:
+        main.outbox.close()
+        shutdown()
+
+
+def shard_overrides(index, shards):
+    """Поправки config для процесса index: общие лимиты делятся, пути — свои."""
+    import config
+
+    overrides = {
+        # лимит Telegram общий на бота: каждому процессу — его доля
+        "outbox_global_rate": config.outbox_global_rate / shards,
+        "outbox_group_rate": config.outbox_group_rate / shards,
+        # у журнала один писатель: каталог на процесс (при смене числа шардов нужен sqlite)
+        "journal_dir": f"{config.journal_dir}/shard{index}",
+        # вытесненные карточки удаляет их процесс — чужие файлы трогать нельзя
+        "cards_dir": f"{config.cards_dir}/shard{index}",
+    }
+    if config.session_backend == "memory":
+        # вызов /fight принимает игрок из другого процесса — сессии должны быть общими
+        overrides["session_backend"] = "sqlite"
+    if config.metrics_port:
+        overrides["metrics_port"] = config.metrics_port + index
+    return overrides
+
+
+class Dispatcher:
+    """Процессы-обработчики и маршрутизация обновлений к ним."""
+
+    def __init__(self, shards, overrides=None, processed=False):
+        import multiprocessing
+
+        self.shards = shards
+        self.inboxes = [multiprocessing.Queue() for _ in range(shards)]
+        self.processed = [multiprocessing.Value("q", 0) for _ in range(shards)] if processed else None
+        self.sent = [0] * shards
+        self.processes = []
+        for i in range(shards):
+            shard_config = dict(shard_overrides(i, shards), **(overrides or {}))
+            process = multiprocessing.Process(
+                target=run_worker, name=f"shard-{i}",
+                args=(i, self.inboxes, shard_config, self.processed[i] if processed else None))
+            process.start()
+            self.processes.append(process)
+
+    def dispatch(self, update):
+        """update — dict из getUpdates (или поддельного источника)."""
+        name = update_owner(update)
+        shard = shard_of(name, self.shards) if name else 0
+        self.sent[shard] += 1
+        self.inboxes[shard].put(("update", json.dumps(update, ensure_ascii=False)))
+
+    def wait_processed(self, timeout=None):
+        """Ждёт, пока каждый процесс обработает всё отправленное ему (нужен processed=True)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(p.value < n for p, n in zip(self.processed, self.sent)):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=30):
+        for inbox in self.inboxes:
+            inbox.put(("stop",))
+        for process in self.processes:
+            process.join(timeout)
+
+
+def poll_forever(dispatcher, token, timeout=20):
+    """Long polling в процессе-диспетчере: обновления не разбираются, только маршрутизируются."""
+    from telebot import apihelper
+
+    offset = None
+    while True:
+        try:
+            updates = apihelper.get_updates(token, offset=offset, timeout=timeout, long_polling_timeout=timeout)
+        except Exception as e:
+            print(f"Ошибка получения обновлений: {e}")
+            time.sleep(1)
+            continue
+        for update in updates:
+            offset = update["update_id"] + 1
+            dispatcher.dispatch(update)
+
+
+if __name__ == "__main__":
+    import argparse
+    import config
+
+    parser = argparse.ArgumentParser(description="Бот в нескольких процессах (шардах по тренерам)")
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    if config.storage_backend == "memory":
+        print("Внимание: storage_backend = 'memory' — у каждого процесса свои тренеры, без сохранения")
+    dispatcher = Dispatcher(args.shards)
+    print(f"Bot started ({args.shards} процессов, long polling)...")
+    try:
+        poll_forever(dispatcher, config.token)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.stop()
@@ -0,0 +1,141 @@
+# ========================= simulate.py =========================
+# Пакетный симулятор боёв на NumPy: те же правила, что в Battle.start,
+# но сразу для миллионов пар — для балансировки и турнирных сеток.
+# Запуск сверки с Battle.start: python simulate.py
+
+import numpy as np
+
+import logic
+from logic import TYPE_EMOJI, Pokemon, Trainer, Battle
+
+MAX_TURNS = 20
+CRIT_CHANCE = 0.1
+
+TYPES = list(TYPE_EMOJI)
+
+
+def type_ids(types):
+    """Строки типов -> индексы в TYPES (массив int8)."""
+    return np.array([logic.type_id(t) for t in types], dtype=np.int8)
+
+
+def type_matrix():
+    """Текущая таблица типов logic.TYPE_MATRIX как массив [атакующий, защищающийся]."""
+    return np.array(logic.TYPE_MATRIX, dtype=np.float64)
+
+
+def simulate(hp1, atk1, def1, spd1, type1, hp2, atk2, def2, spd2, type2, seed=None):
+    """
+    Прогоняет len(hp1) независимых боёв.
+
+    Все аргументы — массивы одинаковой длины (type1/type2 — индексы TYPES).
+    Возвращает (winners, turns): winners[i] == 0 если победил первый, 1 — второй;
+    turns[i] — номер хода, на котором бой закончился (MAX_TURNS при ничьей по времени).
+    """
+    rng = np.random.default_rng(seed)
+    hp1 = np.array(hp1, dtype=np.int64)
+    hp2 = np.array(hp2, dtype=np.int64)
+    atk1, def1, spd1 = (np.asarray(a, dtype=np.int64) for a in (atk1, def1, spd1))
+    atk2, def2, spd2 = (np.asarray(a, dtype=np.int64) for a in (atk2, def2, spd2))
+    type1 = np.asarray(type1, dtype=np.intp)
+    type2 = np.asarray(type2, dtype=np.intp)
+    n = len(hp1)
+    matrix = type_matrix()
+
+    # Очередность по скорости не меняется в течение боя — считаем один раз
+    p1_first = spd1 >= spd2
+    first_hp = np.where(p1_first, hp1, hp2)
+    second_hp = np.where(p1_first, hp2, hp1)
+
+    # Базовый урон и множитель типа для обоих направлений
+    base_fs = np.maximum(1, np.where(p1_first, atk1 - def2 // 2, atk2 - def1 // 2))
+    base_sf = np.maximum(1, np.where(p1_first, atk2 - def1 // 2, atk1 - def2 // 2))
+    mult_fs = np.where(p1_first, matrix[type1, type2], matrix[type2, type1])
+    mult_sf = np.where(p1_first, matrix[type2, type1], matrix[type1, type2])
+
+    turns = np.zeros(n, dtype=np.int8)
+    active = (first_hp > 0) & (second_hp > 0)
+
+    for turn in range(1, MAX_TURNS + 1):
+        if not active.any():
+            break
+        turns[active] = turn
+
+        crit = rng.random(n) < CRIT_CHANCE
+        damage = np.maximum(1, (base_fs * np.where(crit, 2, 1) * mult_fs).astype(np.int64))
+        second_hp -= np.where(active, damage, 0)
+        active &= second_hp > 0
+
+        crit = rng.random(n) < CRIT_CHANCE
+        damage = np.maximum(1, (base_sf * np.where(crit, 2, 1) * mult_sf).astype(np.int64))
+        first_hp -= np.where(active, damage, 0)
+        active &= first_hp > 0
+
+    # Как в Battle.start: второй побеждает только если у первого HP <= 0
+    p1_hp = np.where(p1_first, first_hp, second_hp)
+    winners = (p1_hp <= 0).astype(np.int8)
+    return winners, turns
+
+
+def simulate_pokemons(pairs, seed=None):
+    """Удобная обёртка: pairs — список (Pokemon, Pokemon)."""
+    cols = {}
+    for side, idx in (("1", 0), ("2", 1)):
+        mons = [pair[idx] for pair in pairs]
+        cols["hp" + side] = [p.hp for p in mons]
+        cols["atk" + side] = [p.attack for p in mons]
+        cols["def" + side] = [p.defense for p in mons]
+        cols["spd" + side] = [p.speed for p in mons]
+        cols["type" + side] = np.array([p.type_id for p in mons], dtype=np.int8)
+    return simulate(seed=seed, **cols)
+
+
+def cross_check(matchups, samples=2000, seed=0):
+    """
+    Сверка с Battle.start: для каждой пары сравнивает долю побед первого
+    и средний номер хода. Возвращает список (a, b, p_engine, p_battle, z).
+    """
+    import random
+    random.seed(seed)
+    results = []
+    for a, b in matchups:
+        winners, turns = simulate_pokemons([(a, b)] * samples, seed=seed)
+        p_engine = 1 - winners.mean()
+
+        wins = 0
+        battle_turns = 0
+        for _ in range(samples):
+            t1 = Trainer.from_dict({"name": "__sim_1", "pokemons": [a.to_dict()], "items": {}, "coins": 0,
+                                    "battles_won": 0, "battles_lost": 0, "last_daily": None})
+            t2 = Trainer.from_dict({"name": "__sim_2", "pokemons": [b.to_dict()], "items": {}, "coins": 0,
+                                    "battles_won": 0, "battles_lost": 0, "last_daily": None})
+            battle = Battle(t1, t2, mode="quiet")
+            battle.start()
+            wins += t1.battles_won
+            battle_turns += battle.turns
+        Trainer.leaderboard.remove("__sim_1")
+        Trainer.leaderboard.remove("__sim_2")
+        p_battle = wins / samples
+
+        # z-статистика разности двух долей
+        p = (p_engine + p_battle) / 2
+        se = max((2 * p * (1 - p) / samples) ** 0.5, 1e-9)
+        z = (p_engine - p_battle) / se
+        results.append((a, b, p_engine, p_battle, turns.mean(), battle_turns / samples, z))
+    return results
+
+
+if __name__ == "__main__":
+    import random
+    random.seed(1)
+    mons = [Pokemon(name, d["type"], d["base_hp"], d["base_attack"], d["base_defense"], d["base_speed"])
+            for name, d in logic.POKEMON_DB.items()]
+    matchups = [(mons[i], mons[j]) for i in range(len(mons)) for j in range(len(mons)) if i < j][:12]
+
+    print(f"{'бой':>24} | {'движок':>7} | {'Battle':>7} | {'ходы':>11} | {'z':>6}")
+    worst = 0
+    for a, b, p_engine, p_battle, t_engine, t_battle, z in cross_check(matchups):
+        worst = max(worst, abs(z))
+        print(f"{a.name + ' vs ' + b.name:>24} | {p_engine:>7.3f} | {p_battle:>7.3f} | "
+              f"{t_engine:>5.2f}/{t_battle:<5.2f} | {z:>6.2f}")
+    print(f"макс |z| = {worst:.2f} ({'OK' if worst < 4 else 'РАСХОЖДЕНИЕ'})")
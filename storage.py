@@ -0,0 +1,329 @@
+# ========================= storage.py =========================
+# Хранилище тренеров: ленивый реестр + подключаемые бэкенды (SQLite WAL по умолчанию)
+
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+
+class Storage:
+    """Базовый интерфейс бэкенда. Данные тренера хранятся как JSON-строка."""
+
+    # Ведёт ли бэкенд журнал отдельных изменений (см. journal.py)
+    journaling = False
+
+    def record(self, op, name, arg):
+        """Одно изменение тренера. Бэкенды без журнала его игнорируют."""
+        pass
+
+    def load(self, name):
+        raise NotImplementedError
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def keys(self):
+        raise NotImplementedError
+
+    def save_many(self, rows):
+        """rows — список (name, data, summary). Должно выполняться одной транзакцией."""
+        raise NotImplementedError
+
+    def summaries(self):
+        """Пары (name, summary) для всех тренеров — для рейтинга без полной загрузки."""
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(Storage):
+    """Хранилище в памяти — ничего не переживает перезапуск, удобно для отладки."""
+
+    def __init__(self):
+        self._rows = {}
+        self._summaries = {}
+
+    def load(self, name):
+        return self._rows.get(name)
+
+    def exists(self, name):
+        return name in self._rows
+
+    def keys(self):
+        return list(self._rows)
+
+    def save_many(self, rows):
+        for name, data, summary in rows:
+            self._rows[name] = data
+            self._summaries[name] = summary
+
+    def summaries(self):
+        return list(self._summaries.items())
+
+    def delete(self, name):
+        self._rows.pop(name, None)
+        self._summaries.pop(name, None)
+
+
+class SQLiteStorage(Storage):
+    """SQLite в режиме WAL: запись не блокирует чтение, транзакции переживают падение процесса."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS trainers ("
+            " name TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " summary TEXT"
+            ")"
+        )
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(trainers)")]
+        if "summary" not in columns:
+            # база, созданная до появления рейтинга
+            self._conn.execute("ALTER TABLE trainers ADD COLUMN summary TEXT")
+
+    def load(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM trainers WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def exists(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM trainers WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def keys(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT name FROM trainers")]
+
+    def save_many(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO trainers (name, data, summary) VALUES (?, ?, ?)", rows
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def summaries(self):
+        with self._lock:
+            return self._conn.execute("SELECT name, summary FROM trainers").fetchall()
+
+    def delete(self, name):
+        with self._lock:
+            self._conn.execute("DELETE FROM trainers WHERE name = ?", (name,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def make_storage(kind, path=None, fsync=False):
+    """Создаёт бэкенд по имени из config.py."""
+    if kind == "sqlite":
+        return SQLiteStorage(path or "pokemon.db")
+    if kind == "memory":
+        return MemoryStorage()
+    if kind == "journal":
+        from journal import JournalStorage
+        return JournalStorage(path or "journal", fsync=fsync)
+    raise ValueError(f"Неизвестный бэкенд хранилища: {kind}")
+
+
+class TrainerRegistry(MutableMapping):
+    """
+    Словарь тренеров с ленивой загрузкой из хранилища.
+
+    Тренер поднимается из бэкенда при первом обращении (`get`, `[]`).
+    Изменённый тренер помечается «затронутым» через `mark_dirty()` (его
+    вызывает Trainer.touch); выданный через `get`/`[]` — тоже, на случай правки
+    в обход touch. `flush()` сериализует только затронутых и пишет в базу лишь
+    тех, чьё состояние реально изменилось с последней записи.
+    Вместе с данными пишется краткая сводка `summarize(trainer)` для рейтинга.
+    `lock(name)` — блокировка тренера, под которой он сериализуется.
+    """
+
+    def __init__(self, encode, decode, summarize, lock, batch_size=500):
+        self._encode = encode
+        self._decode = decode
+        self._summarize = summarize
+        self._trainer_lock = lock
+        self.batch_size = batch_size
+        self._backend = None
+        self._loaded = {}
+        self._touched = set()
+        self._written = {}
+        self._lock = threading.RLock()
+
+    def attach(self, backend):
+        with self._lock:
+            self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @property
+    def journaling(self):
+        return self._backend is not None and self._backend.journaling
+
+    def record(self, trainer, op, arg):
+        """Пишет изменение в журнал бэкенда — только для тренеров из этого реестра."""
+        with self._lock:
+            if self._loaded.get(trainer.name) is not trainer:
+                return
+        self._backend.record(op, trainer.name, arg)
+
+    def _dump(self, trainer):
+        return json.dumps(self._encode(trainer), ensure_ascii=False, sort_keys=True)
+
+    def _load(self, name):
+        # вызывается под self._lock
+        trainer = self._loaded.get(name)
+        if trainer is not None or self._backend is None:
+            return trainer
+        data = self._backend.load(name)
+        if data is None:
+            return None
+        trainer = self._decode(json.loads(data))
+        self._loaded[name] = trainer
+        self._written[name] = data
+        return trainer
+
+    def __getitem__(self, name):
+        with self._lock:
+            trainer = self._load(name)
+            if trainer is None:
+                raise KeyError(name)
+            self._touched.add(name)
+            return trainer
+
+    def mark_dirty(self, name):
+        """
+        Тренер изменился — он попадёт в следующий flush(), даже если объект
+        получили задолго до этого (турнир, бой). Изменение во время сброса
+        попадает в уже новый набор затронутых и запишется следующим flush().
+        """
+        with self._lock:
+            if name in self._loaded:
+                self._touched.add(name)
+
+    def __setitem__(self, name, trainer):
+        with self._lock:
+            self._loaded[name] = trainer
+            self._touched.add(name)
+
+    def __delitem__(self, name):
+        with self._lock:
+            if name not in self:
+                raise KeyError(name)
+            self._loaded.pop(name, None)
+            self._touched.discard(name)
+            self._written.pop(name, None)
+            if self._backend is not None:
+                self._backend.delete(name)
+
+    def __contains__(self, name):
+        with self._lock:
+            if name in self._loaded:
+                return True
+            return self._backend is not None and self._backend.exists(name)
+
+    def _names(self):
+        with self._lock:
+            names = list(self._loaded)
+            if self._backend is not None:
+                seen = set(names)
+                names.extend(n for n in self._backend.keys() if n not in seen)
+            return names
+
+    def __iter__(self):
+        return iter(self._names())
+
+    def __len__(self):
+        return len(self._names())
+
+    # Обход для чтения (рейтинги и т.п.) не помечает тренеров затронутыми
+    def values(self):
+        for name in self._names():
+            with self._lock:
+                trainer = self._load(name)
+            if trainer is not None:
+                yield trainer
+
+    def items(self):
+        for name in self._names():
+            with self._lock:
+                trainer = self._load(name)
+            if trainer is not None:
+                yield name, trainer
+
+    def peek(self, name):
+        """Как get(), но не помечает тренера затронутым — для чтения."""
+        with self._lock:
+            return self._load(name)
+
+    def summaries(self):
+        """Сводки всех тренеров: из памяти для загруженных, из базы для остальных."""
+        with self._lock:
+            result = {name: self._summarize(t) for name, t in self._loaded.items()}
+            stored = self._backend.summaries() if self._backend is not None else []
+        for name, summary in stored:
+            if name in result:
+                continue
+            if summary is None:
+                trainer = self.peek(name)
+                if trainer is not None:
+                    result[name] = self._summarize(trainer)
+            else:
+                result[name] = json.loads(summary)
+        return list(result.items())
+
+    def loaded(self):
+        """Тренеры, уже поднятые в память."""
+        with self._lock:
+            return list(self._loaded.values())
+
+    def flush(self):
+        """Записывает изменившихся тренеров пачками, каждая пачка — одна транзакция."""
+        if self._backend is None:
+            return 0
+        with self._lock:
+            names, self._touched = self._touched, set()
+            pending = [(n, self._loaded[n]) for n in names if n in self._loaded]
+
+        rows = []
+        for name, trainer in pending:
+            with self._trainer_lock(name):
+                data = self._dump(trainer)
+                if self._written.get(name) == data:
+                    continue
+                summary = json.dumps(self._summarize(trainer), ensure_ascii=False)
+            rows.append((name, data, summary))
+
+        try:
+            for i in range(0, len(rows), self.batch_size):
+                self._backend.save_many(rows[i:i + self.batch_size])
+        except Exception:
+            # не потеряем изменения — попробуем снова при следующем сбросе
+            with self._lock:
+                self._touched.update(row[0] for row in rows)
+            raise
+
+        with self._lock:
+            self._written.update((name, data) for name, data, _ in rows)
+        return len(rows)
@@ -0,0 +1,40 @@
+# ========================= tests/conftest.py =========================
+# Модули бота лежат в корне репозитория — делаем их импортируемыми из тестов.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Пустой реестр тренеров и рейтинг вместо общих на весь процесс."""
+    from leaderboard import Leaderboard
+    from logic import Trainer, trainer_lock
+    from storage import TrainerRegistry
+
+    registry = TrainerRegistry(encode=Trainer.to_dict, decode=Trainer.from_dict,
+                               summarize=Trainer.summary, lock=trainer_lock)
+    monkeypatch.setattr(Trainer, "trainers", registry)
+    monkeypatch.setattr(Trainer, "leaderboard", Leaderboard())
+    return registry
+
+
+@pytest.fixture(scope="session")
+def bot_main(tmp_path_factory):
+    """main.py с API-заглушкой (fake_api) и хранилищами в памяти — для тестов обработчиков."""
+    import config
+    import fake_api
+
+    tmp = tmp_path_factory.mktemp("bot")
+    config.token = "1:test"
+    config.storage_backend = "memory"
+    config.session_backend = "memory"
+    config.file_id_cache_path = str(tmp / "file_ids.json")
+    config.cards_dir = str(tmp / "cards")
+    config.metrics_port = None
+    fake_api.install_null_api()
+    import main
+    return main
@@ -0,0 +1,96 @@
+# ========================= tests/test_cards.py =========================
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from cards import BattleCards
+from outbox import Outbox
+
+
+def _key(name):
+    return ("", name, 5, "", "Соперник", 3)
+
+
+def _cards(tmp_path, max_entries=1):
+    forgotten = []
+    cards = BattleCards(sprite_dir=str(tmp_path / "images"), cache_dir=str(tmp_path / "cards"),
+                        max_entries=max_entries, on_evict=lambda *paths: forgotten.extend(paths))
+    return cards, forgotten
+
+
+def test_evicted_file_is_deleted(tmp_path):
+    cards, forgotten = _cards(tmp_path)
+    first = cards.get(_key("A"))
+    second = cards.get(_key("B"))
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert forgotten == [first]
+
+
+def test_pinned_file_survives_eviction_until_release(tmp_path):
+    cards, forgotten = _cards(tmp_path)
+    pinned = cards.get(_key("A"), pin=True)
+    cards.get(_key("B"))
+    cards.get(_key("C"))
+    # вытеснена из LRU, но отправка ещё не открыла файл
+    assert os.path.exists(pinned)
+    assert pinned not in forgotten
+
+    cards.release(pinned)
+    assert not os.path.exists(pinned)
+    assert pinned in forgotten
+    assert cards.stats()["pinned"] == 0
+
+
+def test_pins_are_counted(tmp_path):
+    cards, _ = _cards(tmp_path)
+    path = cards.get(_key("A"), pin=True)
+    assert cards.get(_key("A"), pin=True) == path
+    cards.get(_key("B"))
+    cards.release(path)
+    assert os.path.exists(path)
+    cards.release(path)
+    assert not os.path.exists(path)
+
+
+def test_evicted_pinned_card_is_reused(tmp_path):
+    cards, _ = _cards(tmp_path)
+    path = cards.get(_key("A"), pin=True)
+    cards.get(_key("B"))
+    # снова нужна, пока файл ещё на диске — без перерисовки
+    assert cards.get(_key("A")) == path
+    assert cards.stats()["rendered"] == 2
+    cards.release(path)
+    assert os.path.exists(path)
+
+
+class _Bot:
+    def __init__(self):
+        self.opened = []
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        self.opened.append(photo.read(2))
+
+
+def test_outbox_releases_card_after_send(tmp_path):
+    cards, _ = _cards(tmp_path)
+    bot = _Bot()
+    outbox = Outbox(bot, workers=1, global_rate=1000, chat_rate=1000, chat_burst=10)
+    busy = threading.Event()
+    try:
+        # чат занят предыдущей отправкой — фото ждёт в очереди
+        outbox.call(1, busy.wait, 5)
+        path = cards.get(_key("A"), pin=True)
+        outbox.send_photo(1, path, on_done=lambda: cards.release(path))
+        # тем временем карточку вытесняют другие бои
+        cards.get(_key("B"))
+        assert os.path.exists(path)
+        busy.set()
+        assert outbox.join(5)
+    finally:
+        outbox.close()
+    assert bot.opened == [b"\xff\xd8"]  # файл открылся целым
+    assert not os.path.exists(path)
@@ -0,0 +1,136 @@
+# ========================= tests/test_journal.py =========================
+import json
+import os
+import zlib
+
+import pytest
+
+import journal
+from journal import HEADER, JournalStorage, read_records
+from logic import Trainer
+from storage import make_storage
+
+
+def _state(coins=100):
+    return {"name": "ash", "coins": coins, "pokemons": []}
+
+
+def _legacy_record(obj):
+    # запись журнала до появления MAGIC: JSON без заголовка файла
+    payload = json.dumps(obj).encode("utf-8")
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def test_replay_after_restart(tmp_path):
+    store = JournalStorage(str(tmp_path))
+    store.record("put", "ash", [_state(), None])
+    store.record("fields", "ash", {"coins": 150})
+    store.record("pokemon", "ash", {"id": "p1", "name": "Pikachu"})
+    store.record("pokemon", "ash", {"id": "p2", "name": "Eevee"})
+    store.record("pokemon_del", "ash", "p1")
+    store.close()
+
+    store = JournalStorage(str(tmp_path))
+    data = json.loads(store.load("ash"))
+    assert data["coins"] == 150
+    assert data["pokemons"] == [{"id": "p2", "name": "Eevee"}]
+    store.close()
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    store = JournalStorage(str(tmp_path))
+    store.record("put", "ash", [_state(), None])
+    store.record("fields", "ash", {"coins": 150})
+    segment = store._segment_path(store.segment)
+    store.close()
+
+    # падение посреди записи: от последней записи остался обрывок
+    size = os.path.getsize(segment)
+    with open(segment, "r+b") as f:
+        f.truncate(size - 3)
+
+    store = JournalStorage(str(tmp_path))
+    assert json.loads(store.load("ash"))["coins"] == 100
+    # битый хвост обрезан — новые записи не окажутся за ним
+    _, valid = read_records(segment)
+    assert valid == os.path.getsize(segment)
+    store.record("fields", "ash", {"coins": 175})
+    store.close()
+
+    store = JournalStorage(str(tmp_path))
+    assert json.loads(store.load("ash"))["coins"] == 175
+    store.close()
+
+
+def test_corrupted_record_stops_replay(tmp_path):
+    store = JournalStorage(str(tmp_path))
+    store.record("put", "ash", [_state(), None])
+    store.record("fields", "ash", {"coins": 150})
+    segment = store._segment_path(store.segment)
+    store.close()
+
+    with open(segment, "r+b") as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b"!!")  # crc последней записи не сойдётся
+
+    store = JournalStorage(str(tmp_path))
+    assert json.loads(store.load("ash"))["coins"] == 100
+    store.close()
+
+
+def test_snapshot_compacts_segments(tmp_path):
+    store = JournalStorage(str(tmp_path))
+    store.record("put", "ash", [_state(), None])
+    store.snapshot()
+    store.record("fields", "ash", {"coins": 300})
+    store.close()
+
+    logs = sorted(name for name in os.listdir(tmp_path) if name.endswith(".log"))
+    assert len(logs) == 1
+    with open(tmp_path / "snapshot.bin", "rb") as f:
+        assert f.read(5) == journal.MAGIC + journal.CODEC
+
+    store = JournalStorage(str(tmp_path))
+    assert json.loads(store.load("ash"))["coins"] == 300
+    store.close()
+
+
+def test_reads_files_without_header(tmp_path):
+    with open(tmp_path / "000001.log", "wb") as f:
+        f.write(_legacy_record(["put", "ash", [_state(), None]]) + _legacy_record(["fields", "ash", {"coins": 5}]))
+    with open(tmp_path / "snapshot.bin", "wb") as f:
+        f.write(json.dumps({"segment": 1, "state": {"misty": _state(7)}, "summaries": {"misty": None}}).encode())
+
+    store = JournalStorage(str(tmp_path))
+    assert json.loads(store.load("ash"))["coins"] == 5
+    assert json.loads(store.load("misty"))["coins"] == 7
+    # в старый сегмент не дописываем — новый начинается с заголовка
+    assert store.segment == 2
+    store.close()
+    with open(tmp_path / "000002.log", "rb") as f:
+        assert f.read(5) == journal.MAGIC + journal.CODEC
+
+
+def test_msgpack_file_without_msgpack(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "msgpack", None)
+    payload = b"\x90"
+    with open(tmp_path / "000001.log", "wb") as f:
+        f.write(journal.MAGIC + journal.MSGPACK + HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+    with pytest.raises(RuntimeError):
+        JournalStorage(str(tmp_path))
+
+
+def test_trainer_changes_are_journaled(tmp_path, registry):
+    registry.attach(make_storage("journal", str(tmp_path)))
+    ash = Trainer("ash")
+    ash.add_pokemon()
+    ash.buy_item("potion")
+    # без flush(): изменения уже в журнале
+    registry.backend.close()
+
+    store = JournalStorage(str(tmp_path))
+    data = json.loads(store.load("ash"))
+    assert data["coins"] == ash.coins
+    assert data["items"]["potion"] == ash.items["potion"]
+    assert [p["id"] for p in data["pokemons"]] == [p.id for p in ash.pokemons]
+    store.close()
@@ -0,0 +1,64 @@
+# ========================= tests/test_leaderboard.py =========================
+from leaderboard import Leaderboard
+from logic import Trainer
+
+
+def _summary(*pokemons):
+    """pokemons — (имя, уровень, сила)."""
+    rows = [(name, "fire", level, power, 0) for name, level, power in pokemons]
+    return {"level": sum(r[2] for r in rows), "power": sum(r[3] for r in rows), "pokemons": rows}
+
+
+def test_top_trainers_order():
+    board = Leaderboard()
+    board.update("ash", _summary(("Pikachu", 5, 200)))
+    board.update("misty", _summary(("Staryu", 7, 150)))
+    board.update("brock", _summary(("Onix", 5, 300)))
+    # по сумме уровней, при равенстве — по силе
+    assert board.top_trainers(3) == [("misty", 7, 150), ("brock", 5, 300), ("ash", 5, 200)]
+    assert board.top_trainers(1) == [("misty", 7, 150)]
+
+
+def test_update_replaces_old_rows():
+    board = Leaderboard()
+    board.update("ash", _summary(("Pikachu", 5, 200), ("Bulbasaur", 3, 120)))
+    board.update("ash", _summary(("Pikachu", 6, 220)))
+    assert len(board) == 1
+    assert board.top_trainers(5) == [("ash", 6, 220)]
+    assert board.top_pokemons(5) == [("Pikachu", "fire", "ash", 220, 6, 0)]
+
+
+def test_top_pokemons_across_trainers():
+    board = Leaderboard()
+    board.update("ash", _summary(("Pikachu", 5, 200), ("Bulbasaur", 3, 120)))
+    board.update("brock", _summary(("Onix", 5, 300)))
+    assert [row[0] for row in board.top_pokemons(3)] == ["Onix", "Pikachu", "Bulbasaur"]
+
+
+def test_remove_and_load():
+    board = Leaderboard()
+    board.update("ash", _summary(("Pikachu", 5, 200)))
+    board.remove("ash")
+    board.remove("nobody")
+    assert board.top_trainers(5) == [] and board.top_pokemons(5) == []
+
+    board.load([("ash", _summary(("Pikachu", 5, 200))), ("brock", _summary(("Onix", 9, 300)))])
+    assert [row[0] for row in board.top_trainers(5)] == ["brock", "ash"]
+    # повторная загрузка не дублирует строки
+    board.load([("ash", _summary(("Pikachu", 6, 210)))])
+    assert board.top_trainers(5) == [("brock", 9, 300), ("ash", 6, 210)]
+    assert len(board.top_pokemons(5)) == 2
+
+
+def test_trainer_changes_reach_leaderboard(registry):
+    ash = Trainer("ash")
+    ash.add_pokemon()
+    p = ash.pokemons[0]
+    assert Trainer.leaderboard.top_trainers(1) == [("ash", p.level, p.power())]
+
+    ash.award_xp(p, 10_000)
+    assert Trainer.leaderboard.top_trainers(1) == [("ash", p.level, p.power())]
+    assert Trainer.leaderboard.top_pokemons(1)[0][0] == p.name
+
+    ash.release_pokemon(p.id)
+    assert Trainer.leaderboard.top_pokemons(1) == []
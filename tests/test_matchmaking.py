@@ -0,0 +1,97 @@
+# ========================= tests/test_matchmaking.py =========================
+import threading
+
+from matchmaking import MatchQueue, expected_score, rating_delta
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _queue(**kwargs):
+    clock = _Clock()
+    return MatchQueue(clock=clock, **dict(dict(window=50, widen=10, max_window=400, timeout=120), **kwargs)), clock
+
+
+def test_rating_math():
+    assert expected_score(1000, 1000) == 0.5
+    assert rating_delta(1000, 1000) == 16
+    # победа над сильным даёт больше, над заведомо слабым — хотя бы 1
+    assert rating_delta(1000, 1400) > rating_delta(1400, 1000)
+    assert rating_delta(3000, 0) == 1
+
+
+def test_enqueue_pairs_nearest_in_window():
+    queue, _ = _queue()
+    assert queue.enqueue("a", "p", 1000) is None
+    assert queue.enqueue("b", "p", 1300) is None
+    opponent, ticket = queue.enqueue("c", "p", 1030)
+    assert (opponent.name, ticket.name) == ("a", "c")
+    assert "a" not in queue and "b" in queue
+    assert len(queue) == 1
+
+
+def test_reenqueue_replaces_ticket():
+    queue, _ = _queue()
+    queue.enqueue("a", "p1", 1000)
+    queue.enqueue("a", "p2", 1500)
+    assert len(queue) == 1
+    # старая заявка с рейтингом 1000 ушла — соперник на 1010 не находится
+    assert queue.enqueue("b", "p", 1010) is None
+    assert queue.cancel("a") and not queue.cancel("a")
+
+
+def test_window_widens_with_waiting():
+    queue, clock = _queue()
+    queue.enqueue("a", "p", 1000)
+    queue.enqueue("b", "p", 1150)
+    assert queue.sweep() == ([], [])
+    clock.now = 10  # окно 50 + 10 * 10 = 150
+    pairs, expired = queue.sweep()
+    assert [(a.name, b.name) for a, b in pairs] == [("a", "b")]
+    assert expired == [] and len(queue) == 0
+
+
+def test_timeout_expires_tickets():
+    queue, clock = _queue(timeout=5, max_window=60)
+    queue.enqueue("a", "p", 1000)
+    queue.enqueue("b", "p", 2000)
+    clock.now = 6
+    pairs, expired = queue.sweep()
+    assert pairs == [] and sorted(t.name for t in expired) == ["a", "b"]
+    assert queue.stats() == {"waiting": 0, "matched": 0, "expired": 2}
+
+
+def test_failed_match_does_not_block_others():
+    queue, _ = _queue(window=0)
+    # с нулевым окном заявки не сводятся при входе — пары соберёт sweep()
+    for name, rating in [("bad", 1000), ("x", 1010), ("a", 1500), ("b", 1510)]:
+        queue.enqueue(name, "p", rating)
+    queue.window = 50
+
+    played, expired = [], []
+    done, fought = threading.Event(), threading.Event()
+
+    def on_match(a, b):
+        if "bad" in (a.name, b.name):
+            raise ValueError("бой упал")
+        played.append((a.name, b.name))
+        fought.set()
+
+    def on_expire(ticket):
+        expired.append(ticket.name)
+        if len(expired) == 2:
+            done.set()
+
+    queue.start(0.01, on_match, on_expire, workers=2)
+    try:
+        # заявки упавшего боя уже вынуты из очереди — игроки узнают о нём через on_expire
+        assert done.wait(5) and fought.wait(5)
+    finally:
+        queue.close()
+    assert sorted(expired) == ["bad", "x"]
+    assert played == [("a", "b")]
@@ -0,0 +1,40 @@
+# ========================= tests/test_metrics.py =========================
+import threading
+
+from metrics import Metrics
+
+
+def test_profile_rejects_unknown_handler():
+    metrics = Metrics()
+    metrics.wrap_handler("cmd_top", lambda: None)
+    assert not metrics.profile("cmd_nope", 1, print)
+    assert metrics.handlers() == ["cmd_top"]
+
+
+def test_concurrent_calls_use_one_profiler():
+    metrics = Metrics()
+    reports = []
+    inside = threading.Event()
+    go = threading.Event()
+
+    def slow():
+        inside.set()
+        go.wait(5)
+
+    handler = metrics.wrap_handler("cmd_slow", slow)
+    assert metrics.profile("cmd_slow", 2, reports.append)
+
+    first = threading.Thread(target=handler)
+    first.start()
+    assert inside.wait(5)
+    # пока первый вызов профилируется, второй идёт без cProfile и слот не тратит
+    handler_fast = metrics.wrap_handler("cmd_slow", lambda: None)
+    handler_fast()
+    go.set()
+    first.join(5)
+    assert reports == []
+
+    handler()
+    assert len(reports) == 1
+    assert "function calls" in reports[0]
+    assert metrics.calls["cmd_slow"] == 3
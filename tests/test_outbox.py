@@ -0,0 +1,123 @@
+# ========================= tests/test_outbox.py =========================
+import threading
+import time
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from metrics import Metrics
+from outbox import Outbox, TokenBucket
+
+
+def _api_error(code, **parameters):
+    result = {"ok": False, "error_code": code, "description": "test"}
+    if parameters:
+        result["parameters"] = parameters
+    return ApiTelegramException("sendMessage", None, result)
+
+
+class _Bot:
+    """Отвечает ошибками из errors по очереди, потом — успехом; помнит отправленное."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+        self.times = []
+
+    def _reply(self, kind, chat_id, value):
+        self.times.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((kind, chat_id, value))
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._reply("message", chat_id, text)
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        self._reply("photo", chat_id, kwargs.get("caption"))
+
+
+@pytest.fixture
+def make_outbox():
+    outboxes = []
+
+    def make(bot, **kwargs):
+        kwargs = dict(dict(workers=1, global_rate=1000, chat_rate=1000, chat_burst=10), **kwargs)
+        outbox = Outbox(bot, **kwargs)
+        outboxes.append(outbox)
+        return outbox
+
+    yield make
+    for outbox in outboxes:
+        outbox.close(1)
+
+
+def test_429_waits_retry_after_and_keeps_order(make_outbox):
+    bot = _Bot(_api_error(429, retry_after=0.2))
+    outbox = make_outbox(bot)
+    outbox.send_message(1, "первое")
+    outbox.send_message(1, "второе", parse_mode="Markdown")  # не склеивается: другие параметры
+    assert outbox.join(5)
+    assert [text for _, _, text in bot.sent] == ["первое", "второе"]
+    assert bot.times[1] - bot.times[0] >= 0.2
+    stats = outbox.stats()
+    assert stats["throttled"] == 1 and stats["sent"] == 2 and stats["failed"] == 0
+
+
+def test_429_in_one_chat_does_not_block_others(make_outbox):
+    bot = _Bot(_api_error(429, retry_after=0.5))
+    outbox = make_outbox(bot)
+    outbox.send_message(1, "в чат 1")
+    outbox.send_message(2, "в чат 2")
+    assert outbox.join(5)
+    assert [chat for _, chat, _ in bot.sent] == [2, 1]
+
+
+def test_server_errors_give_up_after_retries(make_outbox):
+    bot = _Bot(_api_error(502))
+    outbox = make_outbox(bot, max_retries=0)
+    outbox.send_message(1, "не дойдёт")
+    assert outbox.join(5)
+    assert bot.sent == []
+    assert outbox.stats()["failed"] == 1
+
+
+def test_photo_falls_back_to_caption(make_outbox, tmp_path):
+    image = tmp_path / "card.jpg"
+    image.write_bytes(b"\xff\xd8")
+    bot = _Bot(_api_error(400))
+    outbox = make_outbox(bot)
+    done = []
+    outbox.send_photo(1, str(image), caption="⚔️ бой", on_done=lambda: done.append(True))
+    assert outbox.join(5)
+    assert bot.sent == [("message", 1, "⚔️ бой")]
+    assert done == [True]
+
+
+def test_texts_to_busy_chat_are_coalesced(make_outbox):
+    bot = _Bot()
+    outbox = make_outbox(bot)
+    busy = threading.Event()
+    outbox.call(1, busy.wait, 5)
+    for i in range(3):
+        outbox.send_message(1, f"строка {i}")
+    busy.set()
+    assert outbox.join(5)
+    assert bot.sent == [("message", 1, "строка 0\n\nстрока 1\n\nстрока 2")]
+    assert outbox.stats()["coalesced"] == 2
+
+
+def test_send_time_reaches_metrics(make_outbox):
+    metrics = Metrics()
+    outbox = make_outbox(_Bot(), metrics=metrics)
+    outbox.send_message(1, "привет")
+    assert outbox.join(5)
+    assert metrics.send_latency["message"].count == 1
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, burst=1, now=0.0)
+    assert bucket.wait_time(0.0) == 0
+    bucket.take()
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.5) == 0
@@ -0,0 +1,84 @@
+# ========================= tests/test_pokemon_lookup.py =========================
+from types import SimpleNamespace
+
+import pytest
+
+from logic import Pokemon, Trainer
+
+
+def _pokemon(name):
+    return Pokemon(name, "electric", 35, 55, 40, 90, "images/pikachu.png")
+
+
+@pytest.fixture
+def ash(registry):
+    ash = Trainer("ash")
+    ash.pokemons = [_pokemon("Pikachu"), _pokemon("Pikachu"), _pokemon("Eevee")]
+    return ash
+
+
+def test_ids_are_unique(ash):
+    assert len({p.id for p in ash.pokemons}) == 3
+
+
+def test_find_by_id_or_name(ash):
+    first, second, eevee = ash.pokemons
+    assert ash.find_pokemon(second.id) is second
+    assert ash.find_pokemon("eevee") is eevee
+    # одинаковые имена — первый по списку, второй доступен по id
+    assert ash.find_pokemon("PIKACHU") is first
+    assert ash.find_pokemon("Mewtwo") is None
+
+
+def test_rename_updates_index(ash):
+    first, second, _ = ash.pokemons
+    ash.rename_pokemon(second, "Sparky")
+    assert ash.find_pokemon("sparky") is second
+    assert ash.find_pokemon("pikachu") is first
+    ash.rename_pokemon(first, "Bolt")
+    assert ash.find_pokemon("pikachu") is None
+
+
+def test_release_by_id_keeps_namesake(ash):
+    first, second, _ = ash.pokemons
+    ok, _ = ash.release_pokemon(first.id)
+    assert ok
+    assert ash.find_pokemon(first.id) is None
+    assert ash.find_pokemon("pikachu") is second
+
+
+def test_list_changed_directly(ash):
+    # индекс перестраивается, если список поменяли в обход методов
+    mew = _pokemon("Mew")
+    ash.pokemons.append(mew)
+    assert ash.find_pokemon("mew") is mew
+
+
+# ---------- кнопки pick_ (/fight) ----------
+
+def _call(data, user_id=1, username="ash"):
+    return SimpleNamespace(id="cb1", data=data, message=SimpleNamespace(chat=SimpleNamespace(id=user_id)),
+                           from_user=SimpleNamespace(id=user_id, username=username, first_name=username))
+
+
+@pytest.fixture
+def answers(bot_main, monkeypatch):
+    answers = []
+    monkeypatch.setattr(bot_main.bot, "answer_callback_query", lambda call_id, text=None, **kw: answers.append(text))
+    return answers
+
+
+def test_stale_pick_button_is_answered(bot_main, answers, ash):
+    # кнопка из сообщения до сессий вызовов: pick_<имя> без id вызова
+    bot_main.pick_callback(_call("pick_Pikachu"))
+    assert answers == ["⌛ Начни бой заново /fight"]
+
+
+def test_expired_challenge_is_answered(bot_main, answers, ash):
+    bot_main.pick_callback(_call(f"pick_nochallenge_{ash.pokemons[0].id}"))
+    assert answers == ["⌛ Вызов истёк — начни заново командой /fight"]
+
+
+def test_foreign_pokemon_is_rejected(bot_main, answers, ash):
+    bot_main.pick_callback(_call(f"pick_x_{ash.pokemons[0].id}", user_id=2, username="misty"))
+    assert answers == ["❌ Это не твой покемон"]
@@ -0,0 +1,44 @@
+# ========================= tests/test_roster.py =========================
+from logic import Pokemon
+from roster import PokemonStore
+
+
+def _pokemon(name):
+    return Pokemon(name, "electric", 35, 55, 40, 90, "images/pikachu.png")
+
+
+def test_find_by_id():
+    store = PokemonStore()
+    pikachu, eevee = _pokemon("Pikachu"), _pokemon("Eevee")
+    store.add(pikachu)
+    view = store.add(eevee)
+    assert store.find(eevee.id).name == "Eevee"
+    assert store.find(pikachu.id).name == "Pikachu"
+    assert store.find("нет такого") is None
+
+    view.hp -= 10
+    assert store.find(eevee.id).hp == eevee.max_hp - 10
+
+
+def test_release_and_reuse_row():
+    store = PokemonStore()
+    pikachu = _pokemon("Pikachu")
+    view = store.add(pikachu)
+    store.release(view)
+    assert store.find(pikachu.id) is None
+    assert len(store) == 0
+
+    eevee = _pokemon("Eevee")
+    reused = store.add(eevee)
+    assert reused._idx == view._idx
+    assert store.find(eevee.id).name == "Eevee"
+    assert store.find(pikachu.id) is None
+
+
+def test_changing_id_moves_index():
+    store = PokemonStore()
+    pikachu = _pokemon("Pikachu")
+    view = store.add(pikachu)
+    view.id = "new-id"
+    assert store.find(pikachu.id) is None
+    assert store.find("new-id").name == "Pikachu"
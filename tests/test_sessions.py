@@ -0,0 +1,101 @@
+# ========================= tests/test_sessions.py =========================
+import pytest
+
+import sessions
+from sessions import MemorySessions, SQLiteSessions, make_sessions
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(sessions.time, "monotonic", clock)
+    monkeypatch.setattr(sessions.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    store = make_sessions(request.param, str(tmp_path / "sessions.db"), ttl=10, max_size=3)
+    yield store
+    store.close()
+
+
+def test_set_get_pop(store):
+    store.set("a", {"trainer": "ash", "ids": [1, 2]})
+    assert store.get("a") == {"trainer": "ash", "ids": [1, 2]}
+    assert store.pop("a") == {"trainer": "ash", "ids": [1, 2]}
+    assert store.get("a") is None
+    assert store.pop("a") is None
+
+
+def test_expiry(store, clock):
+    store.set("a", 1)
+    clock.now += 5
+    store.set("b", 2)
+    clock.now += 6
+    assert store.get("a") is None
+    assert store.get("b") == 2
+    clock.now += 10
+    assert store.sweep() == 1
+    assert len(store) == 0
+
+
+def test_cap_evicts_least_recently_used(store, clock):
+    for key in "abc":
+        store.set(key, key)
+        clock.now += 1
+    store.get("a")
+    clock.now += 1
+    store.set("d", "d")
+    assert len(store) == 3
+    assert store.get("b") is None
+    assert [store.get(key) for key in "acd"] == ["a", "c", "d"]
+
+
+def test_overwrite_does_not_evict(store):
+    for key in "abc":
+        store.set(key, key)
+    for _ in range(5):
+        store.set("c", "new")
+    assert len(store) == 3
+    assert store.get("a") == "a"
+
+
+def test_update(store):
+    assert store.update("a", lambda old: (old or 0) + 1) == 1
+    assert store.update("a", lambda old: (old or 0) + 1) == 2
+    assert store.update("a", lambda old: None) is None
+    assert store.get("a") is None
+
+
+def test_sqlite_count_follows_other_processes(tmp_path, clock):
+    path = str(tmp_path / "sessions.db")
+    first = SQLiteSessions(path, ttl=10, max_size=3)
+    second = SQLiteSessions(path, ttl=10, max_size=3)
+    try:
+        first.set("a", 1)
+        first.set("b", 2)
+        second.set("c", 3)
+        # first насчитал две строки; sweep() сверяет счётчик с таблицей
+        first.sweep()
+        clock.now += 1
+        first.set("d", 4)
+        assert len(first) == 3
+        assert first.get("a") is None
+    finally:
+        first.close()
+        second.close()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_sessions("redis")
+    assert isinstance(make_sessions("memory"), MemorySessions)
@@ -0,0 +1,78 @@
+# ========================= tests/test_shard.py =========================
+# Два «процесса» шардов в одном: очереди queue.Queue вместо multiprocessing.
+import queue
+import threading
+import time
+
+import pytest
+
+from logic import Trainer, trainer_lock
+from shard import Shard, ShardBusy, shard_of
+
+
+@pytest.fixture
+def shards(registry):
+    inboxes = [queue.Queue(), queue.Queue()]
+    shards = [Shard(i, inboxes, call_timeout=2.0, lock_timeout=0.2, loan_timeout=2.0) for i in range(2)]
+    threads = [threading.Thread(target=s.serve, args=(None, 2), daemon=True) for s in shards]
+    for t in threads:
+        t.start()
+    yield shards
+    for inbox in inboxes:
+        inbox.put(("stop",))
+    for t in threads:
+        t.join(2)
+
+
+def _owned_by(index, shards=2):
+    return next(f"trainer{i}" for i in range(100) if shard_of(f"trainer{i}", shards) == index)
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_shard_of_is_stable():
+    assert shard_of("ash", 4) == shard_of("ash", 4)
+    assert {shard_of(f"t{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_loan_changes_return_to_owner(shards):
+    name = _owned_by(0)
+    owner_copy = Trainer(name)
+    with shards[1].borrow(name) as (borrowed,):
+        assert borrowed is not owner_copy
+        borrowed.coins += 50
+    assert _wait_for(lambda: owner_copy.coins == 150)
+
+
+def test_failed_loan_leaves_owner_unchanged(shards):
+    name = _owned_by(0)
+    owner_copy = Trainer(name)
+    with pytest.raises(ValueError):
+        with shards[1].borrow(name) as (borrowed,):
+            borrowed.coins += 50
+            raise ValueError("бой упал")
+    # заём вернулся без состояния — владелец отпускает блокировку, ничего не меняя
+    with trainer_lock(name, timeout=2):
+        assert owner_copy.coins == 100
+
+
+def test_busy_trainer_is_not_lent(shards):
+    name = _owned_by(0)
+    Trainer(name)
+    with trainer_lock(name):
+        with pytest.raises(ShardBusy):
+            with shards[1].borrow(name):
+                pass
+
+
+def test_call_each_collects_all_shards(shards):
+    for shard in shards:
+        shard.ops["double"] = lambda values, index=shard.index: [index, [v * 2 for v in values]]
+    assert shards[0].call_each("double", {0: [1], 1: [2, 3]}) == {0: [0, [2]], 1: [1, [4, 6]]}
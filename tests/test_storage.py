@@ -0,0 +1,93 @@
+# ========================= tests/test_storage.py =========================
+import pytest
+
+from logic import Trainer
+from storage import make_storage
+
+
+def _reopen(registry, kind, path):
+    """Закрывает бэкенд и подключает реестр к новому — как после перезапуска бота."""
+    registry.flush()
+    registry.backend.close()
+    registry.__init__(Trainer.to_dict, Trainer.from_dict, Trainer.summary, registry._trainer_lock)
+    registry.attach(make_storage(kind, path))
+    return registry
+
+
+@pytest.fixture(params=["sqlite", "journal"])
+def durable(request, tmp_path, registry):
+    kind = request.param
+    path = str(tmp_path / ("pokemon.db" if kind == "sqlite" else "journal"))
+    registry.attach(make_storage(kind, path))
+    yield kind, path
+    registry.backend.close()
+
+
+def test_state_survives_restart(durable, registry):
+    kind, path = durable
+    ash = Trainer("ash")
+    ash.add_pokemon()
+    ash.buy_item("potion")
+    pokemon_id = ash.pokemons[0].id
+
+    _reopen(registry, kind, path)
+    loaded = registry.get("ash")
+    assert loaded is not ash
+    assert loaded.coins == ash.coins
+    assert loaded.items["potion"] == ash.items["potion"]
+    assert loaded.find_pokemon(pokemon_id).name == ash.pokemons[0].name
+
+
+def test_loads_lazily(durable, registry):
+    kind, path = durable
+    Trainer("ash")
+    Trainer("misty")
+    _reopen(registry, kind, path)
+    assert registry.loaded() == []
+    assert sorted(registry) == ["ash", "misty"]
+    assert "ash" in registry
+    registry.get("ash")
+    assert [t.name for t in registry.loaded()] == ["ash"]
+
+
+def test_flush_writes_only_changed(registry):
+    registry.attach(make_storage("memory"))
+    ash = Trainer("ash")
+    Trainer("misty")
+    assert registry.flush() == 2
+    assert registry.flush() == 0
+
+    # объект получен давно, изменение помечено touch() — попадает в сброс
+    ash.add_coins(10)
+    assert registry.flush() == 1
+    # выдан через get(), но не изменён — записывать нечего
+    registry.get("misty")
+    assert registry.flush() == 0
+
+
+def test_delete(durable, registry):
+    kind, path = durable
+    Trainer("ash")
+    registry.flush()
+    del registry["ash"]
+    _reopen(registry, kind, path)
+    assert "ash" not in registry
+
+
+def test_summaries_without_loading(durable, registry):
+    kind, path = durable
+    ash = Trainer("ash")
+    ash.add_pokemon()
+    if kind == "journal":
+        # сводки после мелких записей журнала устаревают и сохраняются снимком
+        registry.flush()
+        registry.backend.snapshot()
+    _reopen(registry, kind, path)
+    summaries = dict(registry.summaries())
+    assert summaries["ash"]["level"] == ash.summary()["level"]
+    assert registry.loaded() == []
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_storage("redis")
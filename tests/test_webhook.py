@@ -0,0 +1,47 @@
+# ========================= tests/test_webhook.py =========================
+import json
+import urllib.error
+
+import pytest
+
+from webhook import WebhookServer, replay
+
+
+class _Bot:
+    def __init__(self):
+        self.updates = []
+
+    def process_new_updates(self, updates):
+        self.updates.extend(updates)
+
+
+def _server(secret):
+    server = WebhookServer(_Bot(), "127.0.0.1", 0, "/telegram", queue_size=10, workers=1, secret=secret)
+    server.start()
+    return server, f"http://127.0.0.1:{server.httpd.server_address[1]}/telegram"
+
+
+def _updates(tmp_path, count=3):
+    path = tmp_path / "updates.jsonl"
+    path.write_text("\n".join(json.dumps({"update_id": i}) for i in range(count)), encoding="utf-8")
+    return str(path)
+
+
+def test_replay_sends_secret(tmp_path):
+    server, url = _server("s3cret")
+    try:
+        replay(_updates(tmp_path), url, secret="s3cret")
+        assert server.stats()["processed"] == 3
+    finally:
+        server.shutdown()
+
+
+def test_replay_without_secret_is_refused(tmp_path):
+    server, url = _server("s3cret")
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            replay(_updates(tmp_path), url)
+        assert error.value.code == 403
+        assert server.stats()["processed"] == 0
+    finally:
+        server.shutdown()
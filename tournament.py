@@ -0,0 +1,267 @@
+# ========================= tournament.py =========================
+# Турниры на весь сервер: олимпийская система (на выбывание) и круговой.
+# Бои одного раунда независимы — они уходят пачками в пул процессов
+# (ProcessPoolExecutor), а не выполняются в потоке обработчика.
+#
+# В процессы передаются не тренеры, а короткие кортежи статов первого
+# покемона; обратно — (номер боя, победившая сторона, ходов). Награды
+# (как у Battle.reward) начисляются один раз за раунд, пачкой на тренера.
+#
+# Составы и награды идут через local_leads / local_apply: без shard.py —
+# напрямую, с ним — одним запросом на каждый процесс-владелец за раунд.
+#
+# Турнирные бои идут на полном HP и не ранят покемонов; опыт, победы
+# и монеты начисляются как за обычный бой.
+
+import itertools
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import logic
+from logic import LOSS_COINS, WIN_COINS, Battle, Pokemon, Trainer, battle_xp, trainer_lock
+from shard import shard_of
+
+ELIMINATION = "elimination"
+ROUND_ROBIN = "round_robin"
+
+
+def lead_state(trainer):
+    """Всё, что нужно процессу пула для боя: (имя, id типа, HP, атака, защита, скорость)."""
+    p = trainer.pokemons[0]
+    return (p.name, p.type_id, p.max_hp, p.attack, p.defense, p.speed)
+
+
+def _fighter(state):
+    # урезанный Pokemon: Battle.fight читает только эти поля
+    p = Pokemon.__new__(Pokemon)
+    p.name, p.type_id, p.hp, p.attack, p.defense, p.speed = state
+    return p
+
+
+def run_batch(matches, seed):
+    """
+    Выполняется в процессе пула: [(номер, состояние 1, состояние 2), ...]
+    -> [(номер, победившая сторона 1/2, ходов), ...].
+    """
+    random.seed(seed)
+    battle = Battle(None, None, mode="quiet")
+    results = []
+    for i, a, b in matches:
+        side = battle.fight(_fighter(a), _fighter(b))
+        results.append((i, side, battle.turns))
+    return results
+
+
+def _init_worker(full_type_chart):
+    logic.use_full_type_chart(full_type_chart)
+
+
+def make_pool(workers=None):
+    """Пул процессов для турниров (workers=None — по числу ядер)."""
+    return ProcessPoolExecutor(workers, initializer=_init_worker,
+                               initargs=(logic.TYPE_MATRIX is logic.FULL_TYPE_MATRIX,))
+
+
+def local_leads(names):
+    """{имя: (lead_state, уровень первого покемона)} — тренеры этого процесса, у кого есть покемоны."""
+    leads = {}
+    for name in names:
+        with trainer_lock(name):
+            trainer = Trainer.trainers.get(name)
+            if trainer is not None and trainer.pokemons:
+                leads[name] = (lead_state(trainer), trainer.pokemons[0].level)
+    return leads
+
+
+def local_apply(outcomes):
+    """
+    Награды за раунд: {имя: [(победа?, уровень покемона соперника), ...]}.
+    Те же, что у Battle.reward, но журнал и рейтинг — один раз на тренера, а не на бой.
+    """
+    for name, results in outcomes.items():
+        with trainer_lock(name):
+            trainer = Trainer.trainers.get(name)
+            # покемона могли отпустить, пока шёл раунд — тогда без наград
+            if trainer is None or not trainer.pokemons:
+                continue
+            p = trainer.pokemons[0]
+            for won, opponent_level in results:
+                if won:
+                    p.add_xp(battle_xp(opponent_level))
+                    p.apply_ev_gain()
+                    p.battles_won += 1
+                    trainer.battles_won += 1
+                    trainer.coins += WIN_COINS
+                else:
+                    p.battles_lost += 1
+                    trainer.battles_lost += 1
+                    trainer.coins += LOSS_COINS
+            p.touch()
+            trainer.touch()
+            trainer._record("fields", lambda: {"coins": trainer.coins, "battles_won": trainer.battles_won,
+                                              "battles_lost": trainer.battles_lost})
+            trainer._record("pokemon", p.to_dict)
+    return len(outcomes)
+
+
+class Tournament:
+    """
+    Турнир между тренерами names (у кого нет покемонов — не участвуют).
+
+    pool=None — бои в этом же процессе (для сравнения и тестов).
+    on_round(номер раунда, боёв в раунде) — вызывается после каждого раунда.
+    cluster — shard.Shard в режиме shard.py: составы и награды чужих тренеров
+    запрашиваются у их процессов (операции tournament_leads / tournament_apply).
+    """
+
+    def __init__(self, names, kind=ELIMINATION, pool=None, batch_size=500, seed=None, on_round=None,
+                 cluster=None):
+        if kind not in (ELIMINATION, ROUND_ROBIN):
+            raise ValueError(f"Неизвестный вид турнира: {kind}")
+        self.kind = kind
+        self.pool = pool
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.on_round = on_round
+        self.cluster = cluster
+        self.names = list(dict.fromkeys(names))
+        self.wins = {}
+        self.matches = 0
+
+    def _by_owner(self, items):
+        """{номер процесса: часть items} — по владельцам имён (ключей словаря или элементов списка)."""
+        groups = {}
+        for name in items:
+            groups.setdefault(shard_of(name, self.cluster.shards), []).append(name)
+        if isinstance(items, dict):
+            return {shard: {name: items[name] for name in names} for shard, names in groups.items()}
+        return groups
+
+    def _leads(self, names):
+        if self.cluster is None:
+            return local_leads(names)
+        # процесс, который не ответил, — его тренеры проигрывают технически
+        leads = {}
+        for part in self.cluster.call_each("tournament_leads", self._by_owner(list(names))).values():
+            leads.update(part)
+        return leads
+
+    def _reward(self, outcomes):
+        if self.cluster is None:
+            local_apply(outcomes)
+        else:
+            self.cluster.call_each("tournament_apply", self._by_owner(outcomes))
+
+    def run(self):
+        """Проводит турнир. Возвращает итоговую таблицу [(имя, побед), ...], первым — чемпион."""
+        # составы всех участников — одним проходом; они же идут в первый раунд
+        leads = self._leads(self.names)
+        players = [name for name in self.names if name in leads]
+        self.wins = dict.fromkeys(players, 0)
+        self.rng.shuffle(players)
+        if self.kind == ROUND_ROBIN:
+            if len(players) > 1:
+                self._play(list(itertools.combinations(players, 2)), leads)
+                self._round_done(1)
+            return sorted(self.wins.items(), key=lambda row: (-row[1], row[0]))
+
+        # на выбывание: при нечётном числе последний проходит дальше без боя
+        eliminated = []
+        round_no = 0
+        while len(players) > 1:
+            round_no += 1
+            pairs = list(zip(players[0::2], players[1::2]))
+            winners = self._play(pairs, leads)
+            leads = None
+            eliminated.extend(b if w == a else a for (a, b), w in zip(pairs, winners))
+            players = winners + players[2 * len(pairs):]
+            self._round_done(round_no, len(pairs))
+        # чемпион, затем выбывшие — от последних раундов к первым
+        return [(name, self.wins[name]) for name in players + eliminated[::-1]]
+
+    def _round_done(self, round_no, matches=None):
+        if self.on_round is not None:
+            self.on_round(round_no, self.matches if matches is None else matches)
+
+    def _play(self, pairs, leads=None):
+        """Бои пар [(имя, имя), ...]; возвращает победителей в том же порядке."""
+        if leads is None:
+            # составы берутся заново каждый раунд: между раундами покемонов могли поменять
+            leads = self._leads({name for pair in pairs for name in pair})
+        winners = [None] * len(pairs)
+        matches = []
+        for i, (a, b) in enumerate(pairs):
+            if a in leads and b in leads:
+                matches.append((i, leads[a][0], leads[b][0]))
+            else:
+                # без покемонов (отпустили) или процесс не ответил — техническое поражение
+                winners[i] = self._walkover(a if a in leads else b)
+        batches = [matches[k:k + self.batch_size] for k in range(0, len(matches), self.batch_size)]
+        seeds = [self.rng.getrandbits(32) for _ in batches]
+
+        if self.pool is None:
+            done = (run_batch(batch, seed) for batch, seed in zip(batches, seeds))
+        else:
+            futures = [self.pool.submit(run_batch, batch, seed) for batch, seed in zip(batches, seeds)]
+            done = (future.result() for future in as_completed(futures))
+        outcomes = {}
+        for results in done:
+            for i, side, _ in results:
+                a, b = pairs[i]
+                winner, loser = (a, b) if side == 1 else (b, a)
+                outcomes.setdefault(winner, []).append((True, leads[loser][1]))
+                outcomes.setdefault(loser, []).append((False, leads[winner][1]))
+                winners[i] = self._walkover(winner)
+        # награды — одной пачкой за раунд (и одним запросом на процесс в shard.py)
+        self._reward(outcomes)
+        return winners
+
+    def _walkover(self, winner):
+        self.wins[winner] += 1
+        self.matches += 1
+        return winner
+
+
+class TournamentRunner:
+    """Один турнир за раз в фоновом потоке; пул процессов создаётся при первом турнире."""
+
+    def __init__(self, workers=None, batch_size=500):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._pool = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self, names, kind, on_round, on_done, on_error, cluster=None):
+        """
+        False — турнир уже идёт. on_done(таблица) / on_error(исключение) — из фонового потока.
+        cluster — как у Tournament.
+        """
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+            if self._pool is None:
+                self._pool = make_pool(self.workers)
+
+        def run():
+            try:
+                tournament = Tournament(names, kind, self._pool, self.batch_size, on_round=on_round,
+                                        cluster=cluster)
+                on_done(tournament.run())
+            except Exception as e:
+                on_error(e)
+            finally:
+                self._running = False
+
+        threading.Thread(target=run, name="tournament", daemon=True).start()
+        return True
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
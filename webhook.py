@@ -0,0 +1,193 @@
+# ========================= webhook.py =========================
+# Приём обновлений через webhook: встроенный HTTP-сервер кладёт обновления
+# в ограниченную очередь, её разбирают потоки-обработчики.
+#
+# Локальная проверка без Telegram:
+#   python webhook.py replay updates.jsonl --url http://127.0.0.1:8443/telegram
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class WebhookServer:
+    """
+    HTTP-сервер для webhook Telegram.
+
+    Обратное давление: если очередь заполнена и место не освободилось за
+    `enqueue_timeout` секунд, отвечаем 503 — Telegram повторит доставку позже.
+    """
+
+    def __init__(self, bot, host, port, path, queue_size, workers, secret="", enqueue_timeout=1.0):
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.enqueue_timeout = enqueue_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.rejected = 0
+        self.processed = 0
+        # последние замеры: ожидание в очереди и полный путь приём -> обработано, секунды
+        self.queue_wait = deque(maxlen=10_000)
+        self.end_to_end = deque(maxlen=10_000)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self.send_error(404)
+                    return
+                if server.secret and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != server.secret:
+                    self.send_error(403)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+                try:
+                    server.queue.put((time.perf_counter(), body), timeout=server.enqueue_timeout)
+                except queue.Full:
+                    with server._lock:
+                        server.rejected += 1
+                    self.send_response(503)
+                    self.send_header("Retry-After", "1")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                if self.path != server.path + "/stats":
+                    self.send_error(404)
+                    return
+                body = json.dumps(server.stats()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _worker(self):
+        # импорт здесь, чтобы `python webhook.py replay` работал без telebot
+        from telebot.types import Update
+
+        while True:
+            received, body = self.queue.get()
+            started = time.perf_counter()
+            try:
+                self.bot.process_new_updates([Update.de_json(body)])
+            except Exception as e:
+                print(f"Ошибка обработки обновления: {e}")
+            finally:
+                done = time.perf_counter()
+                with self._lock:
+                    self.processed += 1
+                    self.queue_wait.append(started - received)
+                    self.end_to_end.append(done - received)
+                self.queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            wait, e2e = list(self.queue_wait), list(self.end_to_end)
+            processed, rejected = self.processed, self.rejected
+        return {
+            "processed": processed,
+            "rejected": rejected,
+            "queue_depth": self.queue.qsize(),
+            "queue_wait_p50_ms": percentile(wait, 0.5) * 1000,
+            "queue_wait_p99_ms": percentile(wait, 0.99) * 1000,
+            "end_to_end_p50_ms": percentile(e2e, 0.5) * 1000,
+            "end_to_end_p99_ms": percentile(e2e, 0.99) * 1000,
+        }
+
+    def _start_workers(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True).start()
+
+    def start(self):
+        """Запуск в фоне (для тестов и replay)."""
+        self._start_workers()
+        threading.Thread(target=self.httpd.serve_forever, name="webhook-http", daemon=True).start()
+
+    def serve_forever(self):
+        self._start_workers()
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+
+def replay(path, url, rate=None, secret=""):
+    """
+    Отправляет записанные обновления (по одному JSON в строке) на webhook и печатает задержки.
+    secret — тот же webhook_secret, что у сервера, иначе он отвечает 403 на каждое обновление.
+    """
+    import urllib.error
+    import urllib.request
+
+    with open(path, encoding="utf-8") as f:
+        updates = [line.strip() for line in f if line.strip()]
+
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+    acks = []
+    rejected = 0
+    start = time.perf_counter()
+    for i, body in enumerate(updates):
+        if rate:
+            # равномерный поток с заданной частотой
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        request = urllib.request.Request(url, data=body.encode("utf-8"), headers=headers)
+        sent = time.perf_counter()
+        try:
+            urllib.request.urlopen(request).read()
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+            rejected += 1
+        acks.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - start
+
+    print(f"Отправлено: {len(updates)} за {elapsed:.2f} с ({len(updates) / elapsed:.0f}/с), отклонено: {rejected}")
+    print(f"Подтверждение HTTP: p50 {percentile(acks, 0.5) * 1000:.1f} мс, p99 {percentile(acks, 0.99) * 1000:.1f} мс")
+    time.sleep(1)  # даём обработчикам разобрать хвост очереди
+    with urllib.request.urlopen(url + "/stats") as response:
+        stats = json.load(response)
+    print("Сервер:", ", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import webhook_secret
+
+    parser = argparse.ArgumentParser(description="Инструменты webhook-режима")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("replay", help="отправить записанные обновления на локальный webhook")
+    rp.add_argument("file")
+    rp.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    rp.add_argument("--rate", type=float, default=None, help="обновлений в секунду (по умолчанию — без паузы)")
+    rp.add_argument("--secret", default=webhook_secret, help="секрет webhook (по умолчанию — из config.py)")
+    args = parser.parse_args()
+    replay(args.file, args.url, args.rate, args.secret)